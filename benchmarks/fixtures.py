@@ -0,0 +1,165 @@
+# -*- coding:utf-8 -*-
+"""
+Payloads and local servers used by the benchmark suite.
+
+Payloads mimic the shape of real Spikex.com responses so the numbers reflect
+the work done on typical data, and the servers run on 127.0.0.1 so transport
+overhead is measured without network noise.
+"""
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def depth_payload(levels=50, price=30000.0, tick=0.01):
+    bids = [[f"{price - i * tick:.2f}", f"{0.001 * (i + 1):.6f}"] for i in range(levels)]
+    asks = [[f"{price + (i + 1) * tick:.2f}", f"{0.001 * (i + 1):.6f}"] for i in range(levels)]
+    return {"timestamp": 1662445330524, "lastUpdateId": 137333589606963580, "bids": bids, "asks": asks}
+
+
+def kline_payload(rows=100, start=1662601014832, interval_ms=60000):
+    return [
+        {"t": start + i * interval_ms, "o": f"{30000 + i}.00", "c": f"{30001 + i}.00", "h": f"{30005 + i}.00",
+         "l": f"{29995 + i}.00", "q": f"{512 + i}.0000", "v": f"{15360000 + i * 30000}.00"}
+        for i in range(rows)
+    ]
+
+
+def tickers_24h_payload(rows=1000):
+    return [
+        {"s": f"c{i}_usdt", "cv": "1.0000", "cr": "0.0100", "o": "100.0000", "l": "99.0000", "h": "102.0000",
+         "c": "101.0000", "q": f"{i}.0136", "v": f"{i * 101}.9940"}
+        for i in range(rows)
+    ]
+
+
+def envelope(result):
+    """Spot responses wrap the payload in rc/mc/ma/result"""
+    return {"rc": 0, "mc": "SUCCESS", "ma": [], "result": result}
+
+
+def depth_update_messages(count=1000, symbol="btc_usdt", price=30000.0, tick=0.01, width=20):
+    """Incremental depth messages cycling through a band of price levels, removing every fifth one"""
+    messages = []
+    for i in range(count):
+        level = i % width
+        qty = "0" if i % 5 == 0 else f"{0.001 * (i % 97 + 1):.6f}"
+        data = {
+            "s": symbol, "fi": i, "i": i + 1,
+            "b": [[f"{price - level * tick:.2f}", qty]],
+            "a": [[f"{price + (level + 1) * tick:.2f}", qty]],
+        }
+        messages.append(json.dumps({"topic": "depth_update", "event": f"depth_update@{symbol}", "data": data}))
+    return messages
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    routes = {}
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = self.routes.get(self.path.split("?", 1)[0], b'{"rc":0,"mc":"SUCCESS","result":null}')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalHttpServer:
+    """
+    Threaded HTTP server answering every request with a canned JSON body
+    :param routes: {path: payload}, payloads are serialized once up front
+    """
+
+    def __init__(self, routes):
+        handler = type("Handler", (_JsonHandler,), {
+            "routes": {path: json.dumps(payload).encode("utf-8") for path, payload in routes.items()}
+        })
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalWebsocketServer:
+    """
+    Minimal single-client websocket server that pushes pre-built text frames
+    as fast as the socket accepts them, then sends a CLOSE frame
+    """
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, messages):
+        self.frames = b"".join(self._frame(0x1, m.encode("utf-8")) for m in messages)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.start = threading.Event()
+
+    @property
+    def url(self):
+        return "ws://127.0.0.1:{}".format(self.sock.getsockname()[1])
+
+    @staticmethod
+    def _frame(opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        return header + payload
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += conn.recv(4096)
+        key = ""
+        for line in request.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("sec-websocket-key:"):
+                key = line.split(":", 1)[1].strip()
+        accept = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+        conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        self.start.wait()
+        conn.sendall(self.frames + self._frame(0x8, struct.pack("!H", 1000)))
+        try:
+            conn.recv(1024)
+        except OSError:
+            pass
+        conn.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.sock.close()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+pyspikex benchmark suite
+
+Measures the client's hot paths (signing, per-request transport overhead,
+JSON decoding, websocket throughput and order book updates), optionally saves
+the results as a per-release baseline and reports regressions against one.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # run and compare with the current release baseline
+    python benchmarks/run_benchmarks.py --save               # store results as benchmarks/baselines/<version>.json
+    python benchmarks/run_benchmarks.py --only sign,json     # run benchmarks whose name contains any of the words
+    python benchmarks/run_benchmarks.py --baseline path.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fixtures import (LocalHttpServer, LocalWebsocketServer, depth_payload, depth_update_messages, envelope,
+                      kline_payload, tickers_24h_payload)
+from pyspikex.perp import Perp
+from pyspikex.spot import Spot
+from pyspikex.websocket.spikex_websocket import SpikexSocketManager
+
+BASELINE_DIR = os.path.join(HERE, "baselines")
+BENCHMARKS = []
+
+
+def benchmark(name):
+    def wrapper(func):
+        BENCHMARKS.append((name, func))
+        return func
+
+    return wrapper
+
+
+def measure(func, number, repeat=5):
+    """Best-of-`repeat` time for `number` calls of func, in seconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def release_version():
+    with open(os.path.join(os.path.dirname(HERE), "setup.py"), encoding="utf-8") as f:
+        return re.search(r"version='([^']+)'", f.read()).group(1)
+
+
+# -----------------------------------Signing-----------------------------------
+
+@benchmark("sign.spot_create_sign")
+def bench_spot_sign():
+    headers = {'xt-validate-timestamp': '1641446237201', 'xt-validate-appkey': '626fa1c2-94bf-4559-a3f2-c62897bc392e',
+               'xt-validate-recvwindow': '60000', 'xt-validate-algorithms': 'HmacSHA256'}
+    body = {"symbol": "btc_usdt", "side": "BUY", "type": "LIMIT", "bizType": "SPOT", "timeInForce": "GTC",
+            "price": "30000.01", "quantity": "0.001"}
+    return measure(lambda: Spot.create_sign("/v4/order", "POST", headers, "secret", json=body), 20000)
+
+
+@benchmark("sign.perp_create_sign")
+def bench_perp_sign():
+    body = {"orderSide": "BUY", "orderType": "LIMIT", "origQty": "1", "positionSide": "LONG", "symbol": "btc_usdt",
+            "price": "30000.1"}
+    return measure(lambda: Perp._create_sign("ak", "secret", "/future/trade/v1/order/create", "application/json",
+                                             body), 20000)
+
+
+# -----------------------------------Transport-----------------------------------
+
+@benchmark("http.spot_get_depth")
+def bench_spot_http():
+    with LocalHttpServer({"/v4/public/depth": envelope(depth_payload(5))}) as server:
+        spot = Spot(host=server.url)
+        return measure(lambda: spot.get_depth("btc_usdt", 5), 200, repeat=3)
+
+
+@benchmark("http.perp_get_depth")
+def bench_perp_http():
+    result = {"returnCode": 0, "msgInfo": "success", "error": None, "result": depth_payload(5)}
+    with LocalHttpServer({"/future/market/v1/public/q/depth": result}) as server:
+        perp = Perp(host=server.url, access_key="ak", secret_key="sk")
+        return measure(lambda: perp.get_depth("btc_usdt", 5), 200, repeat=3)
+
+
+# -----------------------------------Parsing-----------------------------------
+
+def _bench_decode(payload, number):
+    raw = json.dumps(envelope(payload)).encode("utf-8")
+    return measure(lambda: json.loads(raw), number)
+
+
+@benchmark("json.depth_50")
+def bench_json_depth():
+    return _bench_decode(depth_payload(50), 5000)
+
+
+@benchmark("json.kline_100")
+def bench_json_kline():
+    return _bench_decode(kline_payload(100), 2000)
+
+
+@benchmark("json.tickers_24h_1000")
+def bench_json_tickers():
+    return _bench_decode(tickers_24h_payload(1000), 100)
+
+
+@benchmark("frames.tickers_24h_1000")
+def bench_frames_tickers():
+    from pyspikex import frames
+    rows = tickers_24h_payload(1000)
+    return measure(lambda: frames.ticker_24h_array(rows), 50)
+
+
+# -----------------------------------Streaming-----------------------------------
+
+@benchmark("ws.socket_manager_messages")
+def bench_ws_messages():
+    """Seconds per message delivered to on_message by SpikexSocketManager"""
+    count = 20000
+    messages = depth_update_messages(count)
+    received = []
+    with LocalWebsocketServer(messages) as server:
+        manager = SpikexSocketManager(server.url, on_message=lambda _, m: received.append(m))
+        manager.start()
+        start = time.perf_counter()
+        server.start.set()
+        manager.join()
+        elapsed = time.perf_counter() - start
+    assert len(received) == count, f"received {len(received)} of {count} messages"
+    return elapsed / count
+
+
+@benchmark("book.depth_update_apply")
+def bench_book_updates():
+    """Seconds per depth_update message decoded and applied to a price-keyed book"""
+    messages = depth_update_messages(5000)
+    book = {"b": {}, "a": {}}
+
+    def apply_all():
+        for message in messages:
+            data = json.loads(message)["data"]
+            for side in ("b", "a"):
+                levels = book[side]
+                for price, qty in data[side]:
+                    if float(qty) == 0:
+                        levels.pop(price, None)
+                    else:
+                        levels[price] = qty
+
+    return measure(apply_all, 1, repeat=5) / len(messages)
+
+
+@benchmark("book.order_book_analytics")
+def bench_order_book():
+    """Seconds per depth_update message applied to OrderBook with its spread, microprice and imbalance read"""
+    from pyspikex.book import OrderBooks
+    messages = depth_update_messages(5000)
+
+    def apply_all():
+        books = OrderBooks(depth=10)
+        for message in messages:
+            book = books.handle(message)
+            book.spread, book.microprice, book.imbalance
+
+    return measure(apply_all, 1, repeat=5) / len(messages)
+
+
+def _depth_frames(count, levels):
+    """depth@btc_usdt,{levels} snapshot frames, each at a different price"""
+    frames = []
+    for i in range(count):
+        book = depth_payload(levels, price=30000.0 + i * 0.01)
+        data = {"s": "btc_usdt", "i": i, "t": book["timestamp"], "b": book["bids"], "a": book["asks"]}
+        frames.append(json.dumps({"topic": "depth", "event": f"depth@btc_usdt,{levels}", "data": data}).encode())
+    return frames
+
+
+@benchmark("pipeline.inline_depth50")
+def bench_inline_decode():
+    """Seconds per 50-level depth frame decoded to an event on the calling thread"""
+    from pyspikex.websocket.decoders import StreamDecoder
+    frames = _depth_frames(2000, 50)
+    decoder = StreamDecoder()
+    return measure(lambda: [decoder.decode(f) for f in frames], 1, repeat=5) / len(frames)
+
+
+@benchmark("pipeline.collect_depth50")
+def bench_collector_rebuild():
+    """
+    Seconds per 50-level depth event the DecodePipeline collector thread un-pickles from a worker batch.
+    The collector is single-threaded, so inline_depth50 / collect_depth50 is the most the pipeline can
+    speed decoding up, whatever the number of workers
+    """
+    from pyspikex.websocket.decoders import StreamDecoder
+    import pickle
+    decoder = StreamDecoder()
+    events = [decoder.decode(f) for f in _depth_frames(2000, 50)]
+    batches = [pickle.dumps(events[i:i + 256], pickle.HIGHEST_PROTOCOL) for i in range(0, len(events), 256)]
+    return measure(lambda: [pickle.loads(b) for b in batches], 1, repeat=5) / len(events)
+
+
+# -----------------------------------Reporting-----------------------------------
+
+def run(selected=None):
+    results = {}
+    for name, func in BENCHMARKS:
+        if selected and not any(word in name for word in selected):
+            continue
+        seconds = func()
+        results[name] = {"us_per_op": round(seconds * 1e6, 3), "ops_per_sec": round(1 / seconds, 1)}
+        print(f"{name:<32} {results[name]['us_per_op']:>12.3f} us/op {results[name]['ops_per_sec']:>14.1f} ops/s")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print a regression report and return the names that slowed down by more than threshold
+    :param threshold: allowed relative slowdown, 0.1 == 10%
+    """
+    regressions = []
+    print(f"\nComparison with baseline {baseline.get('version')} ({baseline.get('python')}, {baseline.get('machine')})")
+    for name, current in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"{name:<32} {'new':>12}")
+            continue
+        change = current["us_per_op"] / base["us_per_op"] - 1
+        status = "REGRESSION" if change > threshold else ("improved" if change < -threshold else "ok")
+        if status == "REGRESSION":
+            regressions.append(name)
+        print(f"{name:<32} {base['us_per_op']:>12.3f} -> {current['us_per_op']:>12.3f} us/op {change:>+8.1%}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="comma separated words, run benchmarks whose name contains any of them")
+    parser.add_argument("--save", action="store_true", help="store results as the baseline of the current release")
+    parser.add_argument("--baseline", help="baseline file to compare against, default: current release baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    version = release_version()
+    results = run(args.only.split(",") if args.only else None)
+    snapshot = {"version": version, "python": platform.python_version(), "machine": platform.machine(),
+                "created": int(time.time()), "results": results}
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{version}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {path}")
+        return 0
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{version}.json")
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline at {baseline_path}, run with --save to create one")
+        return 0
+    with open(baseline_path, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ import os
 # Add parent directory to path to import pyspikex module
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from pyspikex.fixed import Fixed
 from pyspikex.spot import Spot
 
 # Read configuration from environment variables
@@ -65,20 +66,20 @@ print("=" * 60)
 try:
     ticker = spikex.get_tickers(symbol='btc_usdt')
     if ticker:
-        current_price = float(ticker[0].get('p', 0)) if isinstance(ticker, list) else float(ticker.get('p', 0))
+        current_price = Fixed.parse(ticker[0].get('p', 0) if isinstance(ticker, list) else ticker.get('p', 0))
         print(f"BTC/USDT Current Price: {current_price}")
     else:
         print("Unable to get price")
-        current_price = 95000
+        current_price = Fixed.parse(95000)
 except Exception as e:
     print(f"Failed to get price: {e}")
-    current_price = 95000
+    current_price = Fixed.parse(95000)
 
 # 4. Place a limit buy order (price set to 90% of current price)
 print("\n" + "=" * 60)
 print("4. Order Placement Test")
 print("=" * 60)
-buy_price = round(current_price * 0.9, 2)
+buy_price = (current_price * Fixed.parse('0.9')).quantize(2)
 print(f"Trading Pair: btc_usdt")
 print(f"Price: {buy_price}")
 print(f"Quantity: 0.001")
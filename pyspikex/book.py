@@ -0,0 +1,299 @@
+# -*- coding:utf-8 -*-
+"""
+Local order books with incrementally maintained analytics.
+
+OrderBook applies depth@{symbol},{level} snapshots and depth_update@{symbol}
+diffs and keeps its analytics current as levels change instead of recomputing
+them per update: best prices, spread and microprice are O(1), the top-N
+quantities behind the imbalance are adjusted by the level that changed, and
+the cost of trading a size is cached until an update touches a level that
+the cached walk used:
+
+    books = OrderBooks(depth=10)
+
+    def on_message(_, message):
+        books.handle(message)             # depth and depth_update frames of any symbols
+
+    book = books['btc_usdt']
+    book.spread, book.microprice, book.imbalance
+    book.cost_to_trade('BUY', 2.5)        # relative cost vs mid of buying 2.5 at market
+
+    symbols, arrays = books.arrays('spread', 'microprice', 'imbalance')   # one ndarray per metric
+
+Prices and quantities are floats. A book is not thread-safe, feed it from the
+websocket thread and read it there or accept values one update old.
+"""
+import json
+from bisect import bisect_left
+from collections import namedtuple
+
+from pyspikex.websocket.decoders import DepthEvent, DepthUpdateEvent, StreamDecoder
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+Level = namedtuple('Level', 'price qty')
+
+
+class _Side:
+    """
+    One side of the book, keys sorted best first (bids are stored negated)
+    :ivar top: Quantity of the best `depth` levels
+    """
+    __slots__ = ('sign', 'depth', 'keys', 'qty', 'top', 'walks')
+
+    def __init__(self, sign, depth):
+        self.sign = sign
+        self.depth = depth
+        self.clear()
+
+    def clear(self):
+        self.keys = []
+        self.qty = {}
+        self.top = 0.0
+        self.walks = {}  # {size: (average price, deepest rank used)}
+
+    def load(self, levels):
+        self.clear()
+        for price, qty in levels:
+            if qty > 0:
+                self.qty[self.sign * price] = qty
+        self.keys = sorted(self.qty)
+        self.top = sum(self.qty[key] for key in self.keys[:self.depth])
+
+    def set(self, price, qty):
+        key = self.sign * price
+        old = self.qty.get(key)
+        levels = self.qty
+        keys = self.keys
+        depth = self.depth
+        if qty <= 0:
+            if old is None:
+                return
+            rank = bisect_left(keys, key)
+            del keys[rank]
+            del levels[key]
+            if rank < depth:
+                self.top -= old
+                if len(keys) >= depth:
+                    self.top += levels[keys[depth - 1]]  # pulled into the top levels
+        elif old is None:
+            rank = bisect_left(keys, key)
+            keys.insert(rank, key)
+            levels[key] = qty
+            if rank < depth:
+                self.top += qty
+                if len(keys) > depth:
+                    self.top -= levels[keys[depth]]  # pushed out of the top levels
+        elif old != qty:
+            levels[key] = qty
+            rank = bisect_left(keys, key)
+            if rank < depth:
+                self.top += qty - old
+        else:
+            return
+        if self.walks:
+            self.walks = {size: walk for size, walk in self.walks.items() if walk[1] < rank}
+
+    def best(self):
+        if not self.keys:
+            return None
+        key = self.keys[0]
+        return Level(self.sign * key, self.qty[key])
+
+    def levels(self, n=None):
+        return [Level(self.sign * key, self.qty[key]) for key in self.keys[:n]]
+
+    def walk(self, size):
+        """Average price of taking size from this side, None if the side is thinner"""
+        cached = self.walks.get(size)
+        if cached is not None:
+            return cached[0]
+        remaining = size
+        notional = 0.0
+        for rank, key in enumerate(self.keys):
+            qty = self.qty[key]
+            take = qty if qty < remaining else remaining
+            notional += take * self.sign * key
+            remaining -= take
+            if remaining <= 0:
+                price = notional / size
+                self.walks[size] = (price, rank)
+                return price
+        return None
+
+
+class OrderBook:
+    """
+    :param symbol: Trading pair
+    :param depth: Levels per side counted by imbalance and top_bid_qty / top_ask_qty
+    """
+
+    def __init__(self, symbol, depth: int = 10):
+        self.symbol = symbol
+        self.depth = depth
+        self.bids = _Side(-1, depth)
+        self.asks = _Side(1, depth)
+        self.update_id = None
+        self.time = None
+
+    def apply_snapshot(self, bids, asks, update_id=None, time_ms=None):
+        """Replace the book with [(price, qty), ...] per side"""
+        self.bids.load((float(p), float(q)) for p, q in bids)
+        self.asks.load((float(p), float(q)) for p, q in asks)
+        self.update_id = update_id
+        self.time = time_ms
+
+    def apply_update(self, bids, asks, update_id=None, time_ms=None):
+        """Apply changed levels, a quantity of 0 removes the level"""
+        for price, qty in bids:
+            self.bids.set(float(price), float(qty))
+        for price, qty in asks:
+            self.asks.set(float(price), float(qty))
+        if update_id is not None:
+            self.update_id = update_id
+        if time_ms is not None:
+            self.time = time_ms
+
+    def apply(self, event):
+        """Apply a DepthEvent (snapshot) or DepthUpdateEvent (diff)"""
+        if isinstance(event, DepthUpdateEvent):
+            self.apply_update(event.bids, event.asks, event.last_id, event.time)
+        elif isinstance(event, DepthEvent):
+            self.apply_snapshot(event.bids, event.asks, event.update_id, event.time)
+
+    @property
+    def best_bid(self) -> Level:
+        return self.bids.best()
+
+    @property
+    def best_ask(self) -> Level:
+        return self.asks.best()
+
+    @property
+    def spread(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        return ask.price - bid.price if bid and ask else None
+
+    @property
+    def mid(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        return (ask.price + bid.price) / 2 if bid and ask else None
+
+    @property
+    def microprice(self):
+        """Mid weighted by the opposite top-of-book quantities"""
+        bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        return (bid.price * ask.qty + ask.price * bid.qty) / (bid.qty + ask.qty)
+
+    @property
+    def top_bid_qty(self):
+        return self.bids.top
+
+    @property
+    def top_ask_qty(self):
+        return self.asks.top
+
+    @property
+    def imbalance(self):
+        """(bid - ask) / (bid + ask) quantity of the top depth levels, in [-1, 1]"""
+        total = self.bids.top + self.asks.top
+        return (self.bids.top - self.asks.top) / total if total > 0 else None
+
+    def average_price(self, side, qty):
+        """Average fill price of a market order of qty, None if the book is too thin"""
+        return (self.asks if side.upper() == 'BUY' else self.bids).walk(qty)
+
+    def cost_to_trade(self, side, qty):
+        """Relative cost against mid of a market order of qty (0.001 == 10 bps), None if the book is too thin"""
+        price, mid = self.average_price(side, qty), self.mid
+        if price is None or not mid:
+            return None
+        return (price - mid) / mid if side.upper() == 'BUY' else (mid - price) / mid
+
+    def levels(self, n=None):
+        """:return: (bids, asks), best first"""
+        return self.bids.levels(n), self.asks.levels(n)
+
+
+class OrderBooks:
+    """
+    Books of many symbols fed from one stream
+    :param depth: Passed to every OrderBook
+    """
+
+    METRICS = ('spread', 'mid', 'microprice', 'imbalance', 'top_bid_qty', 'top_ask_qty')
+
+    def __init__(self, depth: int = 10):
+        self.depth = depth
+        self.decoder = StreamDecoder()
+        self._books = {}
+
+    def __getitem__(self, symbol) -> OrderBook:
+        return self._books[symbol]
+
+    def __len__(self):
+        return len(self._books)
+
+    def get(self, symbol) -> OrderBook:
+        return self._books.get(symbol)
+
+    def book(self, symbol) -> OrderBook:
+        """Book of symbol, created empty on first use"""
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = OrderBook(symbol, self.depth)
+        return book
+
+    def symbols(self):
+        return list(self._books)
+
+    def handle(self, message):
+        """
+        Feed a depth or depth_update stream message (raw frame, parsed dict or decoded event)
+        :return: The updated OrderBook, None for other messages
+        """
+        event = message
+        if not isinstance(message, (DepthEvent, DepthUpdateEvent)):
+            if isinstance(message, (str, bytes, bytearray)):
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    return None
+            if not isinstance(message, dict) or message.get('topic') not in ('depth', 'depth_update'):
+                return None
+            event = self.decoder.decode_data(message['topic'], message.get('event'), message.get('data'))
+            if not isinstance(event, (DepthEvent, DepthUpdateEvent)):
+                return None
+        book = self.book(event.symbol)
+        book.apply(event)
+        return book
+
+    def arrays(self, *metrics, symbols=None):
+        """
+        One float64 ndarray per metric across books, NaN where a book has no value; requires NumPy
+        :param metrics: Names from METRICS, default all of them
+        :param symbols: Books to include, default all
+        :return: (symbols, {metric: ndarray}) with rows in the order of symbols
+        """
+        if np is None:
+            raise ImportError('NumPy is required for array views: pip install pyspikex[numpy]')
+        symbols = list(self._books) if symbols is None else list(symbols)
+        books = [self._books[s] for s in symbols]
+        result = {}
+        for metric in metrics or self.METRICS:
+            values = [getattr(book, metric) for book in books]
+            result[metric] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return symbols, result
+
+    def cost_array(self, side, qty, symbols=None):
+        """cost_to_trade(side, qty) of every book as an ndarray, NaN where a book is too thin"""
+        if np is None:
+            raise ImportError('NumPy is required for array views: pip install pyspikex[numpy]')
+        symbols = list(self._books) if symbols is None else list(symbols)
+        values = [self._books[s].cost_to_trade(side, qty) for s in symbols]
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
@@ -0,0 +1,140 @@
+# -*- coding:utf-8 -*-
+"""
+Concurrent startup of a trading process.
+
+bootstrap() sends every startup request at once instead of one after another:
+symbol configs, currencies, leverage brackets, balances, open orders,
+positions and the listen key. The results are committed to the caches and
+trackers only after all of the requests have returned, so no component ever
+sees half-loaded state:
+
+    report = bootstrap(spot=spot, perp=perp, cache=cache, orders=tracker, balances=balances,
+                       positions=positions, listen_keys=keys)
+    print(report)
+    # bootstrap 0.184s
+    #   spot.symbol_config   0.171s
+    #   balances             0.088s
+    #   ...
+
+Requests go through the clients, so their rate limits, policies and breakers apply;
+max_workers bounds how many run at the same time.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from pyspikex.cache import MetadataCache
+
+logger = logging.getLogger('spikex')
+
+
+class BootstrapError(Exception):
+    """One or more startup requests failed, nothing was committed"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f'bootstrap failed: {", ".join(f"{k}: {v}" for k, v in report.errors.items())}')
+
+
+class BootstrapReport:
+    """
+    :ivar timings: {call: seconds}
+    :ivar errors: {call: exception} of the failed calls
+    :ivar counts: {call: rows committed} for balances, open orders and positions
+    :ivar total: Wall time of the whole bootstrap in seconds
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self.counts = {}
+        self.total = 0.0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __str__(self):
+        lines = [f'bootstrap {self.total:.3f}s']
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            status = f'  {self.errors[name]}' if name in self.errors else ''
+            lines.append(f'  {name:<28}{seconds:.3f}s{status}')
+        return '\n'.join(lines)
+
+
+def _checked(value):
+    """Raise the transport or business error of a Perp (code, success, error) tuple"""
+    if MetadataCache._failed(value):
+        code, success, error = value
+        if error is None:
+            error = {k: success.get(k) for k in ('returnCode', 'msgInfo', 'error')}
+        raise RuntimeError(f'code:{code} error:{error}')
+    return value
+
+
+def bootstrap(spot=None, perp=None, cache=None, orders=None, balances=None, positions=None, listen_keys=None,
+              max_workers: int = 8, strict: bool = True) -> BootstrapReport:
+    """
+    :param spot: pyspikex.spot.Spot, loads the spot metadata into cache
+    :param perp: pyspikex.perp.Perp, loads the leverage brackets into cache
+    :param cache: pyspikex.cache.MetadataCache to populate
+    :param orders: pyspikex.state.OrderTracker to load the open orders into
+    :param balances: pyspikex.state.BalanceCache
+    :param positions: pyspikex.state.PositionCache
+    :param listen_keys: pyspikex.websocket.listen_key.ListenKeyManager, its key is fetched
+    :param max_workers: Requests in flight at once
+    :param strict: Raise BootstrapError and commit nothing if any call failed, otherwise commit what succeeded
+    """
+    calls = {}
+    commits = {}
+    if cache is not None and spot is not None:
+        calls['spot.symbol_config'] = spot.get_symbol_config
+        commits['spot.symbol_config'] = lambda value: cache.put('spot.symbol_config', value)
+        calls['spot.currencies'] = spot.get_currencies
+        commits['spot.currencies'] = lambda value: cache.put('spot.currencies', value)
+    if cache is not None and perp is not None:
+        calls['perp.leverage_bracket_list'] = lambda: _checked(perp.get_leverage_bracket_list())
+        commits['perp.leverage_bracket_list'] = lambda value: cache.put('perp.leverage_bracket_list', value)
+    if balances is not None:
+        calls['balances'] = balances.fetch
+        commits['balances'] = balances.load
+    if orders is not None:
+        calls['open_orders'] = orders.fetch_open
+        commits['open_orders'] = orders.load
+    if positions is not None:
+        calls['positions'] = positions.fetch
+        commits['positions'] = positions.load
+    if listen_keys is not None:
+        calls['listen_key'] = lambda: listen_keys.key
+
+    report = BootstrapReport()
+    start = perf_counter()
+
+    def timed(name, fn):
+        t = perf_counter()
+        try:
+            return fn()
+        finally:
+            report.timings[name] = perf_counter() - t
+
+    results = {}
+    with ThreadPoolExecutor(max(1, min(max_workers, len(calls))), thread_name_prefix='spikex-bootstrap') as pool:
+        futures = {name: pool.submit(timed, name, fn) for name, fn in calls.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                report.errors[name] = e
+                logger.error('bootstrap %s failed: %s', name, e)
+
+    if report.errors and strict:
+        report.total = perf_counter() - start
+        raise BootstrapError(report)
+    for name, value in results.items():
+        commit = commits.get(name)
+        if commit is not None:
+            count = commit(value)
+            if isinstance(count, int):
+                report.counts[name] = count
+    report.total = perf_counter() - start
+    return report
@@ -0,0 +1,181 @@
+# -*- coding:utf-8 -*-
+"""
+Circuit breaker per endpoint group.
+
+Calls are grouped by the first two segments of their path (/v4/public,
+/v4/order, /future/market, /future/trade, ...). A group whose recent calls
+mostly fail or are too slow is opened: further calls fail immediately with
+SpikexCircuitOpenError (Perp returns it as the error of its tuple) instead of
+each waiting for its timeout. After open_for seconds a few probe calls are let
+through (half open); if they succeed the circuit closes again, otherwise it
+re-opens. Healthy groups are never affected by a degraded one:
+
+    breaker = CircuitBreaker(failure_rate=0.5, slow_call=2.0)
+    spot = Spot(host, breaker=breaker, instrumentation=metrics)   # transitions go to metrics.on_circuit
+
+Business errors (insufficient funds, bad parameters, ...) are answers, not
+failures, and never trip a circuit.
+"""
+import threading
+from collections import deque
+from time import monotonic, perf_counter
+
+from pyspikex.spot import SpikexCircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def endpoint_group(path):
+    """First two path segments, e.g. /future/market/v1/public/q/depth -> /future/market"""
+    parts = path.split('?', 1)[0].split('/', 3)
+    return '/'.join(parts[:3])
+
+
+class _Circuit:
+    __slots__ = ('state', 'outcomes', 'failures', 'opened_at', 'probes', 'successes')
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.successes = 0
+
+
+class CircuitBreaker:
+    """
+    :param failure_rate: Share of failed calls in the window that opens the circuit
+    :param min_calls: Calls needed in the window before the rate is evaluated
+    :param window: Number of most recent calls per group considered
+    :param slow_call: Seconds after which a successful call still counts as a failure, None to disable
+    :param open_for: Seconds a circuit stays open before probing
+    :param half_open_calls: Probe calls let through, all must succeed to close the circuit
+    :param group: Callable mapping an endpoint path to its group
+    :param instrumentation: Hook whose on_circuit(group, old_state, new_state) receives transitions;
+                            set to the client's instrumentation when left empty
+    """
+
+    def __init__(self, failure_rate: float = 0.5, min_calls: int = 10, window: int = 50, slow_call: float = None,
+                 open_for: float = 5.0, half_open_calls: int = 1, group=endpoint_group, instrumentation=None):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call = slow_call
+        self.open_for = open_for
+        self.half_open_calls = half_open_calls
+        self.group = group
+        self.instrumentation = instrumentation
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def state(self, path_or_group):
+        circuit = self._circuits.get(self.group(path_or_group))
+        return circuit.state if circuit else CLOSED
+
+    def states(self):
+        """{group: state} of every group seen"""
+        return {group: circuit.state for group, circuit in self._circuits.items()}
+
+    def call(self, path, fn, failed=None):
+        """
+        Run fn() unless the circuit of path's group is open
+        :param failed: failed(result_or_exception) -> bool, default: every exception is a failure
+        :raises SpikexCircuitOpenError: without calling fn
+        """
+        group = self.group(path)
+        probe = self._acquire(group)
+        start = perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self._record(group, probe, failed(e) if failed else True)
+            raise
+        except BaseException:
+            if probe:
+                self._release(group)  # interrupted, says nothing about the endpoint, free the probe slot
+            raise
+        slow = self.slow_call is not None and perf_counter() - start >= self.slow_call
+        self._record(group, probe, slow or bool(failed and failed(result)))
+        return result
+
+    def reset(self, group=None):
+        """Close one group's circuit, or all"""
+        with self._lock:
+            groups = list(self._circuits) if group is None else [group]
+            events = [self._transition(g, self._circuits[g], CLOSED) for g in groups if g in self._circuits]
+        self._report(events)
+
+    def _acquire(self, group):
+        events = []
+        try:
+            with self._lock:
+                circuit = self._circuits.get(group)
+                if circuit is None:
+                    circuit = self._circuits[group] = _Circuit(self.window)
+                if circuit.state == OPEN:
+                    wait = circuit.opened_at + self.open_for - monotonic()
+                    if wait > 0:
+                        raise SpikexCircuitOpenError(group, wait)
+                    events.append(self._transition(group, circuit, HALF_OPEN))
+                if circuit.state == HALF_OPEN:
+                    if circuit.probes >= self.half_open_calls:
+                        raise SpikexCircuitOpenError(group, 0.0)
+                    circuit.probes += 1
+                    return True
+                return False
+        finally:
+            self._report(events)
+
+    def _record(self, group, probe, failed):
+        events = []
+        with self._lock:
+            circuit = self._circuits[group]
+            if probe and circuit.state == HALF_OPEN:
+                if failed:
+                    events.append(self._transition(group, circuit, OPEN))
+                else:
+                    circuit.successes += 1
+                    if circuit.successes >= self.half_open_calls:
+                        events.append(self._transition(group, circuit, CLOSED))
+            elif circuit.state == CLOSED:
+                if len(circuit.outcomes) == circuit.outcomes.maxlen:
+                    circuit.failures -= circuit.outcomes[0]
+                circuit.outcomes.append(failed)
+                circuit.failures += failed
+                calls = len(circuit.outcomes)
+                if calls >= self.min_calls and circuit.failures >= self.failure_rate * calls:
+                    events.append(self._transition(group, circuit, OPEN))
+        self._report(events)
+
+    def _release(self, group):
+        with self._lock:
+            circuit = self._circuits[group]
+            if circuit.state == HALF_OPEN and circuit.probes:
+                circuit.probes -= 1
+
+    @staticmethod
+    def _transition(group, circuit, state):
+        old = circuit.state
+        circuit.state = state
+        circuit.probes = 0
+        circuit.successes = 0
+        if state == OPEN:
+            circuit.opened_at = monotonic()
+        elif state == CLOSED:
+            circuit.outcomes.clear()
+            circuit.failures = 0
+        return group, old, state
+
+    def _report(self, events):
+        if self.instrumentation is None:
+            return
+        for group, old, new in events:
+            if old == new:
+                continue
+            try:
+                self.instrumentation.on_circuit(group, old, new)
+            except Exception:
+                pass
@@ -0,0 +1,451 @@
+# -*- coding:utf-8 -*-
+"""
+Local publish/subscribe bus for normalized market data.
+
+One process holds the exchange connections and rebroadcasts every decoded
+trade, book snapshot and delta, kline, ticker and mark/index price to other
+local processes over a Unix domain socket. Events travel in a compact binary
+framing (integers and Fixed mantissas, no JSON), and each subscriber only
+receives the topics it asked for:
+
+    # publisher
+    bus = BusPublisher('/tmp/spikex-bus.sock').start()
+    ws = SpotWebsocketStreamClient(on_message=lambda _, message: bus.handle(message))
+    ws.trade('btc_usdt')
+    ws.incremental_depth('btc_usdt')
+
+    # any other process
+    sub = BusSubscriber('/tmp/spikex-bus.sock', on_event=print, topics=['trade@', 'depth_update@btc_usdt'])
+
+Topics are '<stream>@<symbol>' (kline@btc_usdt,1m for klines) and subscriptions
+match by prefix, '' receives everything. Events arrive as the TradeEvent,
+DepthEvent, DepthUpdateEvent, KlineEvent, TickerEvent and PriceEvent tuples of
+pyspikex.websocket.decoders with Fixed values; other topics are forwarded as
+RawEvent, encoded as JSON, so nothing read from the socket is ever unpickled.
+Events that do not fit the framing (a topic longer than 255 bytes, a value
+beyond 64-bit units or 255 fraction digits) are logged and skipped. A
+subscriber that falls more than max_pending bytes behind, or sends anything
+but well-formed subscription frames, is disconnected rather than slowing the
+publisher down.
+
+Frame: u32 length, u8 kind, u8 topic length, topic, payload.
+"""
+import json
+import logging
+import os
+import selectors
+import socket
+import stat
+import struct
+import threading
+
+from pyspikex.fixed import Fixed
+from pyspikex.websocket.decoders import (DepthEvent, DepthUpdateEvent, KlineEvent, PriceEvent, RawEvent,
+                                         StreamDecoder, TickerEvent, TradeEvent)
+
+logger = logging.getLogger('spikex')
+
+TRADE, DEPTH, DEPTH_UPDATE, KLINE, TICKER, PRICE, RAW = range(1, 8)
+SUBSCRIBE, UNSUBSCRIBE = 0x80, 0x81
+
+_LENGTH = struct.Struct('<I')
+_HEAD = struct.Struct('<BB')
+_NONE = -(1 << 63)  # None of an optional integer
+_TRADE = struct.Struct('<qqqBqBb')
+_IDS = struct.Struct('<qq')
+_UPDATE_IDS = struct.Struct('<qqq')
+_PRICES6 = struct.Struct('<q' + 'qB' * 6)
+_PRICE = struct.Struct('<qqB')
+_COUNT = struct.Struct('<H')
+_CONTROL_LIMIT = _HEAD.size + 255  # longest (un)subscribe frame
+
+
+def _int(value):
+    return _NONE if value is None else value
+
+
+def _opt(value):
+    return None if value == _NONE else value
+
+
+def _fixed(value):
+    if not isinstance(value, Fixed):
+        value = Fixed.parse(value)
+    return value.units, value.scale
+
+
+def _pack_levels(levels):
+    flat = []
+    for price, qty in levels:
+        flat += _fixed(price)
+        flat += _fixed(qty)
+    return struct.pack(f'<H{"qBqB" * len(levels)}', len(levels), *flat)
+
+
+def _unpack_levels(payload, offset):
+    n = _COUNT.unpack_from(payload, offset)[0]
+    offset += _COUNT.size
+    fmt = struct.Struct(f'<{"qBqB" * n}')
+    flat = fmt.unpack_from(payload, offset)
+    levels = [(Fixed(flat[i], flat[i + 1]), Fixed(flat[i + 2], flat[i + 3])) for i in range(0, len(flat), 4)]
+    return levels, offset + fmt.size
+
+
+def _fixed_fields(values):
+    flat = []
+    for value in values:
+        flat += _fixed(value)
+    return flat
+
+
+def _frame(kind, topic, payload=b''):
+    topic = topic.encode()
+    if len(topic) > 255:
+        raise ValueError(f'bus topic longer than 255 bytes: {topic[:64]!r}...')
+    return _LENGTH.pack(_HEAD.size + len(topic) + len(payload)) + _HEAD.pack(kind, len(topic)) + topic + payload
+
+
+def encode(event, topic: str = None) -> bytes:
+    """
+    Frame of a decoded event
+    :param topic: Topic of a RawEvent, default its event field
+    """
+    if isinstance(event, TradeEvent):
+        price, qty = _fixed(event.price), _fixed(event.qty)
+        maker = -1 if event.buyer_maker is None else int(bool(event.buyer_maker))
+        return _frame(TRADE, f'trade@{event.symbol}',
+                      _TRADE.pack(_int(event.trade_id), _int(event.time), *price, *qty, maker))
+    if isinstance(event, DepthUpdateEvent):
+        return _frame(DEPTH_UPDATE, f'depth_update@{event.symbol}',
+                      _UPDATE_IDS.pack(_int(event.first_id), _int(event.last_id), _int(event.time))
+                      + _pack_levels(event.bids) + _pack_levels(event.asks))
+    if isinstance(event, DepthEvent):
+        return _frame(DEPTH, f'depth@{event.symbol}', _IDS.pack(_int(event.update_id), _int(event.time))
+                      + _pack_levels(event.bids) + _pack_levels(event.asks))
+    if isinstance(event, KlineEvent):
+        values = (event.open, event.high, event.low, event.close, event.qty, event.amount)
+        return _frame(KLINE, f'kline@{event.symbol},{event.interval}',
+                      _PRICES6.pack(_int(event.time), *_fixed_fields(values)))
+    if isinstance(event, TickerEvent):
+        values = (event.open, event.high, event.low, event.close, event.qty, event.amount)
+        return _frame(TICKER, f'ticker@{event.symbol}', _PRICES6.pack(_int(event.time), *_fixed_fields(values)))
+    if isinstance(event, PriceEvent):
+        return _frame(PRICE, f'{event.topic}@{event.symbol}', _PRICE.pack(_int(event.time), *_fixed(event.price)))
+    if isinstance(event, RawEvent):
+        return _frame(RAW, topic or event.event or event.topic or '',
+                      json.dumps([event.topic, event.event, event.data], separators=(',', ':')).encode())
+    raise TypeError(f'cannot encode {type(event).__name__}')
+
+
+def decode(kind, topic: str, payload):
+    """Event of a frame's kind, topic and payload"""
+    if kind == RAW:
+        return RawEvent(*json.loads(payload))
+    stream, _, symbol = topic.partition('@')
+    if kind == TRADE:
+        trade_id, time_ms, pu, ps, qu, qs, maker = _TRADE.unpack_from(payload)
+        return TradeEvent(symbol, _opt(trade_id), _opt(time_ms), Fixed(pu, ps), Fixed(qu, qs),
+                          None if maker < 0 else bool(maker))
+    if kind == DEPTH_UPDATE:
+        first_id, last_id, time_ms = _UPDATE_IDS.unpack_from(payload)
+        bids, offset = _unpack_levels(payload, _UPDATE_IDS.size)
+        asks, _ = _unpack_levels(payload, offset)
+        return DepthUpdateEvent(symbol, _opt(first_id), _opt(last_id), _opt(time_ms), bids, asks)
+    if kind == DEPTH:
+        update_id, time_ms = _IDS.unpack_from(payload)
+        bids, offset = _unpack_levels(payload, _IDS.size)
+        asks, _ = _unpack_levels(payload, offset)
+        return DepthEvent(symbol, _opt(update_id), _opt(time_ms), bids, asks)
+    if kind in (KLINE, TICKER):
+        values = _PRICES6.unpack_from(payload)
+        fixed = [Fixed(values[i], values[i + 1]) for i in range(1, 13, 2)]
+        if kind == KLINE:
+            symbol, _, interval = symbol.partition(',')
+            return KlineEvent(symbol, interval, _opt(values[0]), *fixed)
+        return TickerEvent(symbol, _opt(values[0]), *fixed)
+    if kind == PRICE:
+        time_ms, units, scale = _PRICE.unpack_from(payload)
+        return PriceEvent(stream, symbol, _opt(time_ms), Fixed(units, scale))
+    raise ValueError(f'unknown frame kind {kind}')
+
+
+def _unlink_socket(path):
+    """Remove a stale socket file at path, refuse to remove anything else"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{path} exists and is not a socket')
+    os.unlink(path)
+
+
+def _frames(buffer, limit=None):
+    """
+    Split complete frames off the front of a bytearray, yields (kind, topic, payload)
+    :param limit: Largest frame length accepted
+    :raises ValueError: for a frame too short for its header or longer than limit, or a topic that is not UTF-8
+    """
+    offset = 0
+    while len(buffer) - offset >= _LENGTH.size:
+        n = _LENGTH.unpack_from(buffer, offset)[0]
+        if n < _HEAD.size or limit is not None and n > limit:
+            raise ValueError(f'bus frame of {n} bytes')
+        end = offset + _LENGTH.size + n
+        if len(buffer) < end:
+            break
+        kind, topic_length = _HEAD.unpack_from(buffer, offset + _LENGTH.size)
+        start = offset + _LENGTH.size + _HEAD.size
+        topic = bytes(buffer[start:start + topic_length]).decode()
+        yield kind, topic, bytes(buffer[start + topic_length:end])
+        offset = end
+    del buffer[:offset]
+
+
+class _Subscriber:
+    __slots__ = ('sock', 'prefixes', 'matches', 'pending', 'received')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.prefixes = set()
+        self.matches = {}  # {topic: bool}, cleared when the prefixes change
+        self.pending = bytearray()
+        self.received = bytearray()
+
+    def wants(self, topic):
+        match = self.matches.get(topic)
+        if match is None:
+            match = self.matches[topic] = any(topic.startswith(prefix) for prefix in self.prefixes)
+        return match
+
+
+class BusPublisher:
+    """
+    :param path: Unix socket path, an existing socket file is replaced, any other file raises FileExistsError
+    :param max_pending: Bytes queued for one subscriber before it is disconnected
+    """
+
+    def __init__(self, path: str = '/tmp/spikex-bus.sock', max_pending: int = 8 << 20):
+        self.path = path
+        self.max_pending = max_pending
+        self.decoder = StreamDecoder()
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._selector = None
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.published = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        _unlink_socket(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(64)
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='spikex-bus', daemon=True)
+        self._thread.start()
+        return self
+
+    def handle(self, message):
+        """
+        Publish a stream message (raw frame, parsed dict or decoded event)
+        :return: Number of events published
+        """
+        if isinstance(message, (str, bytes, bytearray)):
+            try:
+                message = json.loads(message)
+            except ValueError:
+                return 0
+        if isinstance(message, dict):
+            if 'data' not in message:
+                return 0
+            message = self.decoder.decode_data(message.get('topic'), message.get('event'), message['data'])
+        events = message if isinstance(message, list) else [message]
+        for event in events:
+            self.publish(event)
+        return len(events)
+
+    def publish(self, event, topic: str = None):
+        """Send a decoded event to every subscriber of its topic, encoded once"""
+        try:
+            frame = encode(event, topic)
+        except (ValueError, struct.error) as e:
+            self.skipped += 1
+            logger.warning('bus skipped %s: %s', type(event).__name__, e)
+            return
+        topic = frame[_LENGTH.size + _HEAD.size:_LENGTH.size + _HEAD.size + frame[_LENGTH.size + 1]].decode()
+        with self._lock:
+            self.published += 1
+            for subscriber in list(self._subscribers.values()):
+                if subscriber.wants(topic):
+                    self._send(subscriber, frame)
+
+    def _send(self, subscriber, frame):
+        if not subscriber.pending:
+            try:
+                sent = subscriber.sock.send(frame)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self._drop(subscriber)
+                return
+            if sent == len(frame):
+                return
+            frame = frame[sent:]
+        subscriber.pending += frame
+        if len(subscriber.pending) > self.max_pending:
+            logger.warning('bus subscriber %s dropped, %d bytes behind', subscriber.sock.fileno(),
+                           len(subscriber.pending))
+            self.dropped += 1
+            self._drop(subscriber)
+
+    def _flush(self, subscriber):
+        try:
+            sent = subscriber.sock.send(subscriber.pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(subscriber)
+            return
+        del subscriber.pending[:sent]
+
+    def _drop(self, subscriber):
+        self._subscribers.pop(subscriber.sock, None)
+        try:
+            self._selector.unregister(subscriber.sock)
+        except (KeyError, ValueError):
+            pass
+        subscriber.sock.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self._lock:
+                    behind = [s for s in self._subscribers.values() if s.pending]
+                    for subscriber in behind:
+                        self._flush(subscriber)
+                for key, _ in self._selector.select(0.005 if behind else 0.2):
+                    if key.fileobj is self._server:
+                        self._accept()
+                    else:
+                        self._read(key.fileobj)
+            except Exception:
+                logger.exception('bus publisher loop failed')
+
+    def _accept(self):
+        try:
+            sock, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        with self._lock:
+            self._subscribers[sock] = _Subscriber(sock)
+            self._selector.register(sock, selectors.EVENT_READ)
+
+    def _read(self, sock):
+        with self._lock:
+            subscriber = self._subscribers.get(sock)
+            if subscriber is None:
+                return
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b''
+            if not data:
+                self._drop(subscriber)
+                return
+            subscriber.received += data
+            try:
+                # subscribers only send (un)subscribe frames, anything else is a broken or hostile peer
+                for kind, topic, _ in _frames(subscriber.received, _CONTROL_LIMIT):
+                    if kind == SUBSCRIBE:
+                        subscriber.prefixes.add(topic)
+                    elif kind == UNSUBSCRIBE:
+                        subscriber.prefixes.discard(topic)
+                    else:
+                        raise ValueError(f'unexpected frame kind {kind}')
+                    subscriber.matches.clear()
+            except (ValueError, struct.error) as e:
+                logger.warning('bus subscriber %s dropped: %s', sock.fileno(), e)
+                self._drop(subscriber)
+
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for subscriber in list(self._subscribers.values()):
+                self._drop(subscriber)
+        if self._server is not None:
+            self._selector.close()
+            self._server.close()
+            _unlink_socket(self.path)
+
+
+class BusSubscriber:
+    """
+    :param path: Unix socket path of the publisher
+    :param on_event: Callback(event) for every event received, called from the reader thread
+    :param topics: Topic prefixes to receive, e.g. ['trade@', 'depth_update@btc_usdt'], '' for all
+    """
+
+    def __init__(self, path: str = '/tmp/spikex-bus.sock', on_event=None, topics=('',)):
+        self.path = path
+        self.on_event = on_event
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._send_lock = threading.Lock()
+        for topic in topics:
+            self.subscribe(topic)
+        self.received = 0
+        self._thread = threading.Thread(target=self._run, name='spikex-bus-subscriber', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, prefix: str):
+        with self._send_lock:
+            self.sock.sendall(_frame(SUBSCRIBE, prefix))
+
+    def unsubscribe(self, prefix: str):
+        with self._send_lock:
+            self.sock.sendall(_frame(UNSUBSCRIBE, prefix))
+
+    def _run(self):
+        buffer = bytearray()
+        while True:
+            try:
+                data = self.sock.recv(1 << 16)
+            except OSError:
+                data = b''
+            if not data:
+                logger.info('bus %s closed', self.path)
+                return
+            buffer += data
+            for kind, topic, payload in _frames(buffer):
+                self.received += 1
+                if self.on_event is None:
+                    continue
+                try:
+                    self.on_event(decode(kind, topic, payload))
+                except Exception:
+                    logger.exception('bus on_event failed')
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._thread.join()
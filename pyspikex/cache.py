@@ -0,0 +1,285 @@
+# -*- coding:utf-8 -*-
+"""
+TTL cache for slow-changing exchange metadata with background refresh and an
+on-disk snapshot for warm starts.
+
+    cache = MetadataCache(spot=spot, perp=perp, path='metadata.json')
+    cache.load()       # warm start from the last snapshot, no REST calls
+    cache.start()      # refresh entries in the background before they expire
+    cache.get_symbol_config()
+    cache.get_market_config('btc_usdt')
+
+Reads return the cached value whenever one exists, even if it has expired; an
+expired entry is handed to the background refresher instead of being fetched
+on the caller's thread. Only a key that was never fetched (and is not in the
+snapshot) blocks on a REST call. Failed refreshes, including Perp
+(code, success, error) failures and non-zero returnCodes, are never cached;
+the key is retried with exponential backoff while the old value is served.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger('spikex')
+
+
+class MetadataCache:
+    """
+    :param spot: pyspikex.spot.Spot, enables the spot accessors
+    :param perp: pyspikex.perp.Perp, enables the perp accessors
+    :param path: Snapshot file used by load()/save(), saved after each background refresh
+    :param ttl: {name: seconds} overriding DEFAULT_TTL
+    :param refresh_ahead: Fraction of the TTL after which an entry is refreshed in the background
+    :param retry_backoff: Seconds before retrying a failed refresh, doubled on every failure of the key
+    :param max_backoff: Longest wait between retries of a failing key
+    """
+    DEFAULT_TTL = {
+        'spot.symbol_config': 3600,
+        'spot.currencies': 3600,
+        'perp.market_config': 3600,
+        'perp.all_pair_info': 3600,
+        'perp.symbol_list': 3600,
+        'perp.leverage_bracket_list': 3600,
+    }
+
+    def __init__(self, spot=None, perp=None, path=None, ttl=None, refresh_ahead=0.8, retry_backoff=5.0,
+                 max_backoff=300.0):
+        self.spot = spot
+        self.perp = perp
+        self.path = path
+        self.refresh_ahead = refresh_ahead
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._loaders = {}
+        self._entries = {}  # key -> [value, fetched_at, name, args]
+        self._failures = {}  # key -> (consecutive failures, next attempt time)
+        self._lock = threading.Lock()
+        self._due = set()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._refresher = None  # one-off refresh thread while start() was not called
+        ttl = dict(self.DEFAULT_TTL, **(ttl or {}))
+        if spot is not None:
+            self.register('spot.symbol_config', spot.get_symbol_config, ttl['spot.symbol_config'])
+            self.register('spot.currencies', spot.get_currencies, ttl['spot.currencies'])
+        if perp is not None:
+            self.register('perp.market_config', perp.get_market_config, ttl['perp.market_config'])
+            self.register('perp.all_pair_info', perp.get_all_pair_info, ttl['perp.all_pair_info'])
+            self.register('perp.symbol_list', perp.get_symbol_list, ttl['perp.symbol_list'])
+            self.register('perp.leverage_bracket_list', perp.get_leverage_bracket_list,
+                          ttl['perp.leverage_bracket_list'])
+
+    def register(self, name, loader, ttl):
+        """
+        Register a cached endpoint
+        :param name: Cache name, also used in the snapshot
+        :param loader: Callable fetching the value, called with the arguments passed to get()
+        :param ttl: Seconds a value stays fresh
+        """
+        self._loaders[name] = (loader, ttl)
+
+    # -----------------------------------Accessors-----------------------------------
+
+    def get_symbol_config(self, symbol: str = None, symbols: list = None):
+        """Cached Spot.get_symbol_config"""
+        return self.get('spot.symbol_config', symbol, symbols)
+
+    def get_currencies(self):
+        """Cached Spot.get_currencies"""
+        return self.get('spot.currencies')
+
+    def get_market_config(self, symbol):
+        """Cached Perp.get_market_config, returns (code, success, error) like the client"""
+        return self.get('perp.market_config', symbol)
+
+    def get_all_pair_info(self):
+        """Cached Perp.get_all_pair_info"""
+        return self.get('perp.all_pair_info')
+
+    def get_symbol_list(self):
+        """Cached Perp.get_symbol_list"""
+        return self.get('perp.symbol_list')
+
+    def get_leverage_bracket_list(self):
+        """Cached Perp.get_leverage_bracket_list"""
+        return self.get('perp.leverage_bracket_list')
+
+    # -----------------------------------Core-----------------------------------
+
+    @staticmethod
+    def _key(name, args):
+        return name if not any(a is not None for a in args) else f'{name}:{json.dumps(args)}'
+
+    def get(self, name, *args):
+        """
+        Cached value of loader(*args): fresh or stale values are returned immediately
+        (stale ones are refreshed in the background), missing ones are fetched synchronously
+        """
+        key = self._key(name, args)
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._refresh(key, name, list(args))
+        if time.time() - entry[1] > self._loaders[name][1] * self.refresh_ahead:
+            self._schedule(key)
+        return entry[0]
+
+    def put(self, name, value, *args):
+        """Store a value fetched elsewhere as if get(name, *args) had just loaded it"""
+        with self._lock:
+            self._entries[self._key(name, args)] = [value, time.time(), name, list(args)]
+
+    def invalidate(self, name=None):
+        """Drop entries of one name, or everything when name is None"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if name is None or e[2] == name]:
+                del self._entries[key]
+
+    @staticmethod
+    def _failed(value):
+        """Perp (code, success, error) failure or business error, not to be cached"""
+        if not (isinstance(value, tuple) and len(value) == 3):
+            return False
+        _, success, error = value
+        return error is not None or (isinstance(success, dict) and success.get('returnCode') not in (0, None))
+
+    def _refresh(self, key, name, args):
+        loader, _ = self._loaders[name]
+        value = loader(*args)
+        if self._failed(value):
+            return value
+        with self._lock:
+            self._entries[key] = [value, time.time(), name, args]
+            self._failures.pop(key, None)
+        return value
+
+    def _backing_off(self, key, now):
+        failure = self._failures.get(key)
+        return failure is not None and now < failure[1]
+
+    def _failure(self, key):
+        with self._lock:
+            count = self._failures.get(key, (0, 0))[0] + 1
+            delay = min(self.retry_backoff * 2 ** (count - 1), self.max_backoff)
+            self._failures[key] = (count, time.time() + delay)
+        return delay
+
+    def _schedule(self, key):
+        with self._lock:
+            if key in self._due or self._backing_off(key, time.time()):
+                return
+            self._due.add(key)
+            if self._thread is not None and self._thread.is_alive():
+                self._wakeup.set()
+            elif self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_pending, name='spikex-metadata-refresh',
+                                                   daemon=True)
+                self._refresher.start()
+
+    def _refresh_pending(self):
+        while True:
+            self._refresh_due()
+            with self._lock:
+                if not self._due:
+                    self._refresher = None
+                    return
+
+    def _refresh_due(self):
+        with self._lock:
+            due, self._due = self._due, set()
+            entries = {key: self._entries.get(key) for key in due}
+        refreshed = False
+        for key, entry in entries.items():
+            if entry is None:
+                continue
+            try:
+                value = self._refresh(key, entry[2], entry[3])
+                error = (value[2] or value[1]) if self._failed(value) else None
+            except Exception as e:
+                error = e
+            if error is None:
+                refreshed = True
+                continue
+            delay = self._failure(key)
+            logger.warning(f'Metadata refresh of {key} failed, serving cached value, retry in {delay:.1f}s: {error}')
+        if refreshed and self.path:
+            self.save()
+
+    # -----------------------------------Background refresh-----------------------------------
+
+    def start(self, poll_interval=1.0):
+        """Refresh entries in a daemon thread once they pass refresh_ahead of their TTL"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(poll_interval,), name='spikex-metadata-cache',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self, poll_interval):
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                for key, (_, fetched, name, _) in self._entries.items():
+                    if now - fetched > self._loaders[name][1] * self.refresh_ahead and not self._backing_off(key, now):
+                        self._due.add(key)
+            if self._due:
+                self._refresh_due()
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+
+    # -----------------------------------Snapshot-----------------------------------
+
+    def save(self, path=None):
+        """Write all entries to path atomically"""
+        path = path or self.path
+        with self._lock:
+            data = {'version': 1, 'saved': time.time(),
+                    'entries': [{'key': k, 'name': e[2], 'args': e[3], 'fetched': e[1], 'value': e[0]}
+                                for k, e in self._entries.items()]}
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                   dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load(self, path=None, max_age=None):
+        """
+        Load a snapshot written by save(), entries keep their original fetch time so expired ones are
+        served once and refreshed in the background
+        :param max_age: Ignore entries fetched more than max_age seconds ago
+        :return: Number of entries loaded
+        """
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Metadata snapshot {path} unreadable, starting cold: {e}')
+            return 0
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for item in data.get('entries', []):
+                if item['name'] not in self._loaders or (max_age is not None and now - item['fetched'] > max_age):
+                    continue
+                value = item['value']
+                if isinstance(value, list) and item['name'].startswith('perp.') and len(value) == 3:
+                    value = tuple(value)
+                self._entries[item['key']] = [value, item['fetched'], item['name'], item['args']]
+                loaded += 1
+        return loaded
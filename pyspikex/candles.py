@@ -0,0 +1,515 @@
+# -*- coding:utf-8 -*-
+"""
+Local OHLCV candles built from the trade stream.
+
+One trade@{symbol} subscription feeds bars of any number of intervals, from
+1s to 1w (weekly bars start on Monday, as the exchange's do), updated on every
+trade instead of once per second per kline subscription:
+
+    builder = CandleBuilder(['1s', '1m', '5m', '1h'], on_close=print)
+    builder.start()                       # closes bars on time even when no trade arrives
+
+    def on_message(_, message):
+        builder.handle(message)
+
+    builder.current('btc_usdt', '1m')     # Candle being built
+    builder.candles('btc_usdt', '1s', 60) # last 60 closed 1s candles
+
+Closed bars are kept per symbol and interval in a RingBuffer. A timer wheel
+schedules each open bar's close close_delay ms after its end, so trades that
+reach us a little late still count; a trade of the next bar closes it at once.
+Once a bar has closed, the next one starts flat at the last close, so every
+series is continuous, and takes its open from its first trade.
+
+CandleSeries keeps one exchange kline series gap-free across the REST
+backfill and the kline@{symbol},{interval} stream:
+
+    series = CandleSeries(spot, 'btc_usdt', '1m', capacity=1440)
+    ws = SpotWebsocketStreamClient(on_message=lambda _, message: series.handle(message))
+    series.start(ws)                      # subscribe, backfill, then replay what the stream sent meanwhile
+    series.numpy('close')                 # one bar per minute, oldest first, no holes
+
+Bars are aligned to the open times the exchange sends: weekly bars start on
+Monday (the epoch was a Thursday) until the first bar received says
+otherwise. A missing bar (a dropped message or a reconnect) is filled with a
+flat placeholder at once and re-fetched over REST for just that range. Trades older than the
+open bar are counted in `late` and dropped.
+"""
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from pyspikex.ring import RingBuffer
+from pyspikex.websocket.decoders import KlineEvent, StreamDecoder, TradeEvent
+
+logger = logging.getLogger('spikex')
+
+Candle = namedtuple('Candle', 'symbol interval time open high low close qty amount trades')
+
+_UNITS = {'s': 1000, 'm': 60000, 'h': 3600000, 'd': 86400000, 'w': 604800000}
+_MONDAY = 4 * 86400000  # first Monday 00:00 UTC after the epoch (a Thursday)
+COLUMNS = (('time', 'q'), ('open', 'd'), ('high', 'd'), ('low', 'd'), ('close', 'd'), ('qty', 'd'),
+           ('amount', 'd'), ('trades', 'q'))
+KLINE_COLUMNS = COLUMNS[:-1]
+
+
+def interval_ms(interval: str) -> int:
+    """'1s', '15m', '4h', '1d', '1w' -> milliseconds"""
+    try:
+        return int(interval[:-1]) * _UNITS[interval[-1]]
+    except (KeyError, ValueError):
+        raise ValueError(f'unsupported interval: {interval}')
+
+
+def _origin(interval: str, length: int) -> int:
+    """Open time offset of the bars from the epoch, weekly bars start on Monday"""
+    return _MONDAY % length if interval.endswith('w') else 0
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: scheduling is O(1), advance() only scans the slots of the ticks that passed
+    :param tick_ms: Slot width in milliseconds
+    :param slots: Number of slots, deadlines further away than one turn wait in their slot
+    """
+
+    def __init__(self, tick_ms: int = 100, slots: int = 1024):
+        self.tick_ms = tick_ms
+        self._slots = [[] for _ in range(slots)]
+        self._current = None
+
+    def schedule(self, deadline: int, item):
+        tick = -(-deadline // self.tick_ms)
+        if self._current is None:
+            self._current = deadline // self.tick_ms
+        elif tick < self._current:
+            tick = self._current
+        self._slots[tick % len(self._slots)].append((deadline, item))
+
+    def advance(self, now: int) -> list:
+        """:return: Items whose deadline is <= now, in deadline order"""
+        now_tick = now // self.tick_ms
+        start = now_tick if self._current is None else self._current
+        due = []
+        for tick in range(start, start + min(now_tick - start + 1, len(self._slots))):
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                (due if entry[0] <= now else keep).append(entry)
+            slot[:] = keep
+        self._current = now_tick
+        due.sort(key=lambda entry: entry[0])
+        return [item for _, item in due]
+
+
+class _Series:
+    """Open bar and closed bars of one symbol and interval"""
+    __slots__ = ('symbol', 'interval', 'length', 'origin', 'ring', 'start', 'open', 'high', 'low', 'close', 'qty',
+                 'amount', 'trades')
+
+    def __init__(self, symbol, interval, length, capacity):
+        self.symbol = symbol
+        self.interval = interval
+        self.length = length
+        self.origin = _origin(interval, length)
+        self.ring = RingBuffer(capacity, COLUMNS)
+        self.start = None
+
+    @property
+    def end(self):
+        return self.start + self.length
+
+    def open_time(self, time_ms):
+        """Start of the bar containing time_ms"""
+        return time_ms - (time_ms - self.origin) % self.length
+
+    def begin(self, start, price):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.qty = self.amount = 0.0
+        self.trades = 0
+
+    def add(self, price, qty):
+        if not self.trades:
+            # a bar opened flat at the previous close takes its open from its first trade
+            self.open = self.high = self.low = price
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.qty += qty
+        self.amount += price * qty
+        self.trades += 1
+
+    def candle(self):
+        return Candle(self.symbol, self.interval, self.start, self.open, self.high, self.low, self.close,
+                      self.qty, self.amount, self.trades)
+
+    def roll(self, until):
+        """Close the open bar and the flat bars up to the one containing until, returns the closed candles"""
+        closed = []
+        while self.end <= until:
+            candle = self.candle()
+            self.ring.append(*candle[2:])
+            closed.append(candle)
+            if until - self.end >= self.length * self.ring.capacity:
+                # gap longer than the buffer, skip the flat bars nobody could read
+                self.begin(self.open_time(until), self.close)
+            else:
+                self.begin(self.end, self.close)
+        return closed
+
+
+class CandleBuilder:
+    """
+    :param intervals: Interval strings, e.g. ['1s', '1m', '1h', '1d']
+    :param capacity: Closed candles kept per symbol and interval
+    :param on_close: Callback(candle) for every closed candle
+    :param clock: Callable returning the current time in milliseconds, e.g. ClockSync.time_ms,
+                  used to close bars on time
+    :param close_delay: Milliseconds a bar stays open past its end when no trade of the next bar has arrived,
+                        to wait for trades delivered late; trades older than the open bar are dropped
+    """
+
+    def __init__(self, intervals, capacity: int = 1000, on_close=None, clock=None, close_delay: int = 250):
+        self.intervals = {interval: interval_ms(interval) for interval in intervals}
+        self.capacity = capacity
+        self.on_close = on_close
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self.close_delay = close_delay
+        self.wheel = TimerWheel(tick_ms=min(100, min(self.intervals.values())))
+        self.decoder = StreamDecoder()
+        self._series = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.late = 0
+
+    def handle(self, message):
+        """
+        Feed a trade stream message (raw frame, parsed dict or TradeEvent)
+        :return: True if it was a trade
+        """
+        if isinstance(message, TradeEvent):
+            event = message
+        else:
+            if isinstance(message, (str, bytes, bytearray)):
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    return False
+            if not isinstance(message, dict) or message.get('topic') != 'trade':
+                return False
+            event = self.decoder.decode_data('trade', message.get('event'), message.get('data'))
+            if not isinstance(event, TradeEvent):
+                return False
+        self.on_trade(event.symbol, event.time, float(event.price), float(event.qty))
+        return True
+
+    def on_trade(self, symbol, time_ms, price, qty):
+        closed = []
+        with self._lock:
+            for interval, length in self.intervals.items():
+                series = self._series.get((symbol, interval))
+                if series is None:
+                    series = self._series[(symbol, interval)] = _Series(symbol, interval, length, self.capacity)
+                if series.start is None:
+                    series.begin(series.open_time(time_ms), price)
+                    self.wheel.schedule(series.end + self.close_delay, series)
+                elif time_ms >= series.end:
+                    closed += series.roll(time_ms)
+                    self.wheel.schedule(series.end + self.close_delay, series)
+                elif time_ms < series.start:
+                    self.late += 1
+                    continue
+                series.add(price, qty)
+        self._emit(closed)
+
+    def advance(self, now_ms=None):
+        """Close every bar that ended more than close_delay ago, called by the start() thread"""
+        now_ms = self.clock() if now_ms is None else now_ms
+        until = now_ms - self.close_delay
+        closed = []
+        with self._lock:
+            for series in self.wheel.advance(now_ms):
+                if series.start is None or series.end > until:
+                    continue  # already rolled by a trade, its new end is scheduled
+                closed += series.roll(until)
+                self.wheel.schedule(series.end + self.close_delay, series)
+        self._emit(closed)
+        return closed
+
+    def _emit(self, closed):
+        if self.on_close is None:
+            return
+        for candle in closed:
+            try:
+                self.on_close(candle)
+            except Exception:
+                logger.exception('candle on_close failed')
+
+    def current(self, symbol, interval):
+        """Candle being built, None before the first trade"""
+        series = self._series.get((symbol, interval))
+        if series is None or series.start is None:
+            return None
+        with self._lock:
+            return series.candle()
+
+    def candles(self, symbol, interval, n=None):
+        """Last n closed candles, oldest first"""
+        series = self._series.get((symbol, interval))
+        if series is None:
+            return []
+        with self._lock:
+            return [Candle(symbol, interval, *row) for row in series.ring.rows(n)]
+
+    def buffer(self, symbol, interval):
+        """RingBuffer of closed candles, columns time open high low close qty amount trades"""
+        series = self._series.get((symbol, interval))
+        return None if series is None else series.ring
+
+    def start(self, tick: float = 0.05):
+        """Close bars on time in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(tick,), name='spikex-candles', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, tick):
+        while not self._stop.wait(tick):
+            try:
+                self.advance()
+            except Exception:
+                logger.exception('candle advance failed')
+
+
+def _kline_row(item):
+    """REST kline dict (spot q, perp a for the quantity) -> (t, o, h, l, c, q, v)"""
+    qty = item['q'] if 'q' in item else item.get('a', 0)
+    return (int(item['t']), float(item['o']), float(item['h']), float(item['l']), float(item['c']), float(qty or 0),
+            float(item.get('v') or 0))
+
+
+class CandleSeries:
+    """
+    :param client: pyspikex.spot.Spot (get_kline) or pyspikex.perp.Perp (get_k_line)
+    :param symbol: Trading pair
+    :param interval: Kline interval, fixed-length only (not 1M)
+    :param capacity: Bars kept
+    :param page: Bars requested per REST call
+    :param auto_repair: Re-fetch missing bars in a background thread as soon as a gap is seen,
+                        otherwise call repair()
+    :param on_bar: Callback(series, time) after a bar was added or changed
+    """
+
+    def __init__(self, client, symbol, interval, capacity: int = 1000, page: int = 1000, auto_repair: bool = True,
+                 on_bar=None):
+        self.client = client
+        self.symbol = symbol
+        self.interval = interval
+        self.step = interval_ms(interval)
+        # open time of the bars modulo step, replaced by the exchange's once a bar arrives
+        self.origin = _origin(interval, self.step)
+        self.page = page
+        self.auto_repair = auto_repair
+        self.on_bar = on_bar
+        self.ring = RingBuffer(capacity, KLINE_COLUMNS)
+        self.decoder = StreamDecoder()
+        self.gaps = []  # [(first open time, last open time)] of placeholder bars waiting for REST data
+        self._pending = []  # stream bars received during the backfill
+        self._live = False
+        self._lock = threading.RLock()
+        self._repairing = False
+
+    def _now(self):
+        clock = getattr(self.client, 'clock', None)
+        return clock.time_ms() if clock is not None else int(time.time() * 1000)
+
+    def fetch(self, start_time, end_time) -> list:
+        """REST bars with open time in [start_time, end_time] as (t, o, h, l, c, q, v), oldest first"""
+        rows = {}
+        while start_time <= end_time:
+            limit = min(self.page, (end_time - start_time) // self.step + 1)
+            if hasattr(self.client, 'get_kline'):
+                items = self.client.get_kline(self.symbol, self.interval, start_time, end_time, limit)
+            else:
+                code, success, error = self.client.get_k_line(self.symbol, self.interval, start_time, end_time, limit)
+                if error is not None:
+                    raise RuntimeError(f'get_k_line failed, code:{code} error:{error}')
+                items = success.get('result') if isinstance(success, dict) else success
+            page = [_kline_row(item) for item in items or ()]
+            page = [row for row in page if start_time <= row[0] <= end_time and row[0] not in rows]
+            if not page:
+                break
+            rows.update((row[0], row) for row in page)
+            start_time = max(rows) + self.step
+        return [rows[t] for t in sorted(rows)]
+
+    def start(self, ws=None, bars: int = None):
+        """
+        Subscribe the kline stream, backfill the last bars over REST, then apply the stream bars received
+        meanwhile, so the seam has neither holes nor duplicates
+        :param ws: SpotWebsocketStreamClient or PerpWebsocketStreamClient whose on_message feeds handle()
+        :param bars: Bars to backfill, default capacity
+        """
+        if ws is not None:
+            ws.kline(self.symbol, self.interval)
+        end = self._open_time(self._now())
+        rows = self.fetch(end - (min(bars or self.ring.capacity, self.ring.capacity) - 1) * self.step, end)
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+            pending, self._pending = self._pending, []
+            for row in pending:
+                self._apply(row)
+            self._live = True
+        self._check_gaps()
+        return self
+
+    def handle(self, message):
+        """
+        Feed a kline stream message (raw frame, parsed dict or KlineEvent)
+        :return: True if it was a bar of this series
+        """
+        if isinstance(message, KlineEvent):
+            event = message
+        else:
+            if isinstance(message, (str, bytes, bytearray)):
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    return False
+            if not isinstance(message, dict) or message.get('topic') != 'kline':
+                return False
+            event = self.decoder.decode_data('kline', message.get('event'), message.get('data'))
+            if not isinstance(event, KlineEvent):
+                return False
+        if event.symbol != self.symbol or (event.interval and event.interval != self.interval):
+            return False
+        row = (int(event.time), float(event.open), float(event.high), float(event.low), float(event.close),
+               float(event.qty), float(event.amount))
+        with self._lock:
+            if not self._live:
+                self._pending.append(row)
+                return True
+            self._apply(row)
+        self._check_gaps()
+        return True
+
+    def _apply(self, row):
+        """Add or overwrite the bar at row's open time, placeholders fill any hole before it"""
+        ring = self.ring
+        t = row[0]
+        if not len(ring):
+            self.origin = t % self.step
+            ring.append(*row)
+        elif (t - self.origin) % self.step:
+            logger.warning('candle series %s %s dropped bar at %s, not aligned to %s', self.symbol, self.interval,
+                           t, ring.get('time'))
+            return
+        else:
+            newest = ring.get('time')
+            if t > newest:
+                if t > newest + self.step:
+                    first = max(newest + self.step, t - (ring.capacity - 1) * self.step)
+                    close = ring.get('close')
+                    for missing in range(first, t, self.step):
+                        ring.append(missing, close, close, close, close, 0.0, 0.0)
+                    self.gaps.append((first, t - self.step))
+                ring.append(*row)
+            else:
+                back = (newest - t) // self.step
+                if back >= len(ring):
+                    return  # older than the series
+                for name, value in zip(ring.names[1:], row[1:]):
+                    ring.set(name, value, -1 - back)
+        if self.on_bar is not None:
+            try:
+                self.on_bar(self, t)
+            except Exception:
+                logger.exception('candle series on_bar failed')
+
+    def _open_time(self, time_ms):
+        """Open time of the bar containing time_ms"""
+        return time_ms - (time_ms - self.origin) % self.step
+
+    def _check_gaps(self):
+        with self._lock:
+            if not self.gaps or not self.auto_repair or self._repairing:
+                return
+            self._repairing = True
+        threading.Thread(target=self._repair_worker, name='spikex-candle-repair', daemon=True).start()
+
+    def _repair_worker(self):
+        try:
+            self.repair()
+        except Exception as e:
+            logger.error('candle repair %s %s failed: %s', self.symbol, self.interval, e)
+        finally:
+            with self._lock:
+                self._repairing = False
+
+    def repair(self) -> int:
+        """
+        Re-fetch the placeholder bars over REST, one request per gap
+        :return: Bars repaired
+        """
+        with self._lock:
+            gaps, self.gaps = self.gaps, []
+        repaired = 0
+        for i, (first, last) in enumerate(gaps):
+            try:
+                rows = self.fetch(first, last)
+            except Exception:
+                with self._lock:
+                    self.gaps = gaps[i:] + self.gaps
+                raise
+            with self._lock:
+                for row in rows:
+                    self._apply(row)
+            repaired += len(rows)
+        return repaired
+
+    def resync(self):
+        """
+        Re-fetch from the newest bar up to now, call it after the stream reconnected (e.g. from on_open):
+        the last update of the bar open when the connection dropped may have been missed
+        """
+        with self._lock:
+            if not len(self.ring):
+                return 0
+            start = self.ring.get('time')
+        rows = self.fetch(start, self._open_time(self._now()))
+        with self._lock:
+            for row in rows:
+                self._apply(row)
+        return len(rows)
+
+    def __len__(self):
+        return len(self.ring)
+
+    def candles(self, n=None):
+        """Last n bars, oldest first, as Candle (trades is None, the kline endpoints do not send it)"""
+        with self._lock:
+            return [Candle(self.symbol, self.interval, *row, None) for row in self.ring.rows(n)]
+
+    def column(self, name, n=None):
+        """Last n values of time, open, high, low, close, qty or amount as an array, oldest first"""
+        with self._lock:
+            return self.ring.column(name, n)
+
+    def numpy(self, name, n=None):
+        """column() as an ndarray, requires NumPy"""
+        with self._lock:
+            return self.ring.numpy(name, n)
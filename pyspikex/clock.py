@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+"""
+Server clock offset estimation for signed requests.
+
+Signed requests carry xt-validate-timestamp and are rejected with AUTH_105
+(request expired) when it falls outside the server's receive window. ClockSync
+keeps an estimate of server time so signers don't depend on the local clock:
+
+    spot = Spot(host, access_key=ak, secret_key=sk)
+    spot.enable_clock_sync()        # or Spot(..., clock=shared_clock)
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger('spikex')
+
+
+class ClockSync:
+    """
+    RTT-compensated server clock estimator
+
+    Every sync sends a short burst of server time requests and keeps the probe
+    with the lowest round trip, whose midpoint is the least skewed by queuing.
+    The measured offset is blended into a prediction (offset + drift * elapsed)
+    and drift is fitted over the recent sync history, so the estimate stays
+    accurate between syncs.
+
+    :param fetch_server_time: Callable returning server time in milliseconds, e.g. Spot.get_time
+    :param interval: Seconds between background syncs
+    :param probes: Requests per sync burst
+    :param alpha: Weight of a new measurement against the prediction, 0..1
+    :param history: Number of syncs used to fit drift
+    """
+
+    def __init__(self, fetch_server_time, interval=30, probes=5, alpha=0.3, history=16):
+        self.fetch_server_time = fetch_server_time
+        self.interval = interval
+        self.probes = probes
+        self.alpha = alpha
+        self.history = history
+        # (offset seconds at ref, drift seconds per second, ref local time) read as one tuple for consistency
+        self._state = (0.0, 0.0, time.time())
+        self._samples = []
+        self.rtt = None
+        self.last_sync = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def probe(self):
+        """
+        One server time request
+        :return: (offset seconds, round trip seconds, local midpoint time)
+        """
+        t0 = time.time()
+        server_ms = self.fetch_server_time()
+        t1 = time.time()
+        midpoint = (t0 + t1) / 2
+        return server_ms / 1000.0 - midpoint, t1 - t0, midpoint
+
+    def sync(self):
+        """
+        Run one probe burst and update the estimate
+        :return: current offset in seconds
+        """
+        best = min((self.probe() for _ in range(self.probes)), key=lambda p: p[1])
+        measured, rtt, local = best
+        with self._lock:
+            if self.last_sync is None:
+                offset = measured
+            else:
+                predicted = self.offset_at(local)
+                offset = predicted + self.alpha * (measured - predicted)
+            self._samples.append((local, measured))
+            del self._samples[:-self.history]
+            self._state = (offset, self._fit_drift(), local)
+            self.rtt = rtt
+            self.last_sync = local
+        return offset
+
+    def _fit_drift(self):
+        """Least squares slope of measured offsets over local time, 0 until the history spans a minute"""
+        samples = self._samples
+        if len(samples) < 3 or samples[-1][0] - samples[0][0] < 60:
+            return 0.0
+        n = len(samples)
+        mean_t = sum(t for t, _ in samples) / n
+        mean_o = sum(o for _, o in samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in samples)
+        if not var:
+            return 0.0
+        return sum((t - mean_t) * (o - mean_o) for t, o in samples) / var
+
+    def offset_at(self, local):
+        offset, drift, ref = self._state
+        return offset + drift * (local - ref)
+
+    @property
+    def offset(self):
+        """Estimated server time minus local time, in seconds"""
+        return self.offset_at(time.time())
+
+    @property
+    def drift(self):
+        """Estimated clock drift, seconds of offset change per second"""
+        return self._state[1]
+
+    @property
+    def uncertainty(self):
+        """Upper bound of the offset error from the last sync (half its round trip), None before the first sync"""
+        return None if self.rtt is None else self.rtt / 2
+
+    def time(self):
+        """Estimated server time in seconds"""
+        now = time.time()
+        return now + self.offset_at(now)
+
+    def time_ms(self):
+        """Estimated server time in milliseconds"""
+        return int(self.time() * 1000)
+
+    def start(self):
+        """Sync once synchronously, then keep syncing every `interval` seconds in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return self
+        try:
+            self.sync()
+        except Exception as e:
+            logger.warning(f'Clock sync failed, using local time until next sync: {e}')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='spikex-clock-sync', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f'Clock sync failed, keeping previous estimate: {e}')
@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+"""
+Fixed-point decimal numbers for prices, quantities and amounts.
+
+The exchange sends numbers as decimal strings and enforces exact tick and lot
+multiples, which floats can't represent (round(30000 * 0.9, 2) is not always
+what gets sent). Fixed keeps the value as an integer count of 10^-scale units,
+so parsing, comparison and +, -, * are exact integer operations:
+
+    price = Fixed.parse('30000.01')            # Fixed('30000.01'), units=3000001, scale=2
+    qty = Fixed.parse('0.001')
+    str(price * qty)                           # '30.00001'
+    (price * Fixed.parse('0.9')).quantize(2)   # Fixed('27000.01')
+
+Hot paths that stay at one symbol's scale (order books, validators, rolling
+statistics) can work on the integer `units` directly and convert back with
+Fixed(units, scale) only at the edges.
+
+Fixed values may be used anywhere in request params; the clients encode them
+as decimal strings before signing.
+"""
+import sys
+from decimal import (Decimal, InvalidOperation, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN,
+                     ROUND_HALF_UP, ROUND_UP)
+
+_POW10 = [10 ** i for i in range(40)]
+_HASH_MODULUS = sys.hash_info.modulus
+
+
+def _pow10(n):
+    return _POW10[n] if n < 40 else 10 ** n
+
+
+def to_units(value, decimals):
+    """
+    Scale a number to an integer count of 10^-decimals units
+    :param value: str, int, float, Decimal or Fixed
+    :return: (units, exact) where exact is False if value had non-zero digits beyond `decimals`
+             (units is then truncated toward zero)
+    """
+    if isinstance(value, Fixed):
+        if value.scale <= decimals:
+            return value.units * _pow10(decimals - value.scale), True
+        q, r = divmod(abs(value.units), _pow10(value.scale - decimals))
+        return (-q if value.units < 0 else q), not r
+    if isinstance(value, int):
+        return value * _pow10(decimals), True
+    text = repr(value) if isinstance(value, float) else str(value)
+    if 'e' in text or 'E' in text:
+        text = format(Decimal(text), 'f')
+    negative = text.startswith('-')
+    whole, _, frac = text.lstrip('+-').partition('.')
+    units = int(whole or '0') * _pow10(decimals) + (int(frac[:decimals].ljust(decimals, '0')) if decimals else 0)
+    exact = not frac[decimals:].strip('0')
+    return (-units if negative else units), exact
+
+
+def from_units(units, decimals):
+    """Inverse of to_units, plain decimal string with exactly `decimals` fraction digits"""
+    if not decimals:
+        return str(units)
+    sign = '-' if units < 0 else ''
+    whole, frac = divmod(abs(units), _pow10(decimals))
+    return f'{sign}{whole}.{frac:0{decimals}d}'
+
+
+def _round_div(n, d, rounding):
+    """n / d rounded to an integer, d > 0"""
+    q, r = divmod(n, d)
+    if not r or rounding == ROUND_FLOOR:
+        return q
+    if rounding == ROUND_CEILING:
+        return q + 1
+    if rounding == ROUND_DOWN:
+        return q if n >= 0 else q + 1
+    if rounding == ROUND_UP:
+        return q + 1 if n >= 0 else q
+    twice = 2 * r
+    if twice != d:
+        return q + 1 if twice > d else q
+    if rounding == ROUND_HALF_UP:
+        return q + 1 if n >= 0 else q
+    if rounding == ROUND_HALF_EVEN:
+        return q + (q & 1)
+    raise ValueError(f'unsupported rounding: {rounding}')
+
+
+class Fixed:
+    """
+    Exact decimal number, value = units * 10^-scale
+    :param units: Integer mantissa
+    :param scale: Number of fraction digits
+    """
+    __slots__ = ('units', 'scale')
+
+    def __init__(self, units: int, scale: int = 0):
+        self.units = units
+        self.scale = scale
+
+    @classmethod
+    def parse(cls, value, scale: int = None, rounding=ROUND_HALF_EVEN):
+        """
+        :param value: str, int, float (via its shortest repr), Decimal or Fixed
+        :param scale: Fraction digits of the result, default: as many as the value has
+        :param rounding: decimal.ROUND_* mode used when value has more digits than scale
+        :raises ValueError: for text that is not a finite decimal number (NaN, infinity, underscores, garbage)
+        """
+        if value.__class__ is str:
+            text = value
+        elif isinstance(value, Fixed):
+            return value if scale is None else value.quantize(scale, rounding)
+        elif isinstance(value, int):
+            return cls(value * _pow10(scale or 0), scale or 0)
+        else:
+            text = repr(value) if isinstance(value, float) else str(value)
+        if '_' in text:
+            raise ValueError(f'invalid decimal: {value!r}')
+        whole, _, frac = text.partition('.')
+        try:
+            units = int(whole + frac) if frac else int(whole)
+        except ValueError:
+            try:
+                number = Decimal(text)
+            except InvalidOperation:
+                raise ValueError(f'invalid decimal: {value!r}') from None
+            if not number.is_finite():
+                raise ValueError(f'not a finite decimal: {value!r}')
+            sign, digits, exponent = number.as_tuple()
+            units = int(''.join(map(str, digits)) or '0') * (-1 if sign else 1)
+            if exponent > 0:
+                units *= _pow10(exponent)
+            fixed = cls(units, max(-exponent, 0))
+            return fixed if scale is None else fixed.quantize(scale, rounding)
+        if scale is None:
+            return cls(units, len(frac))
+        if len(frac) <= scale:
+            return cls(units * _pow10(scale - len(frac)), scale)
+        return cls(_round_div(units, _pow10(len(frac) - scale), rounding), scale)
+
+    def quantize(self, scale: int, rounding=ROUND_HALF_EVEN):
+        """Round to `scale` fraction digits"""
+        if scale >= self.scale:
+            return Fixed(self.units * _pow10(scale - self.scale), scale)
+        return Fixed(_round_div(self.units, _pow10(self.scale - scale), rounding), scale)
+
+    def to_tick(self, tick, rounding=ROUND_FLOOR):
+        """Round to a multiple of tick (a Fixed or anything Fixed.parse accepts)"""
+        tick = Fixed.parse(tick)
+        a, b, scale = self._align(tick)
+        return Fixed(_round_div(a, b, rounding) * b, scale)
+
+    def div(self, other, scale: int, rounding=ROUND_HALF_EVEN):
+        """self / other rounded to `scale` fraction digits"""
+        other = _coerce(other)
+        exponent = scale - self.scale + other.scale
+        n = self.units * _pow10(exponent) if exponent >= 0 else self.units
+        d = other.units if exponent >= 0 else other.units * _pow10(-exponent)
+        if d < 0:
+            n, d = -n, -d
+        return Fixed(_round_div(n, d, rounding), scale)
+
+    def _align(self, other):
+        if self.scale == other.scale:
+            return self.units, other.units, self.scale
+        if self.scale > other.scale:
+            return self.units, other.units * _pow10(self.scale - other.scale), self.scale
+        return self.units * _pow10(other.scale - self.scale), other.units, other.scale
+
+    def __add__(self, other):
+        a, b, scale = self._align(_coerce(other))
+        return Fixed(a + b, scale)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        a, b, scale = self._align(_coerce(other))
+        return Fixed(a - b, scale)
+
+    def __rsub__(self, other):
+        a, b, scale = self._align(_coerce(other))
+        return Fixed(b - a, scale)
+
+    def __mul__(self, other):
+        other = _coerce(other)
+        return Fixed(self.units * other.units, self.scale + other.scale)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Fixed(-self.units, self.scale)
+
+    def __abs__(self):
+        return Fixed(abs(self.units), self.scale)
+
+    def __bool__(self):
+        return self.units != 0
+
+    def __eq__(self, other):
+        # like Decimal, numbers compare by value and strings never equal a number; floats are left out so
+        # equality stays consistent with the numeric hash
+        if not isinstance(other, _COMPARABLE):
+            return NotImplemented
+        try:
+            a, b, _ = self._align(_coerce(other))
+        except (ValueError, ArithmeticError):
+            return False
+        return a == b
+
+    def _compare(self, other):
+        """Aligned units of self and other, None for types that do not order against Fixed"""
+        if not isinstance(other, _COMPARABLE):
+            return None
+        a, b, _ = self._align(_coerce(other))
+        return a, b
+
+    def __lt__(self, other):
+        units = self._compare(other)
+        return NotImplemented if units is None else units[0] < units[1]
+
+    def __le__(self, other):
+        units = self._compare(other)
+        return NotImplemented if units is None else units[0] <= units[1]
+
+    def __gt__(self, other):
+        units = self._compare(other)
+        return NotImplemented if units is None else units[0] > units[1]
+
+    def __ge__(self, other):
+        units = self._compare(other)
+        return NotImplemented if units is None else units[0] >= units[1]
+
+    def __hash__(self):
+        # the numeric hash of units / 10^scale, as Fraction and Decimal compute it, so a Fixed hashes like the
+        # equal int or Decimal
+        if not self.scale:
+            return hash(self.units)
+        h = hash(abs(self.units)) * pow(_pow10(self.scale), -1, _HASH_MODULUS) % _HASH_MODULUS
+        if self.units < 0:
+            h = -h
+        return -2 if h == -1 else h
+
+    def __float__(self):
+        return self.units / _pow10(self.scale)
+
+    def __int__(self):
+        q = abs(self.units) // _pow10(self.scale)
+        return -q if self.units < 0 else q
+
+    def __str__(self):
+        return from_units(self.units, self.scale)
+
+    def __repr__(self):
+        return f"Fixed('{self}')"
+
+    def __reduce__(self):
+        return Fixed, (self.units, self.scale)
+
+
+_COMPARABLE = (Fixed, int, Decimal)
+
+
+def _coerce(value):
+    return value if isinstance(value, Fixed) else Fixed.parse(value)
+
+
+def encode(value):
+    """
+    Replace Fixed values inside request params (dicts, lists, tuples) with their decimal strings,
+    so json.dumps and requests can serialize them; other values are returned unchanged
+    """
+    if isinstance(value, Fixed):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+
+def decode_fields(item: dict, fields, scale: int = None):
+    """
+    Parse the given string fields of a response item into Fixed in place, missing or null fields are skipped
+    :param fields: Field names, e.g. ('p', 'q') for trades or ('price', 'origQty') for orders
+    :param scale: Fixed scale (symbol precision), default: digits present in each string
+    :return: item
+    """
+    for field in fields:
+        value = item.get(field)
+        if value is not None:
+            item[field] = Fixed.parse(value, scale)
+    return item
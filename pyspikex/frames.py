@@ -0,0 +1,134 @@
+# -*- coding:utf-8 -*-
+"""
+NumPy conversion of bulk market data responses.
+
+Each converter turns a list-of-dicts result into a NumPy structured array, or
+with columns=True into {field: ndarray}, converting one whole column at a time
+instead of building a Python object per row:
+
+    klines = kline_array(spot.get_kline('btc_usdt', '1m', limit=1000))
+    klines['c'].mean()
+    trades = trade_array(spot.get_trade_recent('btc_usdt', 1000), columns=True)
+
+The clients expose the same conversions as get_*_array methods. Column names
+follow the exchange's short JSON keys; numeric strings become float64, times
+and ids int64, null values NaN.
+
+NumPy is an optional dependency: pip install pyspikex[numpy]
+"""
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# (column, JSON key, dtype)
+SPOT_KLINE = (('t', 't', 'i8'), ('o', 'o', 'f8'), ('h', 'h', 'f8'), ('l', 'l', 'f8'), ('c', 'c', 'f8'),
+              ('q', 'q', 'f8'), ('v', 'v', 'f8'))
+SPOT_TRADE = (('i', 'i', 'i8'), ('t', 't', 'i8'), ('p', 'p', 'f8'), ('q', 'q', 'f8'), ('v', 'v', 'f8'),
+              ('b', 'b', '?'))
+SPOT_TICKER_24H = (('s', 's', 'U32'), ('o', 'o', 'f8'), ('h', 'h', 'f8'), ('l', 'l', 'f8'), ('c', 'c', 'f8'),
+                   ('q', 'q', 'f8'), ('v', 'v', 'f8'), ('cv', 'cv', 'f8'), ('cr', 'cr', 'f8'))
+PERP_KLINE = (('t', 't', 'i8'), ('o', 'o', 'f8'), ('h', 'h', 'f8'), ('l', 'l', 'f8'), ('c', 'c', 'f8'),
+              ('a', 'a', 'f8'), ('v', 'v', 'f8'))
+PERP_TRADE = (('t', 't', 'i8'), ('p', 'p', 'f8'), ('a', 'a', 'f8'), ('m', 'm', 'U4'))
+PERP_TICKER = (('s', 's', 'U32'), ('t', 't', 'i8'), ('o', 'o', 'f8'), ('h', 'h', 'f8'), ('l', 'l', 'f8'),
+               ('c', 'c', 'f8'), ('a', 'a', 'f8'), ('v', 'v', 'f8'), ('r', 'r', 'f8'))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('NumPy is required for array conversions: pip install pyspikex[numpy]')
+
+
+def _column(rows, key, dtype):
+    try:
+        values = list(map(itemgetter(key), rows))
+    except KeyError:
+        values = [row.get(key) for row in rows]
+    try:
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        if dtype == 'f8':
+            return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+        if dtype == 'i8':
+            return np.array([0 if v is None else v for v in values], dtype=dtype)
+        return np.array(['' if v is None else v for v in values], dtype=dtype)
+
+
+def to_array(rows, spec, columns=False):
+    """
+    Convert rows with the given column spec
+    :param rows: List of dicts
+    :param spec: ((column, key, dtype), ...), e.g. SPOT_KLINE
+    :param columns: Return {column: ndarray} instead of a structured array
+    """
+    _require_numpy()
+    rows = rows or []
+    data = {name: _column(rows, key, dtype) for name, key, dtype in spec}
+    if columns:
+        return data
+    array = np.empty(len(rows), dtype=[(name, dtype) for name, _, dtype in spec])
+    for name, values in data.items():
+        array[name] = values
+    return array
+
+
+def _perp_rows(result):
+    """Unwrap a Perp (code, success, error) tuple, paged results keep their items"""
+    code, success, error = result
+    rows = success.get('result') if isinstance(success, dict) else None
+    if isinstance(rows, dict) and 'items' in rows:
+        rows = rows['items']
+    return code, rows, error
+
+
+def kline_array(rows, columns=False):
+    """Spot.get_kline result, columns t o h l c q v"""
+    return to_array(rows, SPOT_KLINE, columns)
+
+
+def trade_array(rows, columns=False):
+    """Spot.get_trade_recent / get_trade_history result, columns i t p q v b"""
+    return to_array(rows, SPOT_TRADE, columns)
+
+
+def ticker_24h_array(rows, columns=False):
+    """Spot.get_tickers_24h result, columns s o h l c q v cv cr"""
+    return to_array(rows, SPOT_TICKER_24H, columns)
+
+
+def depth_array(depth, bids='bids', asks='asks'):
+    """
+    Order book levels as (n, 2) float64 arrays of [price, quantity]
+    :param depth: Spot.get_depth result, or perp depth result with bids='b', asks='a'
+    :return: {'bids': ndarray, 'asks': ndarray}
+    """
+    _require_numpy()
+    return {'bids': np.array(depth.get(bids) or [], dtype='f8').reshape(-1, 2),
+            'asks': np.array(depth.get(asks) or [], dtype='f8').reshape(-1, 2)}
+
+
+def perp_kline_array(result, columns=False):
+    """Perp.get_k_line result -> (code, array, error), columns t o h l c a v"""
+    code, rows, error = _perp_rows(result)
+    return code, None if rows is None else to_array(rows, PERP_KLINE, columns), error
+
+
+def perp_trade_array(result, columns=False):
+    """Perp.get_last_price result -> (code, array, error), columns t p a m"""
+    code, rows, error = _perp_rows(result)
+    return code, None if rows is None else to_array(rows, PERP_TRADE, columns), error
+
+
+def perp_ticker_array(result, columns=False):
+    """Perp.get_tickers result -> (code, array, error), columns s t o h l c a v r"""
+    code, rows, error = _perp_rows(result)
+    return code, None if rows is None else to_array(rows, PERP_TICKER, columns), error
+
+
+def perp_depth_array(result):
+    """Perp.get_depth result -> (code, {'bids': ndarray, 'asks': ndarray}, error)"""
+    code, depth, error = _perp_rows(result)
+    return code, None if depth is None else depth_array(depth, bids='b', asks='a'), error
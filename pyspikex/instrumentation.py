@@ -0,0 +1,341 @@
+# -*- coding:utf-8 -*-
+"""
+Request instrumentation for the Spot and Perp REST clients.
+
+A hook is any object implementing ``on_request``; pass it to the client with
+``Spot(..., instrumentation=hook)`` or ``Perp(..., instrumentation=hook)``.
+``MetricsRecorder`` is the bundled hook: it aggregates per endpoint path
+request counts, status/rc/mc codes and per phase latency histograms, and
+exports them as a dict snapshot or Prometheus text.
+
+Phases (seconds):
+    connect: TCP connect, 0 when a pooled connection was reused
+    tls: TLS handshake, 0 for reused or plain HTTP connections
+    ttfb: request sent until response headers received
+    parse: body JSON decoding
+    total: whole call including the above
+"""
+import re
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+PHASES = ('connect', 'tls', 'ttfb', 'parse', 'total')
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_phases = threading.local()
+
+
+def endpoint_path(path):
+    """Path with numeric ids collapsed, e.g. /v4/order/123 -> /v4/order/{id}"""
+    return _ID_SEGMENT.sub('/{id}', path)
+
+
+class Instrumentation:
+    """
+    Base hook, every callback is a no-op. Subclass and override what you need.
+    Callbacks run on the requesting thread and must not raise.
+    """
+
+    def on_request(self, method, path, status, rc, mc, timings, error=None):
+        """
+        Called once per HTTP call
+        :param method: HTTP method
+        :param path: Endpoint path with numeric ids collapsed to {id}, e.g. /v4/order/{id}
+        :param status: HTTP status code, None if no response was received
+        :param rc: Business return code (Spot rc / Perp returnCode), None if unavailable
+        :param mc: Business message code (Spot mc / Perp error code or msgInfo), None if unavailable
+        :param timings: {phase: seconds}, see module docstring
+        :param error: Exception raised by the transport or decoding, if any
+        """
+
+    def on_circuit(self, group, old_state, new_state):
+        """
+        Called when a pyspikex.breaker.CircuitBreaker changes state
+        :param group: Endpoint group, e.g. /v4/public or /future/trade
+        :param old_state: 'closed', 'open' or 'half_open'
+        :param new_state: 'closed', 'open' or 'half_open'
+        """
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, observing a value is a bisect and two additions.
+    Bucket bounds are upper bounds in seconds; the last bucket is +Inf.
+    """
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate quantile q (0..1) by linear interpolation inside the bucket it falls in
+        :return: seconds, None if nothing was observed
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.BOUNDS[i - 1] if i else 0.0
+                upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.BOUNDS[-1] * 2
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.BOUNDS[-1]
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': dict(zip([str(b) for b in self.BOUNDS] + ['+Inf'], self.counts))}
+
+
+class _EndpointStats:
+    __slots__ = ('count', 'errors', 'codes', 'histograms')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.codes = {}
+        self.histograms = {phase: Histogram() for phase in PHASES}
+
+
+class MetricsRecorder(Instrumentation):
+    """
+    Thread-safe in-memory aggregation of request metrics per (method, path)
+
+    recorder = MetricsRecorder()
+    spot = Spot(host, access_key=ak, secret_key=sk, instrumentation=recorder)
+    ...
+    recorder.snapshot()       # plain dict
+    recorder.to_prometheus()  # Prometheus text exposition format
+    """
+
+    def __init__(self, namespace='spikex'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._circuits = {}
+
+    def on_request(self, method, path, status, rc, mc, timings, error=None):
+        code_key = (status, rc, mc)
+        with self._lock:
+            stats = self._stats.get((method, path))
+            if stats is None:
+                stats = self._stats[(method, path)] = _EndpointStats()
+            stats.count += 1
+            if error is not None:
+                stats.errors += 1
+            stats.codes[code_key] = stats.codes.get(code_key, 0) + 1
+            for phase, value in timings.items():
+                if value is not None:
+                    stats.histograms[phase].observe(value)
+
+    def on_circuit(self, group, old_state, new_state):
+        with self._lock:
+            _, transitions = self._circuits.get(group, (None, 0))
+            self._circuits[group] = (new_state, transitions + 1)
+
+    def circuits(self):
+        """
+        :return: {group: {'state': 'open', 'transitions': 3}} of the groups that changed state at least once
+        """
+        with self._lock:
+            return {group: {'state': state, 'transitions': n} for group, (state, n) in self._circuits.items()}
+
+    def histogram(self, method, path, phase='total'):
+        """Live histogram of one endpoint phase, None if the endpoint was never called"""
+        stats = self._stats.get((method, path))
+        return stats.histograms[phase] if stats else None
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._circuits = {}
+
+    def snapshot(self):
+        """
+        :return: {'GET /v4/public/depth': {'count': 10, 'errors': 0,
+                  'codes': [{'status': 200, 'rc': 0, 'mc': 'SUCCESS', 'count': 10}],
+                  'latency': {'total': {'count': 10, 'sum': 0.12, 'p50': 0.011, 'p99': 0.02, 'buckets': {...}}, ...}}}
+        """
+        with self._lock:
+            res = {}
+            for (method, path), stats in self._stats.items():
+                latency = {}
+                for phase, hist in stats.histograms.items():
+                    item = hist.to_dict()
+                    item['p50'] = hist.quantile(0.5)
+                    item['p99'] = hist.quantile(0.99)
+                    latency[phase] = item
+                res[f'{method} {path}'] = {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'codes': [{'status': s, 'rc': rc, 'mc': mc, 'count': n} for (s, rc, mc), n in stats.codes.items()],
+                    'latency': latency,
+                }
+            return res
+
+    def to_prometheus(self):
+        """
+        :return: Prometheus text exposition of {namespace}_requests_total, {namespace}_request_seconds and,
+                 once a circuit breaker changed state, {namespace}_circuit_open
+        """
+        ns = self.namespace
+        lines = [f'# HELP {ns}_requests_total REST requests by endpoint and result code',
+                 f'# TYPE {ns}_requests_total counter']
+        with self._lock:
+            items = list(self._stats.items())
+            for (method, path), stats in items:
+                for (status, rc, mc), n in stats.codes.items():
+                    labels = _labels(method=method, path=path, status=status, rc=rc, mc=mc)
+                    lines.append(f'{ns}_requests_total{{{labels}}} {n}')
+            lines += [f'# HELP {ns}_request_seconds REST request latency by phase',
+                      f'# TYPE {ns}_request_seconds histogram']
+            for (method, path), stats in items:
+                for phase, hist in stats.histograms.items():
+                    if not hist.count:
+                        continue
+                    base = _labels(method=method, path=path, phase=phase)
+                    cumulative = 0
+                    for bound, n in zip(list(Histogram.BOUNDS) + ['+Inf'], hist.counts):
+                        cumulative += n
+                        lines.append(f'{ns}_request_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+                    lines.append(f'{ns}_request_seconds_sum{{{base}}} {hist.sum}')
+                    lines.append(f'{ns}_request_seconds_count{{{base}}} {hist.count}')
+            if self._circuits:
+                lines += [f'# HELP {ns}_circuit_open Circuit breaker state by endpoint group, 1 open, '
+                          f'0.5 half open, 0 closed',
+                          f'# TYPE {ns}_circuit_open gauge']
+                for group, (state, _) in self._circuits.items():
+                    value = {'open': 1, 'half_open': 0.5}.get(state, 0)
+                    lines.append(f'{ns}_circuit_open{{{_labels(group=group)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**kwargs):
+    return ','.join('{}="{}"'.format(k, '' if v is None else str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in kwargs.items())
+
+
+# -----------------------------------Transport timing-----------------------------------
+
+class _TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        start = perf_counter()
+        sock = super()._new_conn()
+        _phases.connect = perf_counter() - start
+        return sock
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        start = perf_counter()
+        sock = super()._new_conn()
+        _phases.connect = perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = perf_counter()
+        super().connect()
+        _phases.tls = max(perf_counter() - start - getattr(_phases, 'connect', 0.0), 0.0)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record TCP connect and TLS handshake durations for RequestTimer"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+def instrument_session(session: requests.Session = None) -> requests.Session:
+    """
+    Mount TimedHTTPAdapter on a session so connect/TLS phases are measured
+    :param session: Session to instrument, a new one is created if omitted
+    """
+    session = session or requests.Session()
+    adapter = TimedHTTPAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class RequestTimer:
+    """Times one HTTP call and reports it to a hook, created through timer()"""
+    __slots__ = ('hook', 'method', 'path', 'start', 'received', 'ttfb')
+
+    def __init__(self, hook, method, path):
+        self.hook = hook
+        self.method = method
+        self.path = endpoint_path(path)
+        self.received = None
+        self.ttfb = None
+        _phases.connect = 0.0
+        _phases.tls = 0.0
+        self.start = perf_counter()
+
+    def response(self, response):
+        """Mark the moment the body has been received, before decoding"""
+        self.received = perf_counter()
+        self.ttfb = response.elapsed.total_seconds()
+
+    def finish(self, status=None, rc=None, mc=None, error=None):
+        end = perf_counter()
+        connect = _phases.connect
+        tls = _phases.tls
+        timings = {
+            'connect': connect,
+            'tls': tls,
+            'ttfb': None if self.ttfb is None else max(self.ttfb - connect - tls, 0.0),
+            'parse': None if self.received is None else end - self.received,
+            'total': end - self.start,
+        }
+        try:
+            self.hook.on_request(self.method, self.path, status, rc, mc, timings, error)
+        except Exception:
+            pass
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def response(self, response):
+        pass
+
+    def finish(self, status=None, rc=None, mc=None, error=None):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def timer(hook, method, path):
+    """
+    :return: RequestTimer reporting to hook, or a shared no-op timer when hook is None
+    """
+    if hook is None:
+        return NULL_TIMER
+    return RequestTimer(hook, method, path)
@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+"""
+Dataloader-style batching of per-symbol ticker lookups.
+
+Callers ask for one symbol; lookups arriving within a short window are sent
+as a single Spot.get_tickers / get_tickers_book / get_tickers_24h call with
+symbols=[...] and each caller receives its own row:
+
+    books = TickerLoader(spot, kind='book', window=0.002)
+
+    # in any number of threads
+    row = books.load('btc_usdt')   # {'s': 'btc_usdt', 'ap': ..., 'aq': ..., 'bp': ..., 'bq': ...}
+
+The first caller of a batch waits `window` seconds for others to join, then
+sends the request on its own thread; a batch that reaches max_batch symbols
+is sent immediately.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Batch:
+    __slots__ = ('futures',)
+
+    def __init__(self):
+        self.futures = {}
+
+
+class TickerLoader:
+    """
+    :param spot: pyspikex.spot.Spot
+    :param kind: 'price' (get_tickers), 'book' (get_tickers_book) or '24h' (get_tickers_24h)
+    :param window: Seconds the first caller waits for other lookups to join its batch
+    :param max_batch: Symbols per request
+    :param timeout: Seconds load() waits for its batch before raising TimeoutError
+    """
+    ENDPOINTS = {'price': 'get_tickers', 'book': 'get_tickers_book', '24h': 'get_tickers_24h'}
+
+    def __init__(self, spot, kind='price', window=0.002, max_batch=100, timeout=30):
+        if kind not in self.ENDPOINTS:
+            raise ValueError(f'kind must be one of {list(self.ENDPOINTS)}')
+        self.fetch = getattr(spot, self.ENDPOINTS[kind])
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = None
+        self.requests = 0  # batches sent
+
+    def load(self, symbol: str):
+        """
+        :return: Ticker row of symbol, None if the exchange returned no row for it
+        """
+        return self.load_future(symbol).result(self.timeout)
+
+    def load_many(self, symbols: list) -> dict:
+        """
+        :return: {symbol: row or None}
+        """
+        futures = {s.lower(): self.load_future(s) for s in symbols}
+        return {s: f.result(self.timeout) for s, f in futures.items()}
+
+    def load_future(self, symbol: str) -> Future:
+        """Queue a lookup without waiting, the returned Future resolves with the row"""
+        symbol = symbol.lower()
+        full = None
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            future = batch.futures.get(symbol)
+            if future is None:
+                future = batch.futures[symbol] = Future()
+            if len(batch.futures) >= self.max_batch:
+                self._pending = None
+                full = batch
+        if full is not None:
+            self._dispatch(full)
+        elif leader:
+            threading.Thread(target=self._dispatch_after_window, args=(batch,), daemon=True).start()
+        return future
+
+    def _dispatch_after_window(self, batch):
+        time.sleep(self.window)
+        with self._lock:
+            if self._pending is not batch:
+                return  # already sent because it filled up
+            self._pending = None
+        self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        self.requests += 1
+        symbols = list(batch.futures)
+        try:
+            if len(symbols) == 1:
+                rows = self.fetch(symbol=symbols[0])
+            else:
+                rows = self.fetch(symbols=symbols)
+        except Exception as e:
+            for future in batch.futures.values():
+                future.set_exception(e)
+            return
+        by_symbol = {row.get('s'): row for row in rows or ()}
+        for symbol, future in batch.futures.items():
+            future.set_result(by_symbol.get(symbol))
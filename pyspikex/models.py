@@ -0,0 +1,207 @@
+# -*- coding:utf-8 -*-
+"""
+Opt-in typed response models.
+
+Models wrap the parsed JSON of a response without copying it. Each field is
+decoded (numbers to pyspikex.fixed.Fixed) the first time it is read and cached
+in a slot, so wrapping a 1000-row result costs one small object per row and
+fields that are never read are never decoded:
+
+    orders = Order.wrap(spot.get_history_orders(symbol='btc_usdt'))   # {'items': [Order, ...], 'hasNext': ...}
+    tickers = Ticker.wrap(spot.get_tickers_24h())                    # [Ticker, ...]
+    code, positions, error = Position.wrap(perp.get_position('btc_usdt'))
+    tickers[0].close        # Fixed('9000.0000')
+    tickers[0]['c']         # '9000.0000', raw access still works
+
+Fields list their spot and perpetual JSON keys; the first key present is used.
+"""
+from pyspikex.fixed import Fixed
+
+_MISSING = object()
+
+
+class Field:
+    """
+    Lazily decoded model attribute
+    :param keys: JSON key, or tuple of alternative keys (spot name first, then perpetual name)
+    :param decode: Callable applied to non-null raw values, None keeps the raw value
+    """
+    __slots__ = ('keys', 'decode', 'slot')
+
+    def __init__(self, keys, decode=None):
+        self.keys = keys if isinstance(keys, tuple) else (keys,)
+        self.decode = decode
+        self.slot = None
+
+    def raw(self, data):
+        for key in self.keys:
+            value = data.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return None
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        try:
+            return self.slot.__get__(obj, owner)
+        except AttributeError:
+            value = self.raw(obj._raw)
+            if value is not None and self.decode is not None:
+                value = self.decode(value)
+            self.slot.__set__(obj, value)
+            return value
+
+
+def number(keys):
+    """Field decoded to Fixed"""
+    return Field(keys, Fixed.parse)
+
+
+class _ModelMeta(type):
+    """Adds one cache slot per Field so models carry no __dict__"""
+
+    def __new__(mcs, name, bases, namespace):
+        fields = {k: v for k, v in namespace.items() if isinstance(v, Field)}
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + tuple(f'_{k}' for k in fields)
+        cls = super().__new__(mcs, name, bases, namespace)
+        for key, field in fields.items():
+            field.slot = cls.__dict__[f'_{key}']
+        cls._fields = tuple(getattr(cls, '_fields', ())) + tuple(fields)
+        return cls
+
+
+class Model(metaclass=_ModelMeta):
+    """Base of the typed models, wraps one parsed JSON object"""
+    __slots__ = ('_raw',)
+
+    def __init__(self, raw: dict):
+        self._raw = raw
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def __getitem__(self, key):
+        return self._raw[key]
+
+    def get(self, key, default=None):
+        return self._raw.get(key, default)
+
+    def to_dict(self):
+        """All fields, decoded"""
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._raw == self._raw
+
+    __hash__ = None
+
+    def __repr__(self):
+        shown = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields[:4])
+        return f'{type(self).__name__}({shown}, ...)'
+
+    @classmethod
+    def from_list(cls, items):
+        return [cls(item) for item in items or ()]
+
+    @classmethod
+    def wrap(cls, result):
+        """
+        Wrap a client method result:
+            list -> [Model]
+            {'items': [...], ...} -> same dict with items wrapped (paged results)
+            dict -> Model
+            Perp (code, success, error) -> (code, wrap(success['result']), error)
+        """
+        if isinstance(result, tuple) and len(result) == 3:
+            code, success, error = result
+            if isinstance(success, dict) and 'result' in success:
+                return code, cls.wrap(success['result']), error
+            return result
+        if isinstance(result, list):
+            return cls.from_list(result)
+        if isinstance(result, dict):
+            if isinstance(result.get('items'), list):
+                return dict(result, items=cls.from_list(result['items']))
+            return cls(result)
+        return result
+
+
+class Order(Model):
+    order_id = Field('orderId')
+    client_order_id = Field('clientOrderId')
+    symbol = Field('symbol')
+    side = Field(('side', 'orderSide'))
+    type = Field(('type', 'orderType'))
+    time_in_force = Field('timeInForce')
+    price = number('price')
+    orig_qty = number('origQty')
+    executed_qty = number('executedQty')
+    avg_price = number('avgPrice')
+    state = Field('state')
+    time = Field(('time', 'createdTime'))
+    updated_time = Field('updatedTime')
+    position_side = Field('positionSide')
+    fee = number('fee')
+
+
+class Trade(Model):
+    """Account trades (Spot.get_trade items) and public trades (get_trade_recent / get_trade_history)"""
+    trade_id = Field(('tradeId', 'i'))
+    order_id = Field('orderId')
+    symbol = Field(('symbol', 's'))
+    time = Field(('time', 't'))
+    price = number(('price', 'p'))
+    qty = number(('quantity', 'q', 'a'))
+    quote_qty = number(('quoteQty', 'v'))
+    side = Field('orderSide')
+    buyer_maker = Field('b')
+    taker_maker = Field('takerMaker')
+    fee = number('fee')
+    fee_currency = Field('feeCurrency')
+
+
+class Kline(Model):
+    time = Field('t')
+    open = number('o')
+    high = number('h')
+    low = number('l')
+    close = number('c')
+    qty = number(('q', 'a'))
+    amount = number('v')
+
+
+class Ticker(Model):
+    """24h tickers (spot get_tickers_24h, perp get_tickers / get_ticker) and price tickers (spot get_tickers)"""
+    symbol = Field('s')
+    time = Field('t')
+    price = number('p')
+    open = number('o')
+    high = number('h')
+    low = number('l')
+    close = number('c')
+    qty = number(('q', 'a'))
+    amount = number('v')
+    change_value = number('cv')
+    change_rate = number(('cr', 'r'))
+
+
+class Balance(Model):
+    """Spot balances items and perpetual balance list items"""
+    currency = Field(('currency', 'coin'))
+    available = number(('availableAmount', 'availableBalance'))
+    frozen = number(('frozenAmount', 'openOrderMarginFrozen'))
+    total = number(('totalAmount', 'walletBalance'))
+
+
+class Position(Model):
+    symbol = Field('symbol')
+    position_side = Field('positionSide')
+    position_type = Field('positionType')
+    size = number('positionSize')
+    available_close_size = number('availableCloseSize')
+    entry_price = number('entryPrice')
+    isolated_margin = number('isolatedMargin')
+    realized_profit = number('realizedProfit')
+    leverage = Field('leverage', int)
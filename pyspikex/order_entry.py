@@ -0,0 +1,242 @@
+# -*- coding:utf-8 -*-
+"""
+Idempotent order entry.
+
+Every order gets a clientOrderId before it is sent. When the request fails in
+transport (timeout, connection reset, 5xx from a gateway) the outcome is
+unknown, so instead of sending again blindly the order is first looked up by
+that id; it is re-sent only when the exchange confirms it does not have it:
+
+    entry = SpotOrderEntry(spot)
+    res = entry.order('btc_usdt', 'BUY', 'LIMIT', price='27000', quantity='0.01')
+    # res['clientOrderId'] is the id used, also set when the order was recovered by lookup
+
+    perp_entry = PerpOrderEntry(perp)
+    code, success, error = perp_entry.send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG', price='27000')
+
+Rejections (SpikexBusinessError, 4xx, local validation) are never retried.
+When the lookups cannot tell whether the order exists, SpotOrderEntry raises
+the original SpikexHttpError and PerpOrderEntry raises OrderStateUnknownError;
+neither sends the order again.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from pyspikex.spot import SpikexBusinessError, SpikexCircuitOpenError, SpikexHttpError
+from pyspikex.state import perp_account_orders, perp_history_orders
+
+logger = logging.getLogger('spikex')
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _base36(n: int, width: int = 0) -> str:
+    out = []
+    while n:
+        n, r = divmod(n, 36)
+        out.append(_DIGITS[r])
+    return ''.join(reversed(out)).rjust(width, '0')
+
+
+class ClientOrderIdGenerator:
+    """
+    Monotonic clientOrderId source: prefix + node + base36 microsecond timestamp
+
+    Ids increase strictly within one generator even when the wall clock stalls or
+    steps back, and the random node part keeps processes sharing an API key apart.
+    At most 32 characters.
+
+    :param prefix: Up to 16 alphanumeric characters identifying the strategy
+    :param node: 4 base36 characters, random per generator by default
+    """
+    MAX_LEN = 32
+
+    def __init__(self, prefix: str = 'px', node: str = None):
+        if len(prefix) > 16 or not prefix.isalnum():
+            raise ValueError('prefix must be at most 16 alphanumeric characters')
+        self.prefix = prefix
+        self.node = node or _base36(int.from_bytes(os.urandom(4), 'big') % 36 ** 4, 4)
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            now = time.time_ns() // 1000
+            if now <= self._last:
+                now = self._last + 1
+            self._last = now
+        return f'{self.prefix}{self.node}{_base36(now, 11)}'
+
+    __call__ = next
+
+
+class OrderStateUnknownError(Exception):
+    """A failed order request could not be confirmed or ruled out, the order may or may not exist"""
+
+    def __init__(self, client_order_id, code, error):
+        self.client_order_id = client_order_id
+        self.code = code
+        self.error = error
+        super().__init__(f'order {client_order_id} state unknown, code:{code} error:{error}')
+
+
+class _OrderEntry(ABC):
+    """
+    :param ids: ClientOrderIdGenerator, or any callable returning a new id
+    :param retries: Re-sends after a failure confirmed not to have placed the order
+    :param backoff: Seconds before the first lookup, doubled on every attempt
+    :param lookups: Lookup attempts per failure before giving up with the original error
+    """
+
+    def __init__(self, client, ids=None, retries: int = 2, backoff: float = 0.2, lookups: int = 3):
+        self.client = client
+        self.ids = ids or ClientOrderIdGenerator()
+        self.retries = retries
+        self.backoff = backoff
+        self.lookups = lookups
+
+    def _resolve(self, client_order_id, delay, *args):
+        """
+        :return: (found, order) once the exchange answered the lookup, raises LookupError if it never did
+        """
+        for _ in range(self.lookups):
+            time.sleep(delay)
+            try:
+                return self._lookup(client_order_id, *args)
+            except LookupError as e:
+                logger.warning('order %s lookup failed: %s', client_order_id, e)
+            delay *= 2
+        raise LookupError(f'order {client_order_id} state unknown after {self.lookups} lookups')
+
+    @abstractmethod
+    def _lookup(self, client_order_id, *args):
+        """
+        :return: (found, order), raises LookupError when the exchange could not answer
+        """
+
+
+class SpotOrderEntry(_OrderEntry):
+    """Idempotent Spot.order"""
+
+    def order(self, symbol, side, type, biz_type='SPOT', time_in_force='GTC', client_order_id=None, price=None,
+              quantity=None, quote_qty=None) -> dict:
+        """
+        Spot.order with a generated clientOrderId and lookup-before-retry
+        :return: Order result of the accepted request, or the order found by lookup; both carry
+                 orderId and clientOrderId
+        :raises SpikexHttpError: when the order state could not be determined, it may or may not exist
+        """
+        client_order_id = client_order_id or self.ids()
+        delay = self.backoff
+        for attempt in itertools.count():
+            try:
+                res = self.client.order(symbol, side, type, biz_type, time_in_force, client_order_id, price,
+                                        quantity, quote_qty)
+            except SpikexHttpError as e:
+                resp = getattr(e, 'response', None)
+                if resp is not None and resp.status_code < 500:
+                    raise
+                try:
+                    found, order = self._resolve(client_order_id, delay)
+                except LookupError:
+                    raise e
+                if found:
+                    return order
+                if attempt >= self.retries:
+                    raise
+                logger.warning('order %s not placed, retrying: %s', client_order_id, e)
+                delay *= 2
+                continue
+            res = dict(res or {})
+            res.setdefault('clientOrderId', client_order_id)
+            return res
+
+    def _lookup(self, client_order_id, *args):
+        try:
+            order = self.client.get_order(client_order_id=client_order_id)
+        except SpikexBusinessError as e:
+            if e.message_code == 'ORDER_005':
+                return False, None
+            raise LookupError(e)
+        except SpikexHttpError as e:
+            raise LookupError(e)
+        return bool(order), order
+
+
+class PerpOrderEntry(_OrderEntry):
+    """
+    Idempotent Perp.send_order
+
+    The perpetual API has no lookup by clientOrderId, so every page of the open
+    (NEW and PARTIALLY_FILLED) orders and of the symbol's order history since
+    shortly before the first attempt are scanned for it. An order can be filled
+    and not yet in the history, so it only counts as not placed when it is
+    missing from two scans settle seconds apart.
+
+    :param history_window: Seconds of history before the first attempt included in the scan
+    :param settle: Seconds between the two scans that must both miss the order
+    """
+
+    def __init__(self, client, ids=None, retries: int = 2, backoff: float = 0.2, lookups: int = 3,
+                 history_window: float = 600, settle: float = 2.0):
+        super().__init__(client, ids, retries, backoff, lookups)
+        self.history_window = history_window
+        self.settle = settle
+
+    def send_order(self, symbol, amount, order_side, order_type, position_side, price=None,
+                   client_order_id=None, time_in_force=None, trigger_profit_price=None,
+                   trigger_stop_price=None):
+        """
+        Perp.send_order with a generated clientOrderId and lookup-before-retry
+        :return: (code, success, error) of the accepted request, or (200, {'result': order}, None) with the
+                 order found by lookup
+        :raises OrderStateUnknownError: when the order state could not be determined, it may or may not exist
+        """
+        client_order_id = client_order_id or self.ids()
+        since = int((time.time() - self.history_window) * 1000)
+        delay = self.backoff
+        for attempt in itertools.count():
+            code, success, error = self.client.send_order(symbol, amount, order_side, order_type, position_side,
+                                                          price, client_order_id, time_in_force,
+                                                          trigger_profit_price, trigger_stop_price)
+            if error is None or not self._unknown(code, error):
+                return code, success, error
+            try:
+                found, order = self._resolve(client_order_id, delay, symbol, since)
+            except LookupError:
+                raise OrderStateUnknownError(client_order_id, code, error)
+            if found:
+                return 200, {'returnCode': 0, 'result': order}, None
+            if attempt >= self.retries:
+                return code, success, error
+            logger.warning('order %s not placed, retrying: %s', client_order_id, error)
+            delay *= 2
+
+    @staticmethod
+    def _unknown(code, error):
+        """Transport exception or gateway error, validation and open circuit errors mean nothing was sent"""
+        if code is None:
+            return isinstance(error, Exception) and not isinstance(error, (SpikexBusinessError, SpikexCircuitOpenError))
+        return code >= 500
+
+    def _lookup(self, client_order_id, symbol=None, since=None):
+        order = self._scan(client_order_id, symbol, since)
+        if order is None:
+            time.sleep(self.settle)  # let a just filled or canceled order reach the history
+            order = self._scan(client_order_id, symbol, since)
+        return order is not None, order
+
+    def _scan(self, client_order_id, symbol, since):
+        try:
+            for fetch in (lambda: perp_account_orders(self.client, 'UNFINISHED', symbol=symbol),
+                          lambda: perp_history_orders(self.client, symbol=symbol, start_time=since)):
+                for order in fetch():
+                    if order.get('clientOrderId') == client_order_id:
+                        return order
+        except RuntimeError as e:
+            raise LookupError(e)
+        return None
@@ -3,8 +3,28 @@ import time
 import json
 import hashlib
 import hmac
+import logging
 import requests
 
+from pyspikex import frames
+from pyspikex.clock import ClockSync
+from pyspikex.fixed import encode
+from pyspikex.instrumentation import instrument_session, timer
+from pyspikex.singleflight import request_key
+from pyspikex.spot import SpikexCircuitOpenError, SpikexValidationError
+
+logger = logging.getLogger('spikex')
+
+
+def _transient(res):
+    """(code, success, error) worth retrying an idempotent request for: no response, 429 or 5xx"""
+    if isinstance(res, Exception):
+        return True
+    code, _, error = res
+    if code is None:
+        return isinstance(error, Exception) and not isinstance(error, (SpikexValidationError, SpikexCircuitOpenError))
+    return code == 429 or code >= 500
+
 
 class Perp:
     def __init__(self, host, access_key, secret_key, *args, **kwargs):
@@ -12,13 +32,26 @@ class Perp:
         self.__access_key = access_key
         self.__secret_key = secret_key
         self.timeout = kwargs["timeout"] if kwargs.get("timeout", None) else 10
+        self.instrumentation = kwargs.get("instrumentation", None)
+        self.session = kwargs.get("session", None) or (
+            instrument_session() if self.instrumentation else requests.Session())
+        self.clock = kwargs.get("clock", None)
+        self.validator = kwargs.get("validator", None)
+        self.singleflight = kwargs.get("singleflight", None)
+        self.policy = kwargs.get("policy", None)
+        self.breaker = kwargs.get("breaker", None)
+        self.rate_limit = kwargs.get("rate_limit", None)
+        if self.breaker is not None and self.breaker.instrumentation is None:
+            self.breaker.instrumentation = self.instrumentation
 
     @staticmethod
-    def _create_sign(access_key, secret_key, path: str, bodymod: str = None, params: dict = None):
+    def _create_sign(access_key, secret_key, path: str, bodymod: str = None, params: dict = None,
+                     timestamp: str = None):
         header = dict()
+        params = encode(params)
         apikey = access_key
         secret = secret_key
-        timestamp = str(int(time.time() * 1000))
+        timestamp = timestamp or str(int(time.time() * 1000))
         if bodymod == 'application/x-www-form-urlencoded':
             if params:
                 params = dict(sorted(params.items(), key=lambda e: e[0]))
@@ -46,8 +79,41 @@ class Perp:
         })
         return header
 
-    @staticmethod
-    def _fetch(method, url, params=None, body=None, data=None, headers=None, timeout=30, **kwargs):
+    def _signer(self, path, bodymod, params):
+        """
+        Headers of a signed request, created by _send once the rate limiter let the request through,
+        so a throttled or retried request is not sent with a stale timestamp
+        """
+        return lambda: self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
+                                         params=params, timestamp=self._timestamp())
+
+    def _timestamp(self):
+        """
+        Signing timestamp in milliseconds, estimated server time when clock sync is enabled
+        """
+        if self.clock:
+            return str(self.clock.time_ms())
+        return str(int(time.time() * 1000))
+
+    def enable_clock_sync(self, interval=30):
+        """
+        Start a background ClockSync on the server time endpoint and sign with the estimated server time
+        :param interval: Seconds between syncs
+        :return: ClockSync
+        """
+        if self.clock is None:
+            self.clock = ClockSync(self._server_time_ms, interval=interval)
+        self.clock.start()
+        return self.clock
+
+    def _server_time_ms(self):
+        """Server time probe sent directly, singleflight, retries and hedging would distort its round trip"""
+        code, success, error = self._send("GET", self.host + "/future/market" + '/v1/public/time', timeout=self.timeout)
+        if error is not None or not success:
+            raise RuntimeError(f"get server time failed, code:{code} error:{error}")
+        return int(success["result"])
+
+    def _fetch(self, method, url, params=None, body=None, data=None, headers=None, timeout=30, **kwargs):
         """
         Create a HTTP request.
            Args:
@@ -56,7 +122,7 @@ class Perp:
                params: HTTP query params.
                body: HTTP request body, string or bytes format.
                data: HTTP request body, dict format.
-               headers: HTTP request header.
+               headers: HTTP request header, or a callable creating it right before the request is sent.
                timeout: HTTP request timeout(seconds), default is 30s
                kwargs:
                    proxy: HTTP proxy.
@@ -70,43 +136,86 @@ class Perp:
                HTTP request exceptions or response data parse exceptions. All the exceptions will be captured and return
                Error information.
         """
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            error = "http method error!"
+            return None, None, error
+        public = method == "GET" and headers is None
+        if self.singleflight is not None and public:
+            # public GET, identical concurrent calls share one request
+            return self.singleflight.do(
+                request_key(method, url, params),
+                lambda: self._call(method, url, params, body, data, headers, timeout, public, **kwargs),
+                cacheable=lambda res: res[2] is None)
+        return self._call(method, url, params, body, data, headers, timeout, public, **kwargs)
+
+    def _call(self, method, url, params, body, data, headers, timeout, public, **kwargs):
+        path = url[len(self.host):] if url.startswith(self.host) else url
+        if self.policy is None:
+            call = lambda: self._send(method, url, params, body, data, headers, timeout, **kwargs)
+        else:
+            call = lambda: self.policy.call(
+                method, path, lambda t: self._send(method, url, params, body, data, headers, t, **kwargs),
+                timeout, retry=public, retryable=_transient)
+        if self.breaker is None:
+            return call()
+        try:
+            return self.breaker.call(path, call, failed=_transient)
+        except SpikexCircuitOpenError as e:
+            return None, None, e
+
+    def _send(self, method, url, params=None, body=None, data=None, headers=None, timeout=30, **kwargs):
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+        if callable(headers):
+            headers = headers()
+        params = encode(params)
+        data = encode(data)
+        t = timer(self.instrumentation, method, url[len(self.host):] if url.startswith(self.host) else url)
         try:
             if method == "GET":
-                response = requests.get(url, params=params, headers=headers, timeout=timeout, **kwargs)
-            elif method == "POST":
-                response = requests.post(url, params=params, data=body, json=data, headers=headers,
-                                         timeout=timeout, **kwargs)
-            elif method == "PUT":
-                response = requests.put(url, params=params, data=body, json=data, headers=headers,
-                                        timeout=timeout, **kwargs)
-            elif method == "DELETE":
-                response = requests.delete(url, params=params, data=body, json=data, headers=headers,
-                                           timeout=timeout, **kwargs)
+                response = self.session.request(method, url, params=params, headers=headers, timeout=timeout,
+                                                **kwargs)
             else:
-                error = "http method error!"
-                return None, None, error
+                response = self.session.request(method, url, params=params, data=body, json=data, headers=headers,
+                                                timeout=timeout, **kwargs)
         except Exception as e:
-            print("method:", method, "url:", url, "headers:", headers, "params:", params, "body:", body,
-                  "data:", data, "Error:", e)
+            t.finish(error=e)
+            logger.error("method:%s url:%s headers:%s params:%s body:%s data:%s Error:%s",
+                         method, url, headers, params, body, data, e)
             return None, None, e
+        t.response(response)
         code = response.status_code
         if code not in (200, 201, 202, 203, 204, 205, 206):
             text = response.text
-            request_url = response.request.url
-            print("method:", method, "url:", request_url, "headers:", headers, "params:", params, "body:", body,
-                  "data:", data, "code:", code, "result:", text)
+            t.finish(code)
+            logger.error("method:%s url:%s headers:%s params:%s body:%s data:%s code:%s result:%s",
+                         method, response.request.url, headers, params, body, data, code, text)
             return code, None, text
         try:
             result = response.json()
-        except:
+        except Exception as e:
             result = response.text
-            print("response data is not json format!")
-            print("method:", method, "url:", url, "headers:", headers, "params:", params, "body:", body,
-                  "data:", data, "code:", code, "result:", json.dumps(result))
-        print("method:", method, "url:", url, "headers:", headers, "params:", params, "body:", body,
-              "data:", data, "code:", code)
+            t.finish(code, error=e)
+            logger.error("response data is not json format! method:%s url:%s params:%s body:%s data:%s code:%s "
+                         "result:%s", method, url, params, body, data, code, result)
+            return code, result, None
+        if isinstance(result, dict):
+            error = result.get("error")
+            t.finish(code, result.get("returnCode"),
+                     error.get("code") if isinstance(error, dict) else result.get("msgInfo"))
+        else:
+            t.finish(code)
+        logger.debug("method:%s url:%s params:%s body:%s data:%s code:%s", method, url, params, body, data, code)
         return code, result, None
 
+    def get_time(self):
+        """
+        :return: server time, result in milliseconds
+        """
+        url = self.host + "/future/market" + '/v1/public/time'
+        code, success, error = self._fetch(method="GET", url=url, timeout=self.timeout)
+        return code, success, error
+
     def get_market_config(self, symbol):
         """
         @param symbol:
@@ -273,6 +382,32 @@ class Perp:
         code, success, error = self._fetch(method="GET", url=url, params=params, timeout=self.timeout)
         return code, success, error
 
+    # NumPy variants, see pyspikex.frames. Return (code, array, error); columns=True gives {column: ndarray}
+
+    def get_depth_array(self, symbol, depth):
+        """
+        :return: code, {'bids': ndarray, 'asks': ndarray} of shape (n, 2), error
+        """
+        return frames.perp_depth_array(self.get_depth(symbol, depth))
+
+    def get_k_line_array(self, symbol, interval, start_time=None, end_time=None, limit=None, columns=False):
+        """
+        :return: code, get_k_line() as a NumPy array (columns t o h l c a v), error
+        """
+        return frames.perp_kline_array(self.get_k_line(symbol, interval, start_time, end_time, limit), columns)
+
+    def get_last_price_array(self, symbol, length, columns=False):
+        """
+        :return: code, get_last_price() as a NumPy array (columns t p a m), error
+        """
+        return frames.perp_trade_array(self.get_last_price(symbol, length), columns)
+
+    def get_tickers_array(self, columns=False):
+        """
+        :return: code, get_tickers() as a NumPy array (columns s t o h l c a v r), error
+        """
+        return frames.perp_ticker_array(self.get_tickers(), columns)
+
     def get_account_capital(self):
         """
         :return: account capital
@@ -281,8 +416,7 @@ class Perp:
         path = "/future/user" + '/v1/balance/list'
         url = self.host + path
         params = {}
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="GET", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -294,8 +428,7 @@ class Perp:
         path = "/future/user" + '/v1/user/listen-key'
         url = self.host + path
         params = {}
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="GET", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -322,13 +455,17 @@ class Perp:
             params["triggerProfitPrice"] = trigger_profit_price
         if trigger_stop_price:
             params["triggerStopPrice"] = trigger_stop_price
+        if self.validator:
+            try:
+                self.validator.check(params)
+            except SpikexValidationError as e:
+                return None, None, e
 
         bodymod = "application/json"
         path = "/future/trade" + '/v1/order/create'
         url = self.host + path
         # params = dict(sorted(params.items(), key=lambda e: e[0]))
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -341,8 +478,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + "/v2/order/create-batch"
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header.pop("validate-signversion")
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
@@ -369,24 +505,21 @@ class Perp:
         if end_time:
             params["endTime"] = end_time
 
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
 
-    def get_position(self, symbol):
+    def get_position(self, symbol=None):
         """
         get_position
+        :param symbol: Positions of one symbol, all positions if omitted
         :return:
         """
         bodymod = "application/x-www-form-urlencoded"
         path = "/future/user" + '/v1/position/list'
         url = self.host + path
-        params = {
-            "symbol": symbol,
-        }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        params = {"symbol": symbol} if symbol else {}
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -402,8 +535,7 @@ class Perp:
         params = {
             "orderId": order_id
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -419,8 +551,7 @@ class Perp:
         params = {
             "orderIds": str(order_id_list)
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -434,8 +565,7 @@ class Perp:
         params = {
             "symbol": symbol
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -450,8 +580,7 @@ class Perp:
         params = {
             "orderId": order_id
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
 
@@ -468,14 +597,16 @@ class Perp:
             "symbol": symbol
         }
         params = dict(sorted(params.items(), key=lambda e: e[0]))
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
-    def get_account_order(self, state):
+    def get_account_order(self, state, symbol=None, page=None, size=None):
         """
-        :return: get_account_order
+        :param state: NEW, PARTIALLY_FILLED, UNFINISHED (both), FILLED, CANCELED, ...
+        :param page: Page number, from 1
+        :param size: Orders per page
+        :return: get_account_order, paged: {'page', 'ps', 'total', 'items'}
         """
         bodymod = "application/x-www-form-urlencoded"
         path = "/future/trade" + '/v1/order/list'
@@ -483,8 +614,13 @@ class Perp:
         params = {
             "state": state,
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        if symbol:
+            params["symbol"] = symbol
+        if page:
+            params["page"] = page
+        if size:
+            params["size"] = size
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
 
@@ -525,8 +661,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/create-plan'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -541,8 +676,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/cancel-plan'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -557,8 +691,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/cancel-all-plan'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -588,8 +721,7 @@ class Perp:
         if end_time:
             params["endTime"] = end_time
 
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -605,8 +737,7 @@ class Perp:
         params = {
             "entrustId": entrust_id,
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -632,8 +763,7 @@ class Perp:
             params["startTime"] = start_time
         if end_time:
             params["endTime"] = end_time
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -660,8 +790,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/create-profit'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -676,8 +805,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/cancel-profit-stop'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -692,8 +820,7 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/cancel-all-profit-stop'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
 
@@ -723,8 +850,7 @@ class Perp:
         if end_time:
             params["endTime"] = end_time
 
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -740,8 +866,7 @@ class Perp:
         params = {
             "profitId": profit_id,
         }
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         header["Content-Type"] = "application/x-www-form-urlencoded"
         code, success, error = self._fetch(method="GET", url=url, headers=header, params=params, timeout=self.timeout)
         return code, success, error
@@ -763,7 +888,6 @@ class Perp:
         bodymod = "application/json"
         path = "/future/trade" + '/v1/entrust/update-profit-stop'
         url = self.host + path
-        header = self._create_sign(self.__access_key, self.__secret_key, path=path, bodymod=bodymod,
-                                   params=params)
+        header = self._signer(path, bodymod, params)
         code, success, error = self._fetch(method="POST", url=url, headers=header, data=params, timeout=self.timeout)
         return code, success, error
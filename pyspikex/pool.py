@@ -0,0 +1,195 @@
+# -*- coding:utf-8 -*-
+"""
+Many accounts over one transport.
+
+AccountPool holds a Spot and/or Perp client per credential set. All of them
+send through one requests.Session, so connections to the exchange are pooled
+and reused across accounts, and run fan-out calls on one shared thread pool.
+Every account keeps its own signer (its keys) and its own token buckets, one
+for Spot and one for Perp as the exchange limits them separately, so one
+busy account cannot spend another account's rate limit:
+
+    pool = AccountPool(spot_host='https://sapi.spikex.com', perp_host='https://fapi.spikex.com',
+                       rate=10, burst=20)
+    for name, ak, sk in credentials:
+        pool.add(name, ak, sk)
+
+    pool.spot('sub-01').balances()
+    results = pool.cancel_all_open_orders(symbol='btc_usdt')   # {name: result or exception}
+    pool.map(lambda account: account.spot.get_open_orders())
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pyspikex.instrumentation import TimedHTTPAdapter
+from pyspikex.perp import Perp
+from pyspikex.spot import Spot
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+    :param rate: Tokens added per second
+    :param burst: Bucket capacity
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        """
+        Wait until tokens are available
+        :return: False if timeout passed first
+        """
+        if tokens > self.burst:
+            raise ValueError(f'cannot acquire {tokens} tokens from a bucket of {self.burst}')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class Account:
+    """One credential set of the pool"""
+    __slots__ = ('name', 'spot', 'perp', 'spot_bucket', 'perp_bucket')
+
+    def __init__(self, name, spot, perp, spot_bucket, perp_bucket):
+        self.name = name
+        self.spot = spot
+        self.perp = perp
+        self.spot_bucket = spot_bucket
+        self.perp_bucket = perp_bucket
+
+    def __repr__(self):
+        return f'Account({self.name!r})'
+
+
+class AccountPool:
+    """
+    :param spot_host: Spot API host, accounts get no Spot client if omitted
+    :param perp_host: Perpetual API host, accounts get no Perp client if omitted
+    :param rate: Requests per second allowed per account and API (Spot and Perp each), None for no limit
+    :param burst: Token bucket capacity per account and API, default rate
+    :param max_workers: Threads of the fan-out executor, also the connection pool size per host
+    :param session: requests.Session shared by all clients, created if omitted
+    :param client_options: Passed to every Spot and Perp, e.g. timeout, instrumentation, policy, breaker, clock
+    """
+
+    def __init__(self, spot_host=None, perp_host=None, rate: float = None, burst: float = None,
+                 max_workers: int = 16, session: requests.Session = None, **client_options):
+        self.spot_host = spot_host
+        self.perp_host = perp_host
+        self.rate = rate
+        self.burst = burst
+        self.client_options = client_options
+        if session is None:
+            session = requests.Session()
+            adapter_class = TimedHTTPAdapter if client_options.get('instrumentation') else HTTPAdapter
+            adapter = adapter_class(pool_connections=4, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='spikex-pool')
+        self._accounts = {}
+
+    def add(self, name, access_key, secret_key, rate: float = None, burst: float = None) -> Account:
+        """
+        Register a credential set
+        :param rate: Overrides the pool's per-account rate for this account
+        """
+        rate = rate or self.rate
+        spot = perp = spot_bucket = perp_bucket = None
+        if self.spot_host:
+            spot_bucket = TokenBucket(rate, burst or self.burst) if rate else None
+            spot = Spot(self.spot_host, access_key=access_key, secret_key=secret_key, session=self.session,
+                        rate_limit=spot_bucket, **self.client_options)
+        if self.perp_host:
+            perp_bucket = TokenBucket(rate, burst or self.burst) if rate else None
+            perp = Perp(self.perp_host, access_key, secret_key, session=self.session, rate_limit=perp_bucket,
+                        **self.client_options)
+        account = self._accounts[name] = Account(name, spot, perp, spot_bucket, perp_bucket)
+        return account
+
+    def remove(self, name):
+        self._accounts.pop(name, None)
+
+    def __getitem__(self, name) -> Account:
+        return self._accounts[name]
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def names(self):
+        return list(self._accounts)
+
+    def spot(self, name) -> Spot:
+        return self._accounts[name].spot
+
+    def perp(self, name) -> Perp:
+        return self._accounts[name].perp
+
+    def map(self, fn, names=None, timeout: float = None) -> dict:
+        """
+        Run fn(account) for every account concurrently
+        :param names: Accounts to run on, default all
+        :return: {name: result}, an exception raised by fn is returned as the account's result
+        """
+        accounts = [self._accounts[n] for n in names] if names is not None else list(self._accounts.values())
+        futures = {account.name: self.executor.submit(fn, account) for account in accounts}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout)
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def cancel_all_open_orders(self, symbol=None, names=None) -> dict:
+        """
+        Cancel the open orders of every account: Spot.cancel_open_orders, and Perp.cancel_all_order
+        when a symbol is given (the perpetual endpoint requires one)
+        :return: {name: {'spot': result, 'perp': (code, success, error)}} or {name: exception}
+        """
+
+        def cancel(account):
+            res = {}
+            if account.spot is not None:
+                res['spot'] = account.spot.cancel_open_orders(symbol=symbol)
+            if account.perp is not None and symbol:
+                res['perp'] = account.perp.cancel_all_order(symbol)
+            return res
+
+        return self.map(cancel, names)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
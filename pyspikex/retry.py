@@ -0,0 +1,170 @@
+# -*- coding:utf-8 -*-
+"""
+Adaptive timeouts, retries and hedged requests for the REST clients.
+
+A RequestPolicy learns the latency distribution of every endpoint and derives
+its timeout from it (a multiple of the observed p99, between min_timeout and
+the client's own timeout), so one stalled response no longer blocks a caller
+for the full 10 seconds. Public GETs are idempotent and are retried with
+jittered exponential backoff on transport errors, 429 and 5xx; endpoints listed
+in hedge additionally get a second attempt when the first has not answered by
+the endpoint's p95, and the first good answer wins:
+
+    policy = RequestPolicy(hedge=HEDGE_PATHS)
+    spot = Spot(host, policy=policy)
+    perp = Perp(host, ak, sk, policy=policy)
+
+Signed requests are never retried. Signed GETs use the adaptive timeout, but
+non-idempotent requests (order POSTs, cancels) keep the client's timeout:
+cutting one short would not make it fail faster, only leave its outcome
+unknown.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from time import perf_counter
+
+from pyspikex.instrumentation import Histogram, endpoint_path
+
+# get_depth and get_tickers_book / get_book_ticker of both clients
+HEDGE_PATHS = ('/v4/public/depth', '/v4/public/ticker/book',
+               '/future/market/v1/public/q/depth', '/future/market/v1/public/q/ticker/book')
+
+
+class RequestPolicy:
+    """
+    :param min_timeout: Lower bound of learned timeouts, seconds
+    :param quantile: Latency quantile the timeout is derived from
+    :param multiplier: Timeout = multiplier * quantile latency, capped by the client's timeout
+    :param min_samples: Observations needed before an endpoint's learned timeout is used
+    :param retries: Extra attempts for idempotent requests
+    :param backoff: First retry delay in seconds, doubled per attempt, with jitter
+    :param max_backoff: Retry delay cap
+    :param hedge: Endpoint paths whose idempotent requests are hedged
+    :param hedge_quantile: Latency quantile after which the hedge is sent
+    :param max_workers: Threads running hedged attempts
+    """
+
+    def __init__(self, min_timeout: float = 0.5, quantile: float = 0.99, multiplier: float = 3.0,
+                 min_samples: int = 20, retries: int = 2, backoff: float = 0.05, max_backoff: float = 1.0,
+                 hedge=(), hedge_quantile: float = 0.95, max_workers: int = 8):
+        self.min_timeout = min_timeout
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = frozenset(hedge)
+        self.hedge_quantile = hedge_quantile
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._pool = None
+        self.retried = 0  # attempts after the first
+        self.hedged = 0  # hedge attempts sent
+
+    def observe(self, method, path, seconds):
+        key = (method, endpoint_path(path))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def _learned(self, method, path, q):
+        histogram = self._histograms.get((method, endpoint_path(path)))
+        if histogram is None or histogram.count < self.min_samples:
+            return None
+        return histogram.quantile(q)
+
+    def timeout(self, method, path, default):
+        """
+        :param default: Client timeout, used until enough samples exist and as the upper bound
+        :return: Timeout in seconds for the next call of this endpoint
+        """
+        latency = self._learned(method, path, self.quantile)
+        if latency is None:
+            return default
+        return min(max(latency * self.multiplier, self.min_timeout), default)
+
+    def hedge_delay(self, method, path):
+        """
+        :return: Seconds after which a hedge is sent, None if the endpoint is not hedged or not yet learned
+        """
+        if endpoint_path(path) not in self.hedge:
+            return None
+        return self._learned(method, path, self.hedge_quantile)
+
+    def call(self, method, path, send, default, retry=False, retryable=None):
+        """
+        Run one logical request
+        :param path: Endpoint path without host
+        :param send: send(timeout) performing one attempt, returns the result or raises
+        :param default: Client timeout
+        :param retry: Request is idempotent, retry and hedge it
+        :param retryable: retryable(result_or_exception) -> bool, transient failures worth another attempt
+        """
+        attempts = self.retries + 1 if retry else 1
+        adaptive = retry or method == 'GET'
+        delay = self.backoff
+        for attempt in range(attempts):
+            timeout = self.timeout(method, path, default) if adaptive else default
+            hedge_delay = self.hedge_delay(method, path) if retry else None
+            last = attempt + 1 >= attempts
+            start = perf_counter()
+            try:
+                if hedge_delay is None:
+                    result = send(timeout)
+                else:
+                    result = self._hedged(send, timeout, hedge_delay, retryable)
+            except Exception as e:
+                self.observe(method, path, perf_counter() - start)
+                if last or retryable is None or not retryable(e):
+                    raise
+            else:
+                self.observe(method, path, perf_counter() - start)
+                if last or retryable is None or not retryable(result):
+                    return result
+            self.retried += 1
+            time.sleep(min(delay, self.max_backoff) * (0.5 + random.random() / 2))
+            delay *= 2
+
+    def _hedged(self, send, timeout, delay, retryable):
+        pool = self._executor()
+        first = pool.submit(send, timeout)
+        try:
+            return first.result(delay)
+        except FutureTimeout:
+            pass
+        self.hedged += 1
+        pending = {first, pool.submit(send, timeout)}
+        done = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None and (retryable is None or not retryable(future.result())):
+                    return future.result()
+        # both attempts failed, report the later one
+        return done.pop().result()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='spikex-hedge')
+            return self._pool
+
+    def snapshot(self):
+        """{'METHOD /path': {'samples', 'timeout', 'hedge_after'}} of the learned endpoints"""
+        with self._lock:
+            keys = list(self._histograms)
+        out = {}
+        for method, path in keys:
+            latency = self._learned(method, path, self.quantile)
+            out[f'{method} {path}'] = {'samples': self._histograms[(method, path)].count,
+                                       'timeout': None if latency is None else max(latency * self.multiplier,
+                                                                                   self.min_timeout),
+                                       'hedge_after': self.hedge_delay(method, path)}
+        return out
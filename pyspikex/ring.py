@@ -0,0 +1,103 @@
+# -*- coding:utf-8 -*-
+"""
+Fixed-capacity columnar ring buffer.
+
+Each column is a preallocated array.array, appending overwrites the oldest
+row once the buffer is full and never allocates:
+
+    ring = RingBuffer(1000, (('time', 'q'), ('price', 'd'), ('qty', 'd')))
+    ring.append(1662601014832, 30000.0, 0.01)
+    ring[-1]                 # (1662601014832, 30000.0, 0.01)
+    ring.column('price')     # array('d', [...]) oldest first
+    ring.numpy('price')      # ndarray, requires NumPy
+
+Not thread-safe, the owner serializes access.
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+class RingBuffer:
+    """
+    :param capacity: Rows kept
+    :param columns: ((name, array typecode), ...), e.g. (('time', 'q'), ('price', 'd'))
+    """
+
+    def __init__(self, capacity: int, columns):
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.names = tuple(name for name, _ in columns)
+        self._columns = tuple(array(code, [0]) * capacity for _, code in columns)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def full(self):
+        return self._size == self.capacity
+
+    def append(self, *values):
+        i = self._next
+        for column, value in zip(self._columns, values):
+            column[i] = value
+        self._next = (i + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def _position(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('ring buffer index out of range')
+        return (self._next - self._size + i) % self.capacity
+
+    def __getitem__(self, i):
+        """Row i as a tuple, 0 is the oldest, -1 the newest"""
+        p = self._position(i)
+        return tuple(column[p] for column in self._columns)
+
+    def get(self, name, i=-1):
+        """One value of row i"""
+        return self._columns[self._index[name]][self._position(i)]
+
+    def set(self, name, value, i=-1):
+        """Overwrite one value of row i, e.g. to update the newest row in place"""
+        self._columns[self._index[name]][self._position(i)] = value
+
+    def rows(self, n=None):
+        """Last n rows (all by default), oldest first"""
+        n = self._size if n is None else min(n, self._size)
+        return [self[i] for i in range(self._size - n, self._size)]
+
+    def column(self, name, n=None) -> array:
+        """Last n values of a column (all by default) as a new array, oldest first"""
+        column = self._columns[self._index[name]]
+        n = self._size if n is None else min(n, self._size)
+        start = (self._next - n) % self.capacity
+        if start + n <= self.capacity:
+            return column[start:start + n]
+        return column[start:] + column[:self._next]
+
+    def numpy(self, name, n=None):
+        """Last n values of a column as an ndarray, oldest first; a zero-copy view when they are contiguous"""
+        if np is None:
+            raise ImportError('NumPy is required for array views: pip install pyspikex[numpy]')
+        column = self._columns[self._index[name]]
+        view = np.frombuffer(column, dtype=column.typecode)
+        n = self._size if n is None else min(n, self._size)
+        start = (self._next - n) % self.capacity
+        if start + n <= self.capacity:
+            return view[start:start + n]
+        return np.concatenate((view[start:], view[:self._next]))
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
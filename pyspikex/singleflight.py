@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+"""
+Deduplication of identical concurrent requests.
+
+When several threads ask for the same public data at the same moment, only
+the first one (the leader) sends the request; the others wait for it and get
+the same result, or the same exception. With ttl > 0 a result is also reused
+by calls arriving within ttl seconds after it completed.
+
+    flight = SingleFlight(ttl=0.05)
+    spot = Spot(host, singleflight=flight)
+    perp = Perp(host, ak, sk, singleflight=flight)
+
+Results are shared between callers and must be treated as read-only.
+"""
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    :param ttl: Seconds a completed result is reused, 0 only collapses calls that overlap in time
+    """
+
+    def __init__(self, ttl: float = 0.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+        self.shared = 0  # calls answered without a request of their own
+
+    def do(self, key, fn, cacheable=None):
+        """
+        Run fn() once per key among concurrent callers
+        :param key: Hashable identifying the request, e.g. (method, url, params)
+        :param fn: Zero-argument callable performing the request
+        :param cacheable: Predicate on the result deciding whether it may be reused for ttl, default: always
+        """
+        with self._lock:
+            if self.ttl:
+                cached = self._results.get(key)
+                if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                    self.shared += 1
+                    return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if self.ttl and call.error is None and (cacheable is None or cacheable(call.result)):
+                    now = time.monotonic()
+                    self._results[key] = (now, call.result)
+                    if len(self._results) > 1024:
+                        self._results = {k: v for k, v in self._results.items() if now - v[0] < self.ttl}
+            call.event.set()
+        return call.result
+
+    def forget(self, key=None):
+        """Drop cached results of one key, or all"""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+
+def request_key(method, url, params=None):
+    """Hashable key of a request, params order does not matter"""
+    if not params:
+        return method, url
+    return method, url, tuple(sorted((k, str(v)) for k, v in params.items()))
@@ -0,0 +1,279 @@
+# -*- coding:utf-8 -*-
+"""
+Market data snapshot in shared memory, one feed for many processes.
+
+A publisher process owns the websocket subscriptions and writes top of book,
+24h tickers and mark/index prices into a multiprocessing.shared_memory block,
+one fixed-size slot per symbol. Strategy processes attach to the block by name
+and read it without any socket or JSON of their own:
+
+    # publisher
+    snapshot = MarketSnapshotWriter('spikex-market', slots=2048)
+    ws = SpotWebsocketStreamClient(on_message=lambda _, message: snapshot.handle(message))
+    ws.all_ticker()
+    ws.limit_depth('btc_usdt', 5)
+
+    # any other process
+    market = MarketSnapshotReader('spikex-market')
+    quote = market.get('btc_usdt')        # Quote(symbol, time, bid, bid_qty, ask, ask_qty, last, ...)
+
+Every slot is guarded by a seqlock: the writer makes the slot's sequence odd,
+writes the fields and makes it even again, a reader retries until it has read
+the same even sequence before and after the fields, so it never sees a half
+written quote and never blocks the writer. Values not received yet are NaN.
+There must be a single writer per block.
+"""
+import json
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from pyspikex.book import OrderBooks
+from pyspikex.websocket.decoders import DepthEvent, DepthUpdateEvent, PriceEvent, StreamDecoder, TickerEvent
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+MAGIC = b'PXMS'
+VERSION = 1
+FIELDS = ('bid', 'bid_qty', 'ask', 'ask_qty', 'last', 'open', 'high', 'low', 'qty', 'amount', 'mark_price',
+          'index_price')
+Quote = namedtuple('Quote', ('symbol', 'time') + FIELDS)
+
+_HEADER = struct.Struct('<4sIII')  # magic, version, slots, symbols in use
+_HEADER_SIZE = 64
+_SEQ = struct.Struct('<Q')  # slot sequence, accessed through a 'Q' cast of the buffer: one 8-byte load or store
+_BODY = struct.Struct(f'<32sq{len(FIELDS)}d')
+SLOT_SIZE = _SEQ.size + _BODY.size
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+_NAN = float('nan')
+_attach_lock = threading.Lock()
+
+
+def _attach(name):
+    """Attach to an existing block without handing it to the resource tracker, which would unlink it"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # Python < 3.13 always registers, skip it rather than unregister: child processes
+        # share their parent's tracker and unregistering would drop the writer's own registration
+        from multiprocessing import resource_tracker
+        with _attach_lock:
+            register = resource_tracker.register
+            resource_tracker.register = lambda n, rtype: None if rtype == 'shared_memory' else register(n, rtype)
+            try:
+                return shared_memory.SharedMemory(name)
+            finally:
+                resource_tracker.register = register
+
+
+class MarketSnapshotWriter:
+    """
+    :param name: Shared memory block name, readers attach with the same name
+    :param slots: Symbols the block can hold
+    :param create: Create the block, False to take over an existing one (e.g. after a publisher restart)
+    """
+
+    def __init__(self, name: str = 'spikex-market', slots: int = 1024, create: bool = True):
+        if create:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=_HEADER_SIZE + slots * SLOT_SIZE)
+            _HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, 0)
+            self._slots = {}
+        else:
+            self.shm = _attach(name)
+            reader = MarketSnapshotReader(shm=self.shm)
+            slots = reader.capacity
+            self._slots = {symbol: i for i, symbol in enumerate(reader.symbols())}
+            reader._words.release()
+        self.name = name
+        self.capacity = slots
+        self.books = OrderBooks(depth=1)
+        self.decoder = StreamDecoder()
+        self._words = self.shm.buf.cast('Q')
+        self._seqs = []
+        self._values = []
+        self._lock = threading.Lock()
+        if not create:
+            self._take_over()
+
+    def _take_over(self):
+        """
+        Adopt the slots of a previous writer. Their fields are read without the seqlock, this is the only writer;
+        a slot left odd by a writer that died mid-update is made even again so readers stop waiting on it
+        """
+        for slot in range(len(self._slots)):
+            offset = self._offset(slot)
+            seq = self._words[offset // 8]
+            if seq & 1:
+                seq += 1
+                self._words[offset // 8] = seq
+            self._seqs.append(seq)
+            self._values.append(list(_BODY.unpack_from(self.shm.buf, offset + _SEQ.size)[1:]))
+
+    @staticmethod
+    def _offset(slot):
+        return _HEADER_SIZE + slot * SLOT_SIZE
+
+    def update(self, symbol, time_ms=None, **fields):
+        """
+        Write fields of symbol's slot, the others keep their value
+        :param fields: Names from FIELDS, e.g. bid=30000.0, ask=30000.1
+        """
+        with self._lock:
+            slot = self._slots.get(symbol)
+            if slot is None:
+                slot = self._add(symbol)
+            values = self._values[slot]
+            if time_ms is not None:
+                values[0] = time_ms
+            for name, value in fields.items():
+                values[_INDEX[name] + 1] = _NAN if value is None else float(value)
+            buf = self.shm.buf
+            offset = self._offset(slot)
+            seq = self._seqs[slot]
+            self._words[offset // 8] = seq + 1
+            _BODY.pack_into(buf, offset + _SEQ.size, symbol.encode(), *values)
+            self._words[offset // 8] = seq + 2
+            self._seqs[slot] = seq + 2
+
+    def _add(self, symbol):
+        slot = len(self._slots)
+        if slot >= self.capacity:
+            raise ValueError(f'market snapshot {self.name} is full ({self.capacity} symbols)')
+        if len(symbol.encode()) > 32:
+            raise ValueError(f'symbol longer than 32 bytes: {symbol}')
+        self._values.append([0] + [_NAN] * len(FIELDS))
+        self._seqs.append(0)
+        _BODY.pack_into(self.shm.buf, self._offset(slot) + _SEQ.size, symbol.encode(), *self._values[slot])
+        self._slots[symbol] = slot
+        # publish the slot only once its name is written, readers scan up to this count
+        _HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, self.capacity, slot + 1)
+        return slot
+
+    def handle(self, message):
+        """
+        Feed a ticker, tickers, depth, depth_update, mark_price or index_price stream message
+        (raw frame, parsed dict or decoded event)
+        :return: True if the snapshot was updated
+        """
+        event = message
+        if isinstance(message, (str, bytes, bytearray)):
+            try:
+                message = json.loads(message)
+            except ValueError:
+                return False
+        if isinstance(message, dict):
+            if 'data' not in message:
+                return False
+            event = self.decoder.decode_data(message.get('topic'), message.get('event'), message['data'])
+        if isinstance(event, list):
+            return any([self.apply(item) for item in event])
+        return self.apply(event)
+
+    def apply(self, event) -> bool:
+        """Write a decoded TickerEvent, DepthEvent, DepthUpdateEvent or PriceEvent"""
+        if isinstance(event, TickerEvent):
+            self.update(event.symbol, event.time, last=event.close, open=event.open, high=event.high,
+                        low=event.low, qty=event.qty, amount=event.amount)
+        elif isinstance(event, (DepthEvent, DepthUpdateEvent)):
+            book = self.books.handle(event)
+            bid, ask = book.best_bid, book.best_ask
+            self.update(event.symbol, event.time, bid=bid and bid.price, bid_qty=bid and bid.qty,
+                        ask=ask and ask.price, ask_qty=ask and ask.qty)
+        elif isinstance(event, PriceEvent):
+            self.update(event.symbol, event.time, **{event.topic: event.price})
+        else:
+            return False
+        return True
+
+    def close(self, unlink: bool = True):
+        """Detach, and remove the block unless readers should keep the last values"""
+        self._words.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MarketSnapshotReader:
+    """
+    :param name: Shared memory block name of the writer
+    :param retries: Attempts to read a consistent slot before giving up
+    """
+
+    def __init__(self, name: str = 'spikex-market', retries: int = 10000, shm=None):
+        self.shm = shm if shm is not None else _attach(name)
+        self._words = self.shm.buf.cast('Q')
+        self.name = name
+        self.retries = retries
+        magic, version, self.capacity, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{name} is not a pyspikex market snapshot (version {VERSION})')
+        self._slots = {}
+
+    def _scan(self):
+        count = _HEADER.unpack_from(self.shm.buf, 0)[3]
+        buf = self.shm.buf
+        for slot in range(len(self._slots), count):
+            name = _BODY.unpack_from(buf, _HEADER_SIZE + slot * SLOT_SIZE + _SEQ.size)[0]
+            self._slots[name.rstrip(b'\0').decode()] = slot
+
+    def symbols(self):
+        self._scan()
+        return list(self._slots)
+
+    def get(self, symbol) -> Quote:
+        """Consistent quote of symbol, None if the writer never published it"""
+        slot = self._slots.get(symbol)
+        if slot is None:
+            self._scan()
+            slot = self._slots.get(symbol)
+            if slot is None:
+                return None
+        buf = self.shm.buf
+        words = self._words
+        offset = _HEADER_SIZE + slot * SLOT_SIZE
+        index = offset // 8
+        for attempt in range(self.retries):
+            before = words[index]
+            if not before & 1:
+                values = _BODY.unpack_from(buf, offset + _SEQ.size)
+                if words[index] == before:
+                    return Quote(symbol, *values[1:])
+            if attempt % 64 == 63:
+                time.sleep(0)  # let the writer finish
+        raise RuntimeError(f'slot of {symbol} stayed busy, is the writer stuck mid-update?')
+
+    def all(self) -> dict:
+        """{symbol: Quote} of every published symbol"""
+        return {symbol: self.get(symbol) for symbol in self.symbols()}
+
+    def numpy(self):
+        """
+        Zero-copy structured ndarray over the published slots, fields seq, symbol, time and FIELDS; requires NumPy.
+        Rows are read without the seqlock and may be torn while the writer updates them, use get() for
+        consistent quotes
+        """
+        if np is None:
+            raise ImportError('NumPy is required for array views: pip install pyspikex[numpy]')
+        dtype = np.dtype([('seq', '<u8'), ('symbol', 'S32'), ('time', '<i8')] + [(f, '<f8') for f in FIELDS])
+        count = _HEADER.unpack_from(self.shm.buf, 0)[3]
+        return np.ndarray((count,), dtype=dtype, buffer=self.shm.buf, offset=_HEADER_SIZE)
+
+    def close(self):
+        self._words.release()
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -7,6 +7,12 @@ import logging
 from copy import deepcopy
 from typing import List, Dict
 
+from pyspikex import frames
+from pyspikex.clock import ClockSync
+from pyspikex.fixed import Fixed, encode
+from pyspikex.instrumentation import instrument_session, timer
+from pyspikex.singleflight import request_key
+
 logger = logging.getLogger('spikex')
 
 """
@@ -32,7 +38,20 @@ class Spot:
     """
 
     # def __init__(self, host, account=None, user_id=None, account_id=None, access_key=None, secret_key=None):
-    def __init__(self, host, user_id=None, access_key=None, secret_key=None):
+    def __init__(self, host, user_id=None, access_key=None, secret_key=None, instrumentation=None, session=None,
+                 clock=None, validator=None, singleflight=None, policy=None, breaker=None, rate_limit=None,
+                 timeout=None):
+        """
+        :param instrumentation: Request hook, see pyspikex.instrumentation.Instrumentation
+        :param session: requests.Session to send requests through, a new one is created if omitted
+        :param clock: pyspikex.clock.ClockSync used to timestamp signed requests, see enable_clock_sync()
+        :param validator: pyspikex.validation.OrderValidator checking orders locally before they are sent
+        :param singleflight: pyspikex.singleflight.SingleFlight collapsing identical concurrent public GETs
+        :param policy: pyspikex.retry.RequestPolicy for adaptive timeouts, retries and hedging
+        :param breaker: pyspikex.breaker.CircuitBreaker failing fast on degraded endpoint groups
+        :param rate_limit: Limiter acquired before every HTTP request, e.g. pyspikex.pool.TokenBucket
+        :param timeout: Request timeout in seconds, default 10
+        """
         self.host = host
         # self.account = account
         self.user_id = user_id
@@ -41,11 +60,21 @@ class Spot:
         self.secret_key = secret_key
         # self.anonymous = not(account and account_id and access_key and secret_key)
         self.anonymous = not (access_key and secret_key)
-        self.timeout = 10  # Default timeout in seconds
+        self.timeout = timeout or 10  # Default timeout in seconds
         self.headers = {
             "Content-type": "application/x-www-form-urlencoded",
             'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:53.0) Gecko/20100101 Firefox/53.0'
         }
+        self.instrumentation = instrumentation
+        self.session = session or (instrument_session() if instrumentation else requests.Session())
+        self.clock = clock
+        self.validator = validator
+        self.singleflight = singleflight
+        self.policy = policy
+        self.breaker = breaker
+        self.rate_limit = rate_limit
+        if breaker is not None and breaker.instrumentation is None:
+            breaker.instrumentation = instrumentation
 
     @classmethod
     def underscore_to_camelcase(cls, name):
@@ -70,7 +99,10 @@ class Spot:
 
     def gen_auth_header(self, url, method, **kwargs):
         headers = {}
-        headers['xt-validate-timestamp'] = str(int((time.time() - 30) * 1000))
+        if self.clock is not None and self.clock.last_sync is not None:
+            headers['xt-validate-timestamp'] = str(self.clock.time_ms())
+        else:  # no server time estimate yet
+            headers['xt-validate-timestamp'] = str(int((time.time() - 30) * 1000))
         headers['xt-validate-appkey'] = self.access_key
         headers['xt-validate-recvwindow'] = '60000'
         headers['xt-validate-algorithms'] = 'HmacSHA256'
@@ -82,21 +114,31 @@ class Spot:
     def auth_req(self, url, method='GET', **params):  # Authenticated endpoint requiring signature
         if self.anonymous:
             raise SpikexCodeError('Spikex.com login credentials not provided correctly')
+        return self._dispatch(method, url, lambda timeout: self._auth_req(url, method, timeout, **params))
+
+    def _auth_req(self, url, method, timeout, **params):
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+        params = encode(params)
         headers = self.gen_auth_header(url, method, **params)
-        kwargs = {'headers': headers, 'timeout': self.timeout}
+        kwargs = {'headers': headers, 'timeout': timeout}
         kwargs.update(params)
         resp = None
         res = None
+        t = timer(self.instrumentation, method, url)
         try:
             # print(params)
-            resp = requests.request(method, self.host + url, **kwargs)
+            resp = self.session.request(method, self.host + url, **kwargs)
+            t.response(resp)
             resp.raise_for_status()
             res = resp.json()
         except Exception as e:
+            t.finish(resp.status_code if resp is not None else None, error=e)
             info = f'url:{url} method:{method} params:{params} exception:{e}'
             logger.error(info, exc_info=True)
             raise SpikexHttpError(e, info=info, request={'url': url, 'method': method, 'params': params},
                               response=resp, res=res)
+        t.finish(resp.status_code, res.get('rc'), res.get('mc'))
         if res['rc'] != 0:
             if res['mc'] == 'AUTH_103':  # When signature error occurs, log ak, url, headers for verification
                 info = f'url:{url} method:{method} params:{params} headers:{json.dumps(headers)}'
@@ -108,20 +150,46 @@ class Spot:
         return res
 
     def req(self, url, method, **params):  # Public endpoint
-        kwargs = {'headers': self.headers, 'timeout': self.timeout}
+        if self.singleflight is not None and method == 'GET':
+            key = request_key(method, url, params.get('params'))
+            return self.singleflight.do(key, lambda: self._call(url, method, **params))
+        return self._call(url, method, **params)
+
+    def _call(self, url, method, **params):
+        return self._dispatch(method, url, lambda timeout: self._req(url, method, timeout, **params),
+                              retry=method == 'GET')
+
+    def _dispatch(self, method, url, send, retry=False):
+        """Run send(timeout) through the circuit breaker and request policy when configured"""
+        if self.policy is None:
+            call = lambda: send(self.timeout)
+        else:
+            call = lambda: self.policy.call(method, url, send, self.timeout, retry=retry, retryable=_transient)
+        if self.breaker is None:
+            return call()
+        return self.breaker.call(url, call, failed=_transient)
+
+    def _req(self, url, method, timeout, **params):
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+        params = encode(params)
+        kwargs = {'headers': self.headers, 'timeout': timeout}
         kwargs.update(params)
         resp = None
         res = None
-
+        t = timer(self.instrumentation, method, url)
         try:
-            resp = requests.request(method, self.host + url, **kwargs)
+            resp = self.session.request(method, self.host + url, **kwargs)
+            t.response(resp)
             resp.raise_for_status()
             res = resp.json()
         except Exception as e:
+            t.finish(resp.status_code if resp is not None else None, error=e)
             info = f'url:{url} method:{method} params:{params} exception:{e}'
             logger.error(info, exc_info=True)
             raise SpikexHttpError(e, info=info, response=resp, res=res)
-        return resp.json()
+        t.finish(resp.status_code, res.get('rc'), res.get('mc'))
+        return res
 
     def req_get(self, url, params=None, auth=None):  # Determine if authentication is required based on endpoint name
         auth = auth if auth is not None else '/v4/public' not in url
@@ -141,6 +209,22 @@ class Spot:
             return self.auth_req(url, "DELETE", params=params, json=json)
         return self.req(url, "DELETE", params=params, json=json)
 
+    def enable_clock_sync(self, interval=30):
+        """
+        Start a background ClockSync on the server time endpoint and sign with the estimated server time
+        instead of local time minus 30 seconds, which stays in use until a sync succeeds
+        :param interval: Seconds between syncs
+        :return: ClockSync
+        """
+        if self.clock is None:
+            self.clock = ClockSync(self._server_time_ms, interval=interval)
+        self.clock.start()
+        return self.clock
+
+    def _server_time_ms(self):
+        """Server time probe sent directly, singleflight, retries and hedging would distort its round trip"""
+        return int(self._req('/v4/public/time', 'GET', self.timeout)['result']['serverTime'])
+
     # -----------------------------------Market Data-----------------------------------
 
     def get_time(self) -> int:
@@ -352,6 +436,40 @@ class Spot:
         res = self.req_get('/v4/public/ticker/24h', params)
         return res['result']
 
+    # NumPy variants, see pyspikex.frames. columns=True returns {column: ndarray} instead of a structured array
+
+    def get_depth_array(self, symbol: str, limit: int = None):
+        """
+        get_depth() as {'bids': ndarray, 'asks': ndarray} of shape (n, 2), columns price, quantity
+        """
+        return frames.depth_array(self.get_depth(symbol, limit))
+
+    def get_kline_array(self, symbol: str, interval: str, start_time: int = None, end_time: int = None,
+                        limit: int = 100, columns: bool = False):
+        """
+        get_kline() as a NumPy array, columns t o h l c q v
+        """
+        return frames.kline_array(self.get_kline(symbol, interval, start_time, end_time, limit), columns)
+
+    def get_trade_recent_array(self, symbol, limit: int = None, columns: bool = False):
+        """
+        get_trade_recent() as a NumPy array, columns i t p q v b
+        """
+        return frames.trade_array(self.get_trade_recent(symbol, limit), columns)
+
+    def get_trade_history_array(self, symbol, direction, limit: int = None, from_id: int = None,
+                                columns: bool = False):
+        """
+        get_trade_history() as a NumPy array, columns i t p q v b
+        """
+        return frames.trade_array(self.get_trade_history(symbol, direction, limit, from_id), columns)
+
+    def get_tickers_24h_array(self, symbol: str = None, symbols: list = None, columns: bool = False):
+        """
+        get_tickers_24h() as a NumPy array, columns s o h l c q v cv cr
+        """
+        return frames.ticker_24h_array(self.get_tickers_24h(symbol, symbols), columns)
+
     # -----------------------------------Orders-----------------------------------
 
     def get_order(self, order_id=None, client_order_id=None) -> dict:
@@ -382,6 +500,8 @@ class Spot:
         :param price: Price. Required for LIMIT orders; not used for MARKET orders
         :param quantity: Quantity. Required for LIMIT orders; required for MARKET orders when ordering by quantity
         :param quote_qty: Quote quantity. Not used for LIMIT orders; required for MARKET orders when ordering by amount
+        Numbers may be str, int, float or pyspikex.fixed.Fixed; a MARKET BUY given quantity and price is sent as
+        the exact quoteQty = quantity * price
         :return: Order result dictionary
         """
         params = {'symbol': symbol, 'side': side, 'type': type, 'bizType': biz_type,
@@ -394,9 +514,11 @@ class Spot:
             params['quoteQty'] = quote_qty
         if quantity:
             if type == "MARKET" and side == "BUY" and quote_qty is None:
-                params['quoteQty'] = quantity * price
+                params['quoteQty'] = Fixed.parse(quantity) * Fixed.parse(price)
             else:
                 params['quantity'] = quantity
+        if self.validator:
+            self.validator.check(params)
         res = self.req_post("/v4/order", params)
         return res['result']
 
@@ -489,6 +611,12 @@ class Spot:
         for item in data:
             # item_ = {transfer_hump(k): v for k, v in item.items()}
             items.append(item)
+        if self.validator:
+            errors = self.validator.check_batch(items)
+            if errors:
+                index, error = errors[0]
+                error.info = f'batch item {index}: {error.info}'
+                raise error
         params = {"clientBatchId": batch_id, "items": items}
         res = self.req_post("/v4/batch-order", params)
         return res['result']
@@ -739,6 +867,23 @@ SPIKEX_MES_ERRORS = {
 }
 
 
+def _transient(outcome):
+    """Failure worth retrying an idempotent request for: no response, 429 or 5xx"""
+    if not isinstance(outcome, SpikexHttpError):
+        return False
+    resp = getattr(outcome, 'response', None)
+    return resp is None or resp.status_code == 429 or resp.status_code >= 500
+
+
+class SpikexCircuitOpenError(Exception):
+    """Request not sent, the circuit breaker of its endpoint group is open, see pyspikex.breaker"""
+
+    def __init__(self, group: str, retry_after: float):
+        self.group = group
+        self.retry_after = retry_after
+        super().__init__(f'Spikex.com circuit open for {group}, retry in {retry_after:.2f}s')
+
+
 class SpikexBusinessError(Exception):
     def __init__(self, data, info: str = None):
         self.return_code = data.get('rc', '0')
@@ -752,3 +897,13 @@ class SpikexBusinessError(Exception):
 
     def __str__(self):
         return f"Spikex.com ERROR. RC:{self.return_code} MC: {self.message_code} DESC:{self.desc} INFO: {self.info} SOURCE:{json.dumps(self.source)}"
+
+
+class SpikexValidationError(SpikexBusinessError):
+    """
+    Order rejected locally by pyspikex.validation.OrderValidator, carries the
+    message code the server would have answered with (e.g. ORDER_F0103)
+    """
+
+    def __init__(self, message_code: str, info: str = None):
+        super().__init__({'rc': 1, 'mc': message_code}, info)
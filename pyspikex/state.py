@@ -0,0 +1,561 @@
+# -*- coding:utf-8 -*-
+"""
+Local account state kept current by the user data streams.
+
+OrderTracker follows every order of the account from the user_order and
+user_trade streams, so strategy code reads order state from memory instead
+of polling get_open_orders / get_account_order:
+
+    tracker = OrderTracker(spot=spot)
+    tracker.bootstrap()                 # open orders from one REST call
+    tracker.start(interval=60)          # low-frequency reconciliation
+
+    def on_message(_, message):
+        tracker.handle(message)
+
+    ws = SpotWebsocketStreamClient(on_message=on_message, is_auth=True)
+    ws.user_order(listen_key)
+    ws.user_trade(listen_key)
+
+    tracker.get(order_id).state
+    tracker.by_client_id('px1a2b...').executed_qty
+    tracker.open_orders('btc_usdt')
+
+Updates are applied idempotently: a message that is older than what is known
+(lower state rank, less executed quantity or an earlier time) is ignored, so
+duplicated, replayed or reordered messages and REST snapshots never move an
+order backwards. Spot short stream keys, spot REST keys and perpetual keys are
+all understood.
+
+BalanceCache and PositionCache do the same for the user_balance and
+user_position streams: bootstrapped from one REST snapshot, then updated from
+the streams, every reader in the process shares them:
+
+    balances = BalanceCache(spot=spot, on_change=lambda key, old, new: ...)
+    balances.bootstrap()
+    balances.get('SPOT', 'usdt').available     # pyspikex.models.Balance
+    positions = PositionCache(perp=perp)
+    positions.get('btc_usdt', 'LONG').size
+"""
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+
+from pyspikex.fixed import Fixed
+from pyspikex.models import Balance, Position
+
+logger = logging.getLogger('spikex')
+
+OPEN_STATES = ('NEW', 'PARTIALLY_FILLED')
+_RANKS = {'NEW': 0, 'PARTIALLY_FILLED': 1}  # anything else is final
+
+
+def _first(data, keys):
+    for key in keys:
+        value = data.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def _number(value):
+    return None if value in (None, '') else Fixed.parse(value)
+
+
+def _decode(message):
+    """(topic, data) of a raw or parsed stream message, (None, None) for anything else"""
+    if isinstance(message, (str, bytes, bytearray)):
+        try:
+            message = json.loads(message)
+        except ValueError:
+            return None, None
+    if not isinstance(message, dict) or 'data' not in message:
+        return None, None
+    return message.get('topic'), message['data']
+
+
+def _items(result):
+    """Rows of a list result, plain or paged"""
+    if isinstance(result, dict):
+        result = result.get('items')
+    return result if isinstance(result, list) else []
+
+
+def _perp_result(res):
+    code, success, error = res
+    if error is not None or not isinstance(success, dict):
+        raise RuntimeError(f'perp request failed, code:{code} error:{error}')
+    return success.get('result')
+
+
+def perp_account_orders(perp, state='UNFINISHED', symbol=None, size=100, max_pages=100) -> list:
+    """Every page of Perp.get_account_order, raises RuntimeError if a page fails"""
+    rows = []
+    for page in range(1, max_pages + 1):
+        result = _perp_result(perp.get_account_order(state, symbol=symbol, page=page, size=size))
+        items = _items(result)
+        rows += items
+        total = result.get('total') if isinstance(result, dict) else None
+        if len(items) < size or not isinstance(result, dict) or (total is not None and len(rows) >= int(total)):
+            return rows
+    raise RuntimeError(f'more than {max_pages} pages of {state} orders')
+
+
+def perp_history_orders(perp, symbol=None, start_time=None, end_time=None, limit=100, max_pages=100) -> list:
+    """Every page of Perp.get_history_order, following hasNext with the last order id"""
+    rows = []
+    last_id = None
+    for _ in range(max_pages):
+        result = _perp_result(perp.get_history_order(symbol=symbol, direction='NEXT' if last_id else None,
+                                                     oid=last_id, limit=limit, start_time=start_time,
+                                                     end_time=end_time))
+        items = _items(result)
+        rows += items
+        next_id = items[-1].get('orderId') if items else None
+        if not (isinstance(result, dict) and result.get('hasNext')) or next_id is None or next_id == last_id:
+            return rows
+        last_id = next_id
+    raise RuntimeError(f'more than {max_pages} pages of order history')
+
+
+class TrackedOrder:
+    """Current state of one order, numbers are Fixed"""
+    __slots__ = ('order_id', 'client_order_id', 'symbol', 'side', 'type', 'price', 'orig_qty', 'executed_qty',
+                 'avg_price', 'state', 'time', 'fills', 'raw')
+
+    KEYS = {
+        'order_id': ('i', 'orderId'),
+        'client_order_id': ('ci', 'clientOrderId'),
+        'symbol': ('s', 'symbol'),
+        'side': ('sd', 'side', 'orderSide'),
+        'type': ('tp', 'type', 'orderType'),
+        'state': ('st', 'state'),
+        'time': ('t', 'updatedTime', 'time', 'createdTime', 'createTime'),
+    }
+    NUMBERS = {
+        'price': ('p', 'price'),
+        'orig_qty': ('oq', 'origQty'),
+        'executed_qty': ('eq', 'executedQty'),
+        'avg_price': ('ap', 'avgPrice'),
+    }
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.client_order_id = None
+        self.symbol = None
+        self.side = None
+        self.type = None
+        self.price = None
+        self.orig_qty = None
+        self.executed_qty = None
+        self.avg_price = None
+        self.state = None
+        self.time = None
+        self.fills = {}  # trade key -> (price, qty)
+        self.raw = None
+
+    @property
+    def is_open(self):
+        return self.state is None or self.state in OPEN_STATES
+
+    @property
+    def rank(self):
+        return -1 if self.state is None else _RANKS.get(self.state, 2)
+
+    def is_stale(self, data):
+        """True if data describes an older version of this order than the one held"""
+        state = _first(data, self.KEYS['state'])
+        if state is None:
+            return False
+        rank = _RANKS.get(state, 2)
+        if rank != self.rank:
+            return rank < self.rank
+        executed = _number(_first(data, self.NUMBERS['executed_qty']))
+        if executed is not None and self.executed_qty is not None and executed != self.executed_qty:
+            return executed < self.executed_qty
+        updated = _first(data, self.KEYS['time'])
+        return updated is not None and self.time is not None and int(updated) < self.time
+
+    def update(self, data):
+        for name, keys in self.KEYS.items():
+            value = _first(data, keys)
+            if value is not None:
+                if name == 'time':
+                    value = int(value)
+                elif name == 'order_id':
+                    value = str(value)  # the tracker's key, payloads send it as a number or a string
+                setattr(self, name, value)
+        for name, keys in self.NUMBERS.items():
+            value = _first(data, keys)
+            if value is not None:
+                setattr(self, name, _number(value))
+        self.raw = data
+
+    def add_fill(self, key, price, qty):
+        """Record a trade once, executed_qty never lags behind the sum of the fills"""
+        if key in self.fills:
+            return False
+        self.fills[key] = (price, qty)
+        filled = sum((q for _, q in self.fills.values()), Fixed(0))
+        if self.executed_qty is None or filled > self.executed_qty:
+            self.executed_qty = filled
+            if self.state in (None, 'NEW'):
+                self.state = 'PARTIALLY_FILLED'
+        return True
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('fills', 'raw')}
+
+    def __repr__(self):
+        return (f'TrackedOrder({self.order_id}, {self.symbol}, {self.side}, {self.state}, '
+                f'{self.executed_qty}/{self.orig_qty})')
+
+
+class OrderTracker:
+    """
+    :param spot: pyspikex.spot.Spot used for bootstrap and reconciliation
+    :param perp: pyspikex.perp.Perp, instead of spot
+    :param on_change: Callback(order, old_state) after an order changed state or executed quantity
+    :param max_closed: Final orders kept for lookups, oldest are dropped first
+    """
+
+    def __init__(self, spot=None, perp=None, on_change=None, max_closed=10000):
+        self.spot = spot
+        self.perp = perp
+        self.on_change = on_change
+        self._lock = threading.RLock()
+        self._orders = {}
+        self._client_ids = {}
+        self._open = set()
+        self._closed = deque()
+        self.max_closed = max_closed
+        self.version = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -----------------------------------Reads-----------------------------------
+
+    def get(self, order_id):
+        return self._orders.get(str(order_id))
+
+    def by_client_id(self, client_order_id):
+        order_id = self._client_ids.get(client_order_id)
+        return None if order_id is None else self._orders.get(order_id)
+
+    def open_orders(self, symbol=None):
+        with self._lock:
+            orders = [self._orders[i] for i in self._open]
+        return orders if symbol is None else [o for o in orders if o.symbol == symbol]
+
+    def __len__(self):
+        return len(self._orders)
+
+    # -----------------------------------Updates-----------------------------------
+
+    def handle(self, message):
+        """
+        Feed one user stream message (raw frame or parsed dict)
+        :return: True if it was an order or trade update
+        """
+        topic, data = _decode(message)
+        if topic == 'order':
+            self.apply_order(data)
+        elif topic == 'trade' and isinstance(data, dict) and ('oi' in data or 'orderId' in data):
+            self.apply_trade(data)
+        else:
+            return False
+        return True
+
+    def apply_order(self, data):
+        """Apply an order update from the stream or a REST order object, ignored if stale"""
+        order_id = _first(data, TrackedOrder.KEYS['order_id'])
+        if order_id is None:
+            return None
+        order_id = str(order_id)
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                order = self._orders[order_id] = TrackedOrder(order_id)
+            elif order.is_stale(data):
+                return order
+            before = (order.state, order.executed_qty)
+            order.update(data)
+            changed = self._index(order, before)
+        if changed:
+            self._notify(order, before[0])
+        return order
+
+    def apply_trade(self, data):
+        """
+        Apply a fill from the user_trade stream
+        Spot: oi order id, i trade id, p, q; perpetual: orderId, price, quantity, timestamp
+        """
+        order_id = _first(data, ('oi', 'orderId'))
+        if order_id is None:
+            return None
+        order_id = str(order_id)
+        price = _number(_first(data, ('p', 'price')))
+        qty = _number(_first(data, ('q', 'quantity')))
+        if qty is None:
+            return None
+        trade_id = _first(data, ('i', 'tradeId'))
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                order = self._orders[order_id] = TrackedOrder(order_id)
+                order.symbol = _first(data, ('s', 'symbol'))
+            if trade_id is not None:
+                key = trade_id
+            else:
+                # perpetual fills carry no trade id, identical fills in the same millisecond are separate trades
+                base = (_first(data, ('t', 'timestamp')), str(price), str(qty))
+                n = 0
+                while base + (n,) in order.fills:
+                    n += 1
+                key = base + (n,)
+            before = (order.state, order.executed_qty)
+            if not order.add_fill(key, price, qty):
+                return order
+            changed = self._index(order, before)
+        if changed:
+            self._notify(order, before[0])
+        return order
+
+    def _index(self, order, before):
+        """Maintain the client id, open and closed indexes, return True if order changed"""
+        if order.client_order_id:
+            self._client_ids[order.client_order_id] = order.order_id
+        if order.is_open:
+            self._open.add(order.order_id)
+        elif order.order_id in self._open or before[0] is None:
+            self._open.discard(order.order_id)
+            self._closed.append(order.order_id)
+            while len(self._closed) > self.max_closed:
+                dropped = self._orders.pop(self._closed.popleft(), None)
+                if dropped is not None and dropped.client_order_id:
+                    self._client_ids.pop(dropped.client_order_id, None)
+        changed = before != (order.state, order.executed_qty)
+        if changed:
+            self.version += 1
+        return changed
+
+    def _notify(self, order, old_state):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(order, old_state)
+        except Exception:
+            logger.exception('order tracker on_change failed')
+
+    # -----------------------------------REST-----------------------------------
+
+    def fetch_open(self):
+        """Open orders from REST (every page for Perp), not applied"""
+        if self.spot is not None:
+            return self.spot.get_open_orders()
+        return perp_account_orders(self.perp, 'UNFINISHED')
+
+    def _fetch_order(self, order_id):
+        if self.spot is not None:
+            return self.spot.get_order(order_id=order_id)
+        return _perp_result(self.perp.get_order_id(order_id))
+
+    def bootstrap(self):
+        """Load the open orders from REST, returns their number"""
+        return self.load(self.fetch_open())
+
+    def load(self, rows):
+        """Apply REST order rows, returns their number"""
+        rows = rows or []
+        for row in rows:
+            self.apply_order(row)
+        return len(rows)
+
+    def reconcile(self):
+        """
+        Compare the open orders on the exchange with the local ones. Orders missing locally are
+        added; only orders open locally but no longer open on the exchange are fetched one by one.
+        :return: Number of orders fetched individually
+        """
+        remote = {str(_first(row, TrackedOrder.KEYS['order_id'])): row for row in self.fetch_open() or []}
+        for row in remote.values():
+            self.apply_order(row)
+        with self._lock:
+            missing = [order_id for order_id in self._open if order_id not in remote]
+        for order_id in missing:
+            try:
+                row = self._fetch_order(order_id)
+            except Exception as e:
+                logger.warning('order %s reconciliation failed: %s', order_id, e)
+                continue
+            if row:
+                self.apply_order(row)
+        return len(missing)
+
+    def start(self, interval=60):
+        """Reconcile every interval seconds in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='spikex-order-tracker',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.warning('order reconciliation failed: %s', e)
+
+
+class _StreamCache(ABC):
+    """
+    Keyed snapshots of one user stream topic. Entries are replaced, never mutated, so a value read
+    from the cache stays consistent; version increases with every change.
+    """
+    topic = None
+
+    def __init__(self, spot=None, perp=None, on_change=None):
+        self.spot = spot
+        self.perp = perp
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._times = {}
+        self._touched = set()
+        self.version = 0
+
+    def get(self, *key):
+        return self._entries.get(key[0] if len(key) == 1 else key)
+
+    def all(self):
+        return dict(self._entries)
+
+    def snapshot(self):
+        """(version, {key: value}) read atomically"""
+        with self._lock:
+            return self.version, dict(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def handle(self, message):
+        """
+        Feed one user stream message (raw frame or parsed dict)
+        :return: True if it was an update of this cache's topic
+        """
+        topic, data = _decode(message)
+        if topic != self.topic:
+            return False
+        for item in data if isinstance(data, list) else (data,):
+            self.apply(item, stream=True)
+        return True
+
+    def apply(self, data, stream=False):
+        """Apply one stream item or REST row"""
+        key, value, updated = self._parse(data)
+        if key is None:
+            return
+        with self._lock:
+            if stream:
+                self._touched.add(key)
+            elif key in self._touched:
+                return  # the stream already delivered a newer value during bootstrap
+            last = self._times.get(key)
+            if updated is not None and last is not None and updated < last:
+                return
+            if updated is not None:
+                self._times[key] = updated
+            old = self._entries.get(key)
+            if old is not None and old.raw == value.raw:
+                return
+            self._entries[key] = value
+            self.version += 1
+        if self.on_change is not None:
+            try:
+                self.on_change(key, old, value)
+            except Exception:
+                logger.exception('%s on_change failed', type(self).__name__)
+
+    def bootstrap(self):
+        """Load the current values from one REST call, returns the number of rows"""
+        return self.load(self.fetch())
+
+    def fetch(self):
+        """Current rows from REST, not applied; stream updates from now on win over them in load()"""
+        with self._lock:
+            self._touched.clear()
+        return self._fetch()
+
+    def load(self, rows):
+        """Apply REST rows, returns their number"""
+        rows = rows or []
+        for row in rows:
+            self.apply(row)
+        return len(rows)
+
+    @abstractmethod
+    def _parse(self, data):
+        """:return: (key, value, updated time or None) of a stream or REST row, (None, None, None) to ignore it"""
+
+    @abstractmethod
+    def _fetch(self):
+        """Current rows from REST"""
+
+
+class BalanceCache(_StreamCache):
+    """
+    Balances as pyspikex.models.Balance. Spot balances are keyed by (bizType, lowercase currency), SPOT for
+    the REST rows that carry no bizType, so SPOT and LEVER balances of a currency are kept apart;
+    perpetual balances by lowercase coin.
+    Spot stream items (c, b, f, t, z) are translated to the REST field names.
+    """
+    topic = 'balance'
+
+    def _parse(self, data):
+        updated = None
+        if 'c' in data:
+            updated = data.get('t')
+            total, frozen = _number(data.get('b')), _number(data.get('f'))
+            available = None if total is None else total - (frozen or Fixed(0))
+            data = {'currency': data['c'], 'totalAmount': data.get('b'), 'frozenAmount': data.get('f'),
+                    'availableAmount': None if available is None else str(available), 'bizType': data.get('z')}
+        currency = data.get('currency')
+        if currency is not None:
+            return ((data.get('bizType') or 'SPOT').upper(), currency.lower()), Balance(data), updated
+        coin = data.get('coin')
+        if coin is None:
+            return None, None, None
+        return coin.lower(), Balance(data), updated
+
+    def _fetch(self):
+        if self.spot is not None:
+            result = self.spot.balances()
+            return result.get('assets') if isinstance(result, dict) else result
+        return _items(_perp_result(self.perp.get_account_capital()))
+
+
+class PositionCache(_StreamCache):
+    """Perpetual positions as pyspikex.models.Position, keyed by (symbol, positionSide)"""
+    topic = 'position'
+
+    def _parse(self, data):
+        symbol = data.get('symbol')
+        if symbol is None:
+            return None, None, None
+        return (symbol, data.get('positionSide')), Position(data), None
+
+    def _fetch(self):
+        return _items(_perp_result(self.perp.get_position()))
+
+    def open_positions(self, symbol=None):
+        """Positions with a non-zero size"""
+        return [p for (s, _), p in self.all().items()
+                if (symbol is None or s == symbol) and p.size is not None and p.size != 0]
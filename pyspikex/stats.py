@@ -0,0 +1,187 @@
+# -*- coding:utf-8 -*-
+"""
+Rolling-window trade statistics.
+
+TradeStats keeps the trades of every symbol in a RingBuffer and, for each
+window, running sums that are updated when a trade enters and when it leaves
+the window, so a trade costs O(1) amortized however many windows there are:
+
+    stats = TradeStats(['1s', '1m', '5m'])
+
+    def on_message(_, message):
+        stats.handle(message)             # trade@{symbol} frames
+
+    s = stats.stats('btc_usdt', '1m')     # WindowStats: count, volume, amount, vwap, buy/sell volume, imbalance
+    stats.numpy('btc_usdt', 'price', '1m')  # prices of the window, oldest first
+
+Windows end at the newest trade of the symbol, or at clock() when a clock is
+given. The buffer holds `capacity` trades per symbol; a window that would need
+more only covers the newest `capacity` trades, see WindowStats.truncated.
+"""
+import json
+import threading
+from collections import namedtuple
+
+from pyspikex.candles import interval_ms
+from pyspikex.ring import RingBuffer
+from pyspikex.websocket.decoders import StreamDecoder, TradeEvent
+
+WindowStats = namedtuple('WindowStats', 'symbol window count volume amount vwap buy_volume sell_volume imbalance '
+                                        'truncated')
+
+COLUMNS = (('time', 'q'), ('price', 'd'), ('qty', 'd'), ('buy', 'b'))
+
+
+class _Window:
+    __slots__ = ('length', 'tail', 'count', 'volume', 'amount', 'buy_volume', 'truncated')
+
+    def __init__(self, length):
+        self.length = length
+        self.tail = 0  # sequence number of the oldest trade in the window
+        self.count = 0
+        self.volume = self.amount = self.buy_volume = 0.0
+        self.truncated = False
+
+    def add(self, price, qty, buy):
+        self.count += 1
+        self.volume += qty
+        self.amount += price * qty
+        if buy:
+            self.buy_volume += qty
+
+    def remove(self, price, qty, buy):
+        self.tail += 1
+        self.count -= 1
+        if not self.count:
+            # reset instead of subtracting, so rounding errors do not pile up
+            self.volume = self.amount = self.buy_volume = 0.0
+            return
+        self.volume -= qty
+        self.amount -= price * qty
+        if buy:
+            self.buy_volume -= qty
+
+
+class _Symbol:
+    __slots__ = ('ring', 'seq', 'windows')
+
+    def __init__(self, capacity, windows):
+        self.ring = RingBuffer(capacity, COLUMNS)
+        self.seq = 0  # trades appended so far
+        self.windows = {name: _Window(length) for name, length in windows.items()}
+
+    def evict(self, until):
+        """Drop trades older than until - window from every window"""
+        ring = self.ring
+        for window in self.windows.values():
+            start = until - window.length
+            while window.count and ring.get('time', window.tail - self.seq) <= start:
+                i = window.tail - self.seq
+                window.remove(ring.get('price', i), ring.get('qty', i), ring.get('buy', i))
+                window.truncated = False
+
+
+class TradeStats:
+    """
+    :param windows: Window lengths as interval strings, e.g. ['1s', '1m', '5m']
+    :param capacity: Trades kept per symbol, bounds the longest window
+    :param clock: Callable returning the current time in milliseconds (e.g. ClockSync.time_ms) to end the
+                  windows at, default the newest trade time
+    """
+
+    def __init__(self, windows, capacity: int = 65536, clock=None):
+        self.windows = {window: interval_ms(window) for window in windows}
+        self.capacity = capacity
+        self.clock = clock
+        self.decoder = StreamDecoder()
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def handle(self, message):
+        """
+        Feed a trade stream message (raw frame, parsed dict or TradeEvent)
+        :return: True if it was a trade
+        """
+        if isinstance(message, TradeEvent):
+            event = message
+        else:
+            if isinstance(message, (str, bytes, bytearray)):
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    return False
+            if not isinstance(message, dict) or message.get('topic') != 'trade':
+                return False
+            event = self.decoder.decode_data('trade', message.get('event'), message.get('data'))
+            if not isinstance(event, TradeEvent):
+                return False
+        self.on_trade(event.symbol, event.time, float(event.price), float(event.qty), event.buyer_maker)
+        return True
+
+    def on_trade(self, symbol, time_ms, price, qty, buyer_maker):
+        """:param buyer_maker: True if the taker sold, the trade counts as sell volume"""
+        buy = not buyer_maker
+        with self._lock:
+            state = self._symbols.get(symbol)
+            if state is None:
+                state = self._symbols[symbol] = _Symbol(self.capacity, self.windows)
+            ring = state.ring
+            if ring.full:
+                # the oldest trade is about to be overwritten, take it out of the windows still holding it
+                oldest = state.seq - ring.capacity
+                for window in state.windows.values():
+                    if window.count and window.tail == oldest:
+                        window.remove(ring.get('price', 0), ring.get('qty', 0), ring.get('buy', 0))
+                        window.truncated = True
+            ring.append(time_ms, price, qty, buy)
+            state.seq += 1
+            for window in state.windows.values():
+                if not window.count:
+                    window.tail = state.seq - 1
+                    window.truncated = False
+                window.add(price, qty, buy)
+            state.evict(time_ms)
+
+    def _end(self, state):
+        return self.clock() if self.clock is not None else state.ring.get('time')
+
+    def stats(self, symbol, window) -> WindowStats:
+        """Statistics of one window, None before the first trade of symbol"""
+        with self._lock:
+            state = self._symbols.get(symbol)
+            if state is None:
+                return None
+            state.evict(self._end(state))
+            w = state.windows[window]
+            sell = max(w.volume - w.buy_volume, 0.0)
+            return WindowStats(symbol, window, w.count, w.volume, w.amount, w.amount / w.volume if w.volume else None,
+                               w.buy_volume, sell, (w.buy_volume - sell) / w.volume if w.volume else 0.0,
+                               w.truncated)
+
+    def snapshot(self, window) -> dict:
+        """{symbol: WindowStats} of every symbol seen"""
+        return {symbol: self.stats(symbol, window) for symbol in list(self._symbols)}
+
+    def symbols(self):
+        return list(self._symbols)
+
+    def column(self, symbol, name, window=None):
+        """Values of time, price, qty or buy of the trades in window (all kept trades if None), oldest first"""
+        with self._lock:
+            state, n = self._span(symbol, window)
+            return state.ring.column(name, n) if state is not None else None
+
+    def numpy(self, symbol, name, window=None):
+        """column() as an ndarray, a view of the buffer when it does not wrap; requires NumPy"""
+        with self._lock:
+            state, n = self._span(symbol, window)
+            return state.ring.numpy(name, n) if state is not None else None
+
+    def _span(self, symbol, window):
+        state = self._symbols.get(symbol)
+        if state is None:
+            return None, 0
+        if window is None:
+            return state, len(state.ring)
+        state.evict(self._end(state))
+        return state, state.windows[window].count
@@ -0,0 +1,163 @@
+# -*- coding:utf-8 -*-
+"""
+Local pre-trade validation compiled from symbol filters.
+
+Symbol filters are compiled once into integer rules (prices and quantities
+counted in units of 10^-precision), so checking an order is a handful of
+integer comparisons and never touches float or Decimal arithmetic:
+
+    validator = OrderValidator.from_spot_config(spot.get_symbol_config())
+    spot = Spot(host, access_key=ak, secret_key=sk, validator=validator)
+    spot.order('btc_usdt', 'BUY', 'LIMIT', price='30000.005', quantity='0.001')  # raises SpikexValidationError ORDER_F0103
+
+Violations raise SpikexValidationError with the message code the server
+would have returned (ORDER_F0101 ... ORDER_F0301).
+"""
+from decimal import Decimal
+
+from pyspikex.fixed import from_units, to_units
+from pyspikex.spot import SpikexValidationError
+
+
+class SymbolRules:
+    """
+    Integer rules of one symbol, all bounds in units of 10^-price_decimals / 10^-qty_decimals
+    (notional in units of 10^-(price_decimals + qty_decimals)). None disables a bound.
+    """
+    __slots__ = ('symbol', 'price_decimals', 'qty_decimals', 'price_min', 'price_max', 'price_tick',
+                 'qty_min', 'qty_max', 'qty_tick', 'notional_min', 'multiplier')
+
+    def __init__(self, symbol, price_decimals, qty_decimals, price_min=None, price_max=None, price_tick=None,
+                 qty_min=None, qty_max=None, qty_tick=None, notional_min=None, multiplier=1):
+        """
+        Bounds are given as exchange values (strings or numbers) and compiled to integers
+        :param multiplier: Contract size (perp), notional = price * quantity * multiplier
+        """
+        self.symbol = symbol
+        self.price_decimals = price_decimals
+        self.qty_decimals = qty_decimals
+        self.price_min = self._units(price_min, price_decimals)
+        self.price_max = self._units(price_max, price_decimals)
+        self.price_tick = self._units(price_tick, price_decimals) or 1
+        self.qty_min = self._units(qty_min, qty_decimals)
+        self.qty_max = self._units(qty_max, qty_decimals)
+        self.qty_tick = self._units(qty_tick, qty_decimals) or 1
+        self.multiplier = Decimal(str(multiplier or 1))
+        notional = None if notional_min in (None, '') else Decimal(str(notional_min)) / self.multiplier
+        self.notional_min = None if notional is None else to_units(notional, price_decimals + qty_decimals)[0]
+
+    @staticmethod
+    def _units(value, decimals):
+        if value in (None, ''):
+            return None
+        return to_units(value, decimals)[0]
+
+
+class OrderValidator:
+    """
+    Per-symbol order checks against price, quantity and notional filters
+    :param rules: {symbol: SymbolRules}
+    """
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+
+    @classmethod
+    def from_spot_config(cls, symbols: list):
+        """
+        :param symbols: Spot.get_symbol_config() result
+        """
+        rules = {}
+        for item in symbols:
+            filters = {f.get('filter'): f for f in item.get('filters') or []}
+            price = filters.get('PRICE', {})
+            qty = filters.get('QUANTITY', {})
+            rules[item['symbol'].lower()] = SymbolRules(
+                item['symbol'].lower(), int(item['pricePrecision']), int(item['quantityPrecision']),
+                price_min=price.get('min'), price_max=price.get('max'), price_tick=price.get('tickSize'),
+                qty_min=qty.get('min'), qty_max=qty.get('max'), qty_tick=qty.get('tickSize'),
+                notional_min=filters.get('QUOTE_QTY', {}).get('min'))
+        return cls(rules)
+
+    @classmethod
+    def from_perp_config(cls, symbols: list):
+        """
+        :param symbols: result list of Perp.get_symbol_list() (or Perp.get_market_config() results)
+        """
+        rules = {}
+        for item in symbols:
+            rules[item['symbol'].lower()] = SymbolRules(
+                item['symbol'].lower(), int(item['pricePrecision']), int(item['quantityPrecision']),
+                price_tick=item.get('minStepPrice'), qty_min=item.get('minQty'),
+                notional_min=item.get('minNotional'), multiplier=item.get('contractSize') or 1)
+        return cls(rules)
+
+    def check(self, order: dict, round: bool = False) -> dict:
+        """
+        Validate one order in Spot (price/quantity/quoteQty/side/type) or Perp
+        (price/origQty/orderSide/orderType) request format
+        :param order: Request params, must contain symbol
+        :param round: Round price to the tick (BUY down, SELL up) and quantity down to the lot instead
+                      of rejecting off-grid values; bounds are still enforced
+        :return: order, with rounded price/quantity strings written back when round is True
+        :raises SpikexValidationError: ORDER_F0101..ORDER_F0301
+        """
+        symbol = order['symbol'].lower()
+        rule = self.rules.get(symbol)
+        if rule is None:
+            return order
+        side = order.get('side') or order.get('orderSide')
+        qty_key = 'origQty' if 'origQty' in order else 'quantity'
+        price = order.get('price')
+        qty = order.get(qty_key)
+        p = q = None
+        if price is not None:
+            p, exact = to_units(price, rule.price_decimals)
+            off_tick = not exact or p % rule.price_tick
+            if off_tick and round:
+                p -= p % rule.price_tick
+                if side == 'SELL':
+                    p += rule.price_tick
+                order['price'] = from_units(p, rule.price_decimals)
+            elif off_tick:
+                raise SpikexValidationError('ORDER_F0103', f'{symbol} price {price} is not a multiple of the tick')
+            if rule.price_min is not None and p < rule.price_min:
+                raise SpikexValidationError('ORDER_F0101', f'{symbol} price {price} below minimum')
+            if rule.price_max is not None and p > rule.price_max:
+                raise SpikexValidationError('ORDER_F0102', f'{symbol} price {price} above maximum')
+        if qty is not None:
+            q, exact = to_units(qty, rule.qty_decimals)
+            off_lot = not exact or q % rule.qty_tick
+            if off_lot and round:
+                q -= q % rule.qty_tick
+                order[qty_key] = from_units(q, rule.qty_decimals)
+            elif off_lot:
+                raise SpikexValidationError('ORDER_F0203', f'{symbol} quantity {qty} is not a multiple of the lot')
+            if rule.qty_min is not None and q < rule.qty_min:
+                raise SpikexValidationError('ORDER_F0201', f'{symbol} quantity {qty} below minimum')
+            if rule.qty_max is not None and q > rule.qty_max:
+                raise SpikexValidationError('ORDER_F0202', f'{symbol} quantity {qty} above maximum')
+        if rule.notional_min is not None:
+            quote = order.get('quoteQty')
+            if quote is not None:
+                notional = to_units(quote, rule.price_decimals + rule.qty_decimals)[0]
+            elif p is not None and q is not None:
+                notional = p * q
+            else:
+                notional = None
+            if notional is not None and notional < rule.notional_min:
+                raise SpikexValidationError('ORDER_F0301', f'{symbol} order amount below minimum')
+        return order
+
+    def check_batch(self, orders: list, round: bool = False) -> list:
+        """
+        Validate a batch without stopping at the first failure
+        :return: [(index, SpikexValidationError)] for rejected orders, empty if all pass
+        """
+        errors = []
+        for index, order in enumerate(orders):
+            try:
+                self.check(order, round)
+            except SpikexValidationError as e:
+                errors.append((index, e))
+        return errors
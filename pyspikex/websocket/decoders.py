@@ -0,0 +1,132 @@
+# -*- coding:utf-8 -*-
+"""
+Typed decoding of market data stream messages.
+
+Stream messages look like {"topic": "trade", "event": "trade@btc_usdt", "data": {...}}.
+StreamDecoder turns the data of the market topics into small named tuples whose
+prices and quantities are pyspikex.fixed.Fixed, covering both the spot field
+names (q for quantity, fi/i for depth update ids) and the perpetual ones
+(a for quantity, fu/u, m for trade side):
+
+    decoder = StreamDecoder()
+
+    def message_handler(_, message):
+        event = decoder.decode(message)
+        if isinstance(event, TradeEvent):
+            ...
+
+Topics without a typed record (user streams, agg_tickers, ...) are returned as
+RawEvent with the parsed data untouched; non-JSON frames (pong) return None.
+"""
+import json
+from collections import namedtuple
+
+from pyspikex.fixed import Fixed
+
+RawEvent = namedtuple('RawEvent', 'topic event data')
+TradeEvent = namedtuple('TradeEvent', 'symbol trade_id time price qty buyer_maker')
+DepthEvent = namedtuple('DepthEvent', 'symbol update_id time bids asks')
+DepthUpdateEvent = namedtuple('DepthUpdateEvent', 'symbol first_id last_id time bids asks')
+KlineEvent = namedtuple('KlineEvent', 'symbol interval time open high low close qty amount')
+TickerEvent = namedtuple('TickerEvent', 'symbol time open high low close qty amount')
+PriceEvent = namedtuple('PriceEvent', 'topic symbol time price')
+
+
+class StreamDecoder:
+    """
+    :param precisions: {symbol: (price_decimals, qty_decimals)} to parse values at the symbol's scale,
+                       symbols not listed keep the digits sent by the server
+    """
+
+    def __init__(self, precisions: dict = None):
+        self.precisions = precisions or {}
+        self._handlers = {
+            'trade': self.trade,
+            'depth': self.depth,
+            'depth_update': self.depth_update,
+            'kline': self.kline,
+            'ticker': self.ticker,
+            'tickers': self.tickers,
+            'mark_price': self.price,
+            'index_price': self.price,
+        }
+
+    def decode(self, message):
+        """
+        :param message: Raw text or bytes frame from on_message
+        :return: Typed event, list of TickerEvent for the tickers topic, RawEvent for other topics,
+                 None for frames that are not JSON objects
+        """
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            return None
+        if not isinstance(msg, dict) or 'data' not in msg:
+            return None
+        return self.decode_data(msg.get('topic'), msg.get('event'), msg['data'])
+
+    def decode_data(self, topic, event, data):
+        handler = self._handlers.get(topic)
+        # user streams reuse topic names (trade) with different payloads, they carry no 's' field
+        if handler is None or (isinstance(data, dict) and 's' not in data and topic != 'tickers'):
+            return RawEvent(topic, event, data)
+        if topic in ('mark_price', 'index_price'):
+            return handler(data, topic)
+        return handler(data)
+
+    def _scales(self, symbol):
+        return self.precisions.get(symbol, (None, None))
+
+    def _levels(self, levels, price_scale, qty_scale):
+        parse = Fixed.parse
+        return [(parse(p, price_scale), parse(q, qty_scale)) for p, q in levels or ()]
+
+    def trade(self, data):
+        symbol = data['s']
+        ps, qs = self._scales(symbol)
+        if 'q' in data:
+            qty, buyer_maker = data['q'], data.get('b')
+        else:
+            # perpetual: m is the taker side, a taker SELL (ASK) means the buyer was the maker
+            qty, buyer_maker = data['a'], data.get('m') == 'ASK'
+        return TradeEvent(symbol, data.get('i'), data.get('t'), Fixed.parse(data['p'], ps), Fixed.parse(qty, qs),
+                          buyer_maker)
+
+    def depth(self, data):
+        symbol = data['s']
+        ps, qs = self._scales(symbol)
+        return DepthEvent(symbol, data.get('i', data.get('id')), data.get('t'),
+                          self._levels(data.get('b'), ps, qs), self._levels(data.get('a'), ps, qs))
+
+    def depth_update(self, data):
+        symbol = data['s']
+        ps, qs = self._scales(symbol)
+        if 'fi' in data:
+            first_id, last_id = data['fi'], data['i']
+        else:
+            first_id, last_id = data.get('fu'), data.get('u')
+        return DepthUpdateEvent(symbol, first_id, last_id, data.get('t'),
+                                self._levels(data.get('b'), ps, qs), self._levels(data.get('a'), ps, qs))
+
+    def kline(self, data):
+        symbol = data['s']
+        ps, qs = self._scales(symbol)
+        parse = Fixed.parse
+        qty = data['q'] if 'q' in data else data.get('a')
+        return KlineEvent(symbol, data.get('i'), data.get('t'), parse(data['o'], ps), parse(data['h'], ps),
+                          parse(data['l'], ps), parse(data['c'], ps), parse(qty, qs), parse(data['v']))
+
+    def ticker(self, data):
+        symbol = data['s']
+        ps, qs = self._scales(symbol)
+        parse = Fixed.parse
+        qty = data['q'] if 'q' in data else data.get('a')
+        return TickerEvent(symbol, data.get('t'), parse(data['o'], ps), parse(data['h'], ps), parse(data['l'], ps),
+                           parse(data['c'], ps), parse(qty, qs), parse(data['v']))
+
+    def tickers(self, data):
+        return [self.ticker(item) for item in data]
+
+    def price(self, data, topic):
+        symbol = data['s']
+        return PriceEvent(topic, symbol, data.get('t'), Fixed.parse(data['p'], self._scales(symbol)[0]))
@@ -0,0 +1,161 @@
+# -*- coding:utf-8 -*-
+"""
+Listen key lifecycle for the private user streams.
+
+ListenKeyManager fetches the key (Spot.listen_key / Perp.get_listen_key),
+renews it in the background before it expires and moves every bound stream to
+the new key on the same connection: the streams are subscribed with the new key
+first and, for the perpetual streams whose names contain the key, only then
+unsubscribed from the old one, so no message is missed (a few may arrive twice,
+the pyspikex.state trackers ignore duplicates):
+
+    keys = ListenKeyManager(perp=perp)
+    ws = PerpWebsocketStreamClient(on_message=on_message, is_auth=True)
+    keys.bind(ws, 'user_order', 'user_trade', 'user_balance', 'user_position')
+    keys.start()
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger('spikex')
+
+
+class ListenKeyManager:
+    """
+    :param spot: pyspikex.spot.Spot issuing the key
+    :param perp: pyspikex.perp.Perp issuing the key, instead of spot
+    :param ttl: Seconds a key stays valid
+    :param renew_ahead: Fraction of ttl after which the key is renewed
+    :param retry_interval: Seconds between attempts when renewing fails, doubled up to ttl / 10
+    :param on_rotate: Callback(old_key, new_key) after the streams moved to a new key
+    """
+
+    def __init__(self, spot=None, perp=None, ttl: float = 8 * 3600, renew_ahead: float = 0.8,
+                 retry_interval: float = 30, on_rotate=None):
+        if (spot is None) == (perp is None):
+            raise ValueError('pass exactly one of spot or perp')
+        self.spot = spot
+        self.perp = perp
+        self.ttl = ttl
+        self.renew_ahead = renew_ahead
+        self.retry_interval = retry_interval
+        self.on_rotate = on_rotate
+        self._lock = threading.RLock()
+        self._key = None
+        self._issued = 0.0
+        self._bindings = []  # (client, stream method name)
+        self._stop = threading.Event()
+        self._thread = None
+        self.rotations = 0
+
+    @property
+    def key(self):
+        """Current listen key, fetched on first use"""
+        return self._ensure()
+
+    def _ensure(self):
+        with self._lock:
+            if self._key is None:
+                self._key = self._fetch()
+                self._issued = time.monotonic()
+            return self._key
+
+    @property
+    def expires_in(self):
+        """Seconds until the current key expires, None before a key was fetched"""
+        if self._key is None:
+            return None
+        return self._issued + self.ttl - time.monotonic()
+
+    def _fetch(self):
+        if self.spot is not None:
+            result = self.spot.listen_key()
+            key = result.get('accessToken') if isinstance(result, dict) else result
+        else:
+            code, success, error = self.perp.get_listen_key()
+            if error is not None or not isinstance(success, dict):
+                raise RuntimeError(f'get listen key failed, code:{code} error:{error}')
+            key = success.get('result')
+        if not key:
+            raise RuntimeError('no listen key in response')
+        return key
+
+    def bind(self, client, *streams):
+        """
+        Subscribe user streams of a websocket client with the current key and keep them on it
+        :param client: SpotWebsocketStreamClient or PerpWebsocketStreamClient
+        :param streams: Stream method names, e.g. 'user_order', 'user_trade', 'user_balance', 'user_position'
+        """
+        with self._lock:
+            key = self.key
+            for stream in streams:
+                getattr(client, stream)(key)
+                self._bindings.append((client, stream))
+        return self
+
+    def unbind(self, client):
+        """Unsubscribe and forget every stream of client"""
+        with self._lock:
+            for bound, stream in [b for b in self._bindings if b[0] is client]:
+                self._call(bound, stream, self._key, 'unsubscribe')
+            self._bindings = [b for b in self._bindings if b[0] is not client]
+
+    def rotate(self):
+        """Fetch a new key and move every bound stream to it, returns the new key"""
+        new_key = self._fetch()
+        with self._lock:
+            old_key = self._key
+            bindings = list(self._bindings)
+            for client, stream in bindings:
+                self._call(client, stream, new_key)
+            # perpetual stream names embed the key (order@{key}); spot names do not, unsubscribing the old
+            # key there would drop the stream just re-subscribed
+            if self.perp is not None and old_key is not None and old_key != new_key:
+                for client, stream in bindings:
+                    self._call(client, stream, old_key, 'unsubscribe')
+            self._key = new_key
+            self._issued = time.monotonic()
+            self.rotations += 1
+        logger.info('listen key rotated, %d streams moved', len(bindings))
+        if self.on_rotate is not None:
+            try:
+                self.on_rotate(old_key, new_key)
+            except Exception:
+                logger.exception('listen key on_rotate failed')
+        return new_key
+
+    @staticmethod
+    def _call(client, stream, key, action=None):
+        try:
+            getattr(client, stream)(key, action=action)
+        except Exception as e:
+            logger.error('%s %s on new listen key failed: %s', action or 'subscribe', stream, e)
+
+    def start(self):
+        """Renew the key in a daemon thread before it expires"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._ensure()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='spikex-listen-key', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        retry = self.retry_interval
+        while True:
+            wait = max(self._issued + self.ttl * self.renew_ahead - time.monotonic(), 0)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.rotate()
+                retry = self.retry_interval
+            except Exception as e:
+                logger.error('listen key renewal failed, retrying in %ss: %s', retry, e)
+                if self._stop.wait(retry):
+                    return
+                retry = min(retry * 2, max(self.ttl / 10, self.retry_interval))
@@ -16,6 +16,7 @@ class PerpWebsocketStreamClient(SpikexWebsocketClient):
             is_auth=False,
             timeout=None,
             proxies: Optional[dict] = None,
+            pipeline=None,
     ):
         if not is_auth:
             stream_url = stream_url + "/ws/market"
@@ -31,6 +32,7 @@ class PerpWebsocketStreamClient(SpikexWebsocketClient):
             on_pong=on_pong,
             timeout=timeout,
             proxies=proxies,
+            pipeline=pipeline,
         )
 
     def trade(self, symbol: str, id=None, action=None, **kwargs):
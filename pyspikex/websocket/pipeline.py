@@ -0,0 +1,293 @@
+# -*- coding:utf-8 -*-
+"""
+Websocket frame decoding on several cores.
+
+With hundreds of depth_update streams the JSON decoding in the socket
+manager's reader thread saturates one core. DecodePipeline moves it to worker
+processes: the reader thread only copies the raw frame bytes into a
+shared-memory ring of the worker that owns the frame's symbol, the workers
+decode with StreamDecoder and send the typed events back in batches, and one
+collector thread calls on_event with them:
+
+    pipeline = DecodePipeline(on_event=handle_event, workers=4).start()
+    ws = SpotWebsocketStreamClient(pipeline=pipeline)
+    for symbol in symbols:
+        ws.incremental_depth(symbol)
+    ...
+    ws.stop()
+    pipeline.stop()
+
+All frames of a symbol go to the same worker and come back through the same
+ring, so events of one symbol reach on_event in the order they were received;
+events of different symbols may interleave differently than on the wire.
+Frames that are not JSON objects (e.g. pong) are dropped, frames that fail to
+decode are logged and dropped. Start the pipeline from the main module under
+`if __name__ == '__main__':`, workers are spawned.
+
+Rebuilding the events a worker pickled, with all their Fixed values, happens
+on the one collector thread and is not much cheaper than decoding the JSON:
+for 50-level depth snapshots it delivers only 1.2-1.6x the events per second of
+decoding inline, most of the cost going to allocating and garbage collecting
+the new objects. That ratio caps the speed-up whatever the number of workers;
+measure it on the target machine with
+`python benchmarks/run_benchmarks.py --only pipeline`.
+"""
+import logging
+import multiprocessing
+import pickle
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+from pyspikex.snapshot import _attach
+
+logger = logging.getLogger('spikex')
+
+_HEADER_SIZE = 64
+_LEN = struct.Struct('<I')
+_SKIP = 0xFFFFFFFF  # rest of the ring is unused, continue at its start
+
+
+class SharedRing:
+    """
+    Single-producer single-consumer byte ring in shared memory.
+    The header holds head (bytes written), tail (bytes read) and the data size; head and tail only grow.
+    Records are a u32 length and the bytes, never split across the end of the ring
+    :param name: Block name, None for a new block
+    :param size: Data bytes of a new block
+    """
+
+    def __init__(self, name=None, size: int = 1 << 22):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + size)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        # head, tail and size as 8-byte words, so each is loaded and stored whole while the other side reads it
+        self.pos = self.buf[:24].cast('Q')
+        if self.owner:
+            self.pos[0] = self.pos[1] = 0
+            self.pos[2] = size
+        self.size = self.pos[2]
+
+    def put(self, data) -> bool:
+        """Append a record, False if the ring has no room for it now"""
+        n = len(data)
+        need = _LEN.size + n
+        if need > self.size:
+            raise ValueError(f'record of {n} bytes does not fit a ring of {self.size}')
+        buf = self.buf
+        head, tail = self.pos[0], self.pos[1]
+        pos = head % self.size
+        room = self.size - pos
+        skip = room if room < need else 0
+        if self.size - (head - tail) < need + skip:
+            return False
+        if skip:
+            if room >= _LEN.size:
+                _LEN.pack_into(buf, _HEADER_SIZE + pos, _SKIP)
+            head += skip
+            pos = 0
+        start = _HEADER_SIZE + pos
+        _LEN.pack_into(buf, start, n)
+        buf[start + _LEN.size:start + need] = data
+        # publish after the record is written
+        self.pos[0] = head + need
+        return True
+
+    def get(self):
+        """Oldest record as bytes, None if the ring is empty"""
+        buf = self.buf
+        tail = self.pos[1]
+        while tail != self.pos[0]:
+            pos = tail % self.size
+            room = self.size - pos
+            if room < _LEN.size or _LEN.unpack_from(buf, _HEADER_SIZE + pos)[0] == _SKIP:
+                tail += room
+                continue
+            start = _HEADER_SIZE + pos
+            n = _LEN.unpack_from(buf, start)[0]
+            data = bytes(buf[start + _LEN.size:start + _LEN.size + n])
+            self.pos[1] = tail + _LEN.size + n
+            return data
+        self.pos[1] = tail
+        return None
+
+    def close(self):
+        self.pos.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _idle(idle):
+    """Back off from spinning to sleeping up to 1ms while a ring stays empty"""
+    if idle < 64:
+        return
+    time.sleep(min(0.00005 * (idle - 63), 0.001))
+
+
+def _decode_worker(in_name, out_name, precisions, stop, batch_size):
+    from pyspikex.websocket.decoders import StreamDecoder
+
+    decoder = StreamDecoder(precisions)
+    frames = SharedRing(in_name)
+    events = SharedRing(out_name)
+    idle = 0
+    try:
+        while True:
+            batch = []
+            while len(batch) < batch_size:
+                frame = frames.get()
+                if frame is None:
+                    break
+                try:
+                    event = decoder.decode(frame)
+                    if event is not None:
+                        batch.append(event)
+                except Exception:
+                    logger.exception('decode worker dropped frame %.200r', frame)
+            if batch:
+                idle = 0
+                data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+                while not events.put(data):
+                    if stop.is_set():
+                        return
+                    time.sleep(0.0001)
+                continue
+            if stop.is_set():
+                return
+            idle += 1
+            _idle(idle)
+    finally:
+        frames.close()
+        events.close()
+
+
+def _symbol_key(frame):
+    """Symbol part of the frame's event field (depth_update@btc_usdt, kline@btc_usdt,1m), b'' if none"""
+    i = frame.find(b'"event":"')
+    if i < 0:
+        return b''
+    i += 9
+    j = frame.find(b'"', i)
+    event = frame[i:j]
+    at = event.find(b'@')
+    if at < 0:
+        return event
+    return event[at + 1:].split(b',', 1)[0]
+
+
+class DecodePipeline:
+    """
+    :param on_event: Callback(event) with the decoded events (TradeEvent, DepthUpdateEvent, ..., RawEvent for other
+                     topics, a list of TickerEvent for tickers), called from the collector thread
+    :param workers: Decoder processes
+    :param ring_size: Bytes of each frame ring and each event ring
+    :param precisions: Passed to each worker's StreamDecoder
+    :param batch_size: Events a worker decodes before sending them back
+    :param context: multiprocessing start method
+    """
+
+    def __init__(self, on_event, workers: int = None, ring_size: int = 1 << 22, precisions: dict = None,
+                 batch_size: int = 256, context: str = 'spawn'):
+        self.on_event = on_event
+        self.workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+        self.ring_size = ring_size
+        self.precisions = precisions
+        self.batch_size = batch_size
+        self._context = multiprocessing.get_context(context)
+        self._frames = []
+        self._events = []
+        self._processes = []
+        self._stop = None
+        self._collector = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.delivered = 0
+
+    def start(self):
+        if self._processes:
+            return self
+        self._stop = self._context.Event()
+        for i in range(self.workers):
+            frames, events = SharedRing(size=self.ring_size), SharedRing(size=self.ring_size)
+            process = self._context.Process(target=_decode_worker, name=f'spikex-decode-{i}', daemon=True,
+                                            args=(frames.name, events.name, self.precisions, self._stop,
+                                                  self.batch_size))
+            process.start()
+            self._frames.append(frames)
+            self._events.append(events)
+            self._processes.append(process)
+        self._collector = threading.Thread(target=self._collect, name='spikex-decode-collector', daemon=True)
+        self._collector.start()
+        return self
+
+    def submit(self, frame):
+        """
+        Queue a raw frame (bytes or str), blocks while the owning worker's ring is full
+        :raises RuntimeError: if the pipeline is stopped or the owning worker died
+        """
+        if isinstance(frame, str):
+            frame = frame.encode()
+        frames, processes = self._frames, self._processes
+        if not processes:
+            raise RuntimeError('decode pipeline is stopped')
+        i = zlib.crc32(_symbol_key(frame)) % len(frames)
+        with self._lock:
+            while not frames[i].put(frame):
+                if self._stop.is_set():
+                    raise RuntimeError('decode pipeline is stopped')
+                if not processes[i].is_alive():
+                    raise RuntimeError(f'decode worker {processes[i].name} exited with code {processes[i].exitcode}')
+                time.sleep(0.0001)
+            self.submitted += 1
+
+    def _deliver(self):
+        """One batch from every worker that has one, False if all rings were empty"""
+        delivered = False
+        for ring in self._events:
+            data = ring.get()
+            if data is None:
+                continue
+            delivered = True
+            for event in pickle.loads(data):
+                self.delivered += 1
+                try:
+                    self.on_event(event)
+                except Exception:
+                    logger.exception('decode pipeline on_event failed')
+        return delivered
+
+    def _collect(self):
+        idle = 0
+        while True:
+            if self._deliver():
+                idle = 0
+                continue
+            if self._stop.is_set() and not any(p.is_alive() for p in self._processes):
+                while self._deliver():  # batches sent between the last pass and the workers exiting
+                    pass
+                return
+            idle += 1
+            _idle(idle)
+
+    def stop(self, timeout: float = 5):
+        """Decode what was submitted, deliver it and shut the workers down"""
+        if not self._processes:
+            return
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout)
+        for ring in self._frames + self._events:
+            ring.close()
+        self._processes, self._frames, self._events = [], [], []
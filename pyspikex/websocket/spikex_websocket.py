@@ -50,6 +50,7 @@ class SpikexSocketManager(threading.Thread):
             on_pong=None,
             timeout=None,
             proxies: Optional[dict] = None,
+            pipeline=None,
     ):
         threading.Thread.__init__(self)
         self.stream_url = stream_url
@@ -60,6 +61,8 @@ class SpikexSocketManager(threading.Thread):
         self.on_pong = on_pong
         self.on_error = on_error
         self.timeout = timeout
+        # pyspikex.websocket.pipeline.DecodePipeline, text frames go to its decoder processes instead of on_message
+        self.pipeline = pipeline
 
         self._proxy_params = parse_proxies(proxies) if proxies else {}
 
@@ -125,10 +128,16 @@ class SpikexSocketManager(threading.Thread):
             self._callback(self.on_pong)
 
     def _handle_data(self, op_code, frame, data):
-        if op_code == ABNF.OPCODE_TEXT:
+        if op_code == ABNF.OPCODE_TEXT and self.pipeline is not None:
+            self._callback(self._submit, frame.data)
+        elif op_code == ABNF.OPCODE_TEXT:
             data = frame.data.decode("utf-8")
             self._callback(self.on_message, data)
 
+    def _submit(self, _, data):
+        """Callback handing a frame to the pipeline, a stopped pipeline or dead worker is reported to on_error"""
+        self.pipeline.submit(data)
+
     def close(self):
         if not self.ws.connected:
             logger.warn("Websocket already closed")
@@ -161,6 +170,7 @@ class SpikexWebsocketClient:
             on_pong=None,
             timeout=None,
             proxies: Optional[dict] = None,
+            pipeline=None,
     ):
         self.socket_manager = self._initialize_socket(
             stream_url,
@@ -172,6 +182,7 @@ class SpikexWebsocketClient:
             on_pong,
             timeout,
             proxies,
+            pipeline,
         )
 
         # start the thread
@@ -189,6 +200,7 @@ class SpikexWebsocketClient:
             on_pong,
             timeout,
             proxies,
+            pipeline=None,
     ):
         return SpikexSocketManager(
             stream_url,
@@ -200,6 +212,7 @@ class SpikexWebsocketClient:
             on_pong=on_pong,
             timeout=timeout,
             proxies=proxies,
+            pipeline=pipeline,
         )
 
     def _single_stream(self, stream):
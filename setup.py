@@ -31,5 +31,8 @@ setup(
     install_requires=[
         "requests>=2.22.0",
         "websocket-client>=1.0.0"
-    ]
+    ],
+    extras_require={
+        "numpy": ["numpy>=1.20"]
+    }
 )
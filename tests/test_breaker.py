@@ -0,0 +1,130 @@
+# -*- coding:utf-8 -*-
+import time
+import unittest
+
+from pyspikex.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, endpoint_group
+from pyspikex.spot import SpikexCircuitOpenError
+
+
+class Transitions:
+
+    def __init__(self):
+        self.events = []
+
+    def on_circuit(self, group, old, new):
+        self.events.append((group, old, new))
+
+
+def _fail():
+    raise ConnectionError('down')
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    PATH = '/future/market/v1/public/q/depth'
+    GROUP = '/future/market'
+
+    def setUp(self):
+        self.transitions = Transitions()
+        self.breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10, open_for=0.05, half_open_calls=1,
+                                      instrumentation=self.transitions)
+
+    def trip(self):
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(self.PATH, _fail)
+        self.assertEqual(self.breaker.state(self.PATH), OPEN)
+
+    def test_endpoint_group(self):
+        self.assertEqual(endpoint_group(self.PATH), self.GROUP)
+        self.assertEqual(endpoint_group('/v4/public/depth?symbol=btc_usdt'), '/v4/public')
+
+    def test_opens_at_failure_rate_after_min_calls(self):
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(self.PATH, _fail)
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)  # below min_calls
+        self.breaker.call(self.PATH, lambda: 'ok')
+        self.assertEqual(self.breaker.state(self.PATH), OPEN)  # 3 of 4
+
+    def test_stays_closed_below_failure_rate(self):
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(self.PATH, _fail)
+        for _ in range(3):
+            self.breaker.call(self.PATH, lambda: 'ok')
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(self.PATH, _fail)
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)  # 2 of 5
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(self.PATH, _fail)
+        self.assertEqual(self.breaker.state(self.PATH), OPEN)  # 3 of 6
+
+    def test_open_rejects_without_calling(self):
+        self.trip()
+        calls = []
+        with self.assertRaises(SpikexCircuitOpenError):
+            self.breaker.call(self.PATH, lambda: calls.append(1))
+        self.assertEqual(calls, [])
+        self.assertEqual(self.breaker.call('/future/trade/v1/order/create', lambda: 'ok'), 'ok')
+
+    def test_half_open_probe_success_closes(self):
+        self.trip()
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.call(self.PATH, lambda: 'ok'), 'ok')
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)
+        self.assertEqual(self.transitions.events, [(self.GROUP, CLOSED, OPEN), (self.GROUP, OPEN, HALF_OPEN),
+                                                   (self.GROUP, HALF_OPEN, CLOSED)])
+
+    def test_half_open_probe_failure_reopens(self):
+        self.trip()
+        time.sleep(0.06)
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(self.PATH, _fail)
+        self.assertEqual(self.breaker.state(self.PATH), OPEN)
+        with self.assertRaises(SpikexCircuitOpenError):
+            self.breaker.call(self.PATH, lambda: 'ok')
+
+    def test_half_open_limits_probes(self):
+        self.trip()
+        time.sleep(0.06)
+
+        def nested():
+            with self.assertRaises(SpikexCircuitOpenError):
+                self.breaker.call(self.PATH, lambda: 'second probe')
+            return 'ok'
+
+        self.assertEqual(self.breaker.call(self.PATH, nested), 'ok')
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)
+
+    def test_interrupted_probe_frees_slot(self):
+        self.trip()
+        time.sleep(0.06)
+
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.breaker.call(self.PATH, interrupted)
+        self.assertEqual(self.breaker.state(self.PATH), HALF_OPEN)
+        self.assertEqual(self.breaker.call(self.PATH, lambda: 'ok'), 'ok')
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)
+
+    def test_business_errors_do_not_trip(self):
+        for _ in range(10):
+            res = self.breaker.call(self.PATH, lambda: {'rc': 1}, failed=lambda r: isinstance(r, Exception))
+        self.assertEqual(res, {'rc': 1})
+        self.assertEqual(self.breaker.state(self.PATH), CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(min_calls=2, slow_call=0.01)
+        for _ in range(2):
+            breaker.call(self.PATH, lambda: time.sleep(0.02))
+        self.assertEqual(breaker.state(self.PATH), OPEN)
+
+    def test_reset(self):
+        self.trip()
+        self.breaker.reset(self.GROUP)
+        self.assertEqual(self.breaker.states(), {self.GROUP: CLOSED})
+
+
+if __name__ == '__main__':
+    unittest.main()
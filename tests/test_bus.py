@@ -0,0 +1,73 @@
+# -*- coding:utf-8 -*-
+import os
+import socket
+import tempfile
+import time
+import unittest
+
+from pyspikex.bus import _HEAD, _LENGTH, SUBSCRIBE, BusPublisher, BusSubscriber, _frames, decode, encode
+from pyspikex.fixed import Fixed
+from pyspikex.websocket.decoders import DepthUpdateEvent, RawEvent, TradeEvent
+
+
+def _wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FramingTest(unittest.TestCase):
+
+    def roundtrip(self, event):
+        buffer = bytearray(encode(event))
+        (kind, topic, payload), = _frames(buffer)
+        self.assertEqual(buffer, b'')
+        return decode(kind, topic, payload)
+
+    def test_roundtrip(self):
+        trade = TradeEvent('btc_usdt', 1, 1000, Fixed.parse('30000.01'), Fixed.parse('0.5'), None)
+        update = DepthUpdateEvent('btc_usdt', 1, 2, None, [(Fixed.parse('1.5'), Fixed.parse('0'))], [])
+        raw = RawEvent('balance', 'balance', {'a': 1})
+        for event in (trade, update, raw):
+            self.assertEqual(self.roundtrip(event), event)
+
+    def test_frames_rejects_bad_input(self):
+        with self.assertRaises(ValueError):
+            list(_frames(bytearray(_LENGTH.pack(3) + _HEAD.pack(SUBSCRIBE, 1) + b'\xff')))
+        with self.assertRaises(ValueError):
+            list(_frames(bytearray(_LENGTH.pack(1 << 31)), limit=257))
+
+
+class BusPublisherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+        self.bus = BusPublisher(self.path).start()
+        self.addCleanup(self.bus.close)
+
+    def test_bad_subscriber_is_dropped(self):
+        for frame in (_LENGTH.pack(3) + _HEAD.pack(SUBSCRIBE, 1) + b'\xff', _LENGTH.pack(1 << 31)):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.addCleanup(sock.close)
+            sock.connect(self.path)
+            sock.sendall(frame)
+            sock.settimeout(5)
+            self.assertEqual(sock.recv(16), b'')
+        events = []
+        subscriber = BusSubscriber(self.path, on_event=events.append, topics=['trade@'])
+        self.addCleanup(subscriber.close)
+        self.assertTrue(_wait(lambda: self.bus.subscribers() == 1))
+        trade = TradeEvent('btc_usdt', 1, 1000, Fixed.parse('1.5'), Fixed.parse('2'), True)
+        self.bus.publish(trade)
+        self.assertTrue(_wait(lambda: events == [trade]))
+
+    def test_unencodable_events_are_skipped(self):
+        for price in ('123456789012345678901234', '1e-300'):
+            self.bus.publish(TradeEvent('btc_usdt', 1, 1000, Fixed.parse(price), Fixed.parse('1'), True))
+        self.bus.publish(RawEvent('x' * 300, None, {}))
+        self.assertEqual((self.bus.skipped, self.bus.published), (3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+import json
+import unittest
+
+from pyspikex.candles import CandleBuilder, TimerWheel, interval_ms
+
+
+class CandleBuilderTest(unittest.TestCase):
+
+    def builder(self, close_delay):
+        self.closed = []
+        return CandleBuilder(['1s'], on_close=self.closed.append, clock=lambda: 0, close_delay=close_delay)
+
+    def test_late_trade_counted_within_close_delay(self):
+        builder = self.builder(250)
+        builder.on_trade('btc_usdt', 1000, 10.0, 1.0)
+        builder.on_trade('btc_usdt', 1500, 12.0, 1.0)
+        self.assertEqual(builder.advance(2100), [])  # ended 100ms ago, still open for late trades
+        builder.on_trade('btc_usdt', 1900, 9.0, 2.0)
+        closed = builder.advance(2300)
+        self.assertEqual(len(closed), 1)
+        candle = closed[0]
+        self.assertEqual((candle.time, candle.open, candle.high, candle.low, candle.close, candle.qty,
+                          candle.trades), (1000, 10.0, 12.0, 9.0, 9.0, 4.0, 3))
+        self.assertEqual(self.closed, closed)
+        self.assertEqual(builder.late, 0)
+
+    def test_trade_after_close_is_dropped(self):
+        builder = self.builder(250)
+        builder.on_trade('btc_usdt', 1000, 10.0, 1.0)
+        builder.advance(2300)
+        builder.on_trade('btc_usdt', 1950, 11.0, 1.0)
+        self.assertEqual(builder.late, 1)
+        self.assertEqual(builder.candles('btc_usdt', '1s')[-1].trades, 1)
+        current = builder.current('btc_usdt', '1s')
+        self.assertEqual((current.time, current.open, current.trades), (2000, 10.0, 0))
+
+    def test_no_close_delay_closes_at_bar_end(self):
+        builder = self.builder(0)
+        builder.on_trade('btc_usdt', 1000, 10.0, 1.0)
+        self.assertEqual(len(builder.advance(2000)), 1)
+        builder.on_trade('btc_usdt', 1900, 9.0, 2.0)
+        self.assertEqual(builder.late, 1)
+        self.assertEqual(builder.candles('btc_usdt', '1s')[0].low, 10.0)
+
+    def test_next_bar_trade_closes_at_once(self):
+        builder = self.builder(250)
+        builder.on_trade('btc_usdt', 1000, 10.0, 1.0)
+        builder.on_trade('btc_usdt', 2010, 11.0, 1.0)
+        self.assertEqual([c.time for c in self.closed], [1000])
+        self.assertEqual(builder.advance(2300), [])  # already rolled, the new bar ends at 3000
+        current = builder.current('btc_usdt', '1s')
+        self.assertEqual((current.time, current.open, current.trades), (2000, 11.0, 1))
+
+    def test_quiet_bars_close_flat(self):
+        builder = self.builder(250)
+        builder.on_trade('btc_usdt', 1000, 10.0, 1.0)
+        builder.advance(4300)
+        self.assertEqual([(c.time, c.open, c.close, c.trades) for c in builder.candles('btc_usdt', '1s')],
+                         [(1000, 10.0, 10.0, 1), (2000, 10.0, 10.0, 0), (3000, 10.0, 10.0, 0)])
+
+    def test_weekly_bars_start_on_monday(self):
+        builder = CandleBuilder(['1w', '1d'], clock=lambda: 0)
+        wednesday = 1696982400000 + 3600000  # 2023-10-11 01:00 UTC
+        builder.on_trade('btc_usdt', wednesday, 10.0, 1.0)
+        self.assertEqual(builder.current('btc_usdt', '1w').time, 1696809600000)  # Monday 2023-10-09
+        self.assertEqual(builder.current('btc_usdt', '1d').time, 1696982400000)
+        builder.advance(1696809600000 + 3 * interval_ms('1w') + 1000)
+        self.assertEqual([c.time for c in builder.candles('btc_usdt', '1w')],
+                         [1696809600000 + i * interval_ms('1w') for i in range(3)])
+
+    def test_handle_trade_frame(self):
+        builder = self.builder(250)
+        frame = json.dumps({'topic': 'trade', 'event': 'trade@btc_usdt',
+                            'data': {'s': 'btc_usdt', 'i': 1, 't': 1000, 'p': '10', 'q': '2', 'b': True}})
+        self.assertTrue(builder.handle(frame))
+        self.assertFalse(builder.handle('pong'))
+        self.assertEqual(builder.current('btc_usdt', '1s').qty, 2.0)
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_due_in_deadline_order(self):
+        wheel = TimerWheel(tick_ms=100, slots=8)
+        wheel.schedule(1250, 'b')
+        wheel.schedule(1210, 'a')
+        wheel.schedule(5000, 'c')  # more than one turn ahead
+        self.assertEqual(wheel.advance(1200), [])
+        self.assertEqual(wheel.advance(1300), ['a', 'b'])
+        self.assertEqual(wheel.advance(4999), [])
+        self.assertEqual(wheel.advance(5000), ['c'])
+
+    def test_interval_ms(self):
+        self.assertEqual(interval_ms('15m'), 900000)
+        with self.assertRaises(ValueError):
+            interval_ms('1M')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+import pickle
+import unittest
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP
+
+from pyspikex.fixed import Fixed, encode, from_units, to_units
+
+
+class FixedArithmeticTest(unittest.TestCase):
+
+    def test_parse(self):
+        price = Fixed.parse('30000.01')
+        self.assertEqual((price.units, price.scale), (3000001, 2))
+        self.assertEqual(str(Fixed.parse('-0.50')), '-0.50')
+        self.assertEqual(str(Fixed.parse(0.1)), '0.1')
+        self.assertEqual(str(Fixed.parse(Decimal('1E+2'))), '100')
+        self.assertEqual(str(Fixed.parse('1.5e-3')), '0.0015')
+        self.assertEqual(str(Fixed.parse(7, 2)), '7.00')
+
+    def test_parse_rounding(self):
+        self.assertEqual(str(Fixed.parse('0.125', 2)), '0.12')
+        self.assertEqual(str(Fixed.parse('0.125', 2, ROUND_HALF_UP)), '0.13')
+        self.assertEqual(str(Fixed.parse('-0.125', 2, ROUND_HALF_UP)), '-0.13')
+        self.assertEqual(str(Fixed.parse('0.121', 2, ROUND_CEILING)), '0.13')
+        self.assertEqual(str(Fixed.parse('-0.129', 2, ROUND_DOWN)), '-0.12')
+
+    def test_exact_operations(self):
+        price, qty = Fixed.parse('30000.01'), Fixed.parse('0.001')
+        self.assertEqual(str(price * qty), '30.00001')
+        self.assertEqual(str(Fixed.parse('0.1') + Fixed.parse('0.2')), '0.3')
+        self.assertEqual(str(Fixed.parse('1') - '0.01'), '0.99')
+        self.assertEqual(str(1 - Fixed.parse('0.25')), '0.75')
+        self.assertEqual(str((price * Fixed.parse('0.9')).quantize(2)), '27000.01')
+        self.assertEqual(str(Fixed.parse('1').div('3', 4)), '0.3333')
+        self.assertEqual(str(Fixed.parse('2').div('-3', 2, ROUND_HALF_EVEN)), '-0.67')
+        self.assertEqual(str(Fixed.parse('30000.07').to_tick('0.05')), '30000.05')
+        self.assertEqual(int(Fixed.parse('-2.7')), -2)
+        self.assertEqual(float(Fixed.parse('2.5')), 2.5)
+
+    def test_comparison(self):
+        self.assertEqual(Fixed.parse('1.10'), Fixed.parse('1.1'))
+        self.assertEqual(Fixed.parse('2.00'), 2)
+        self.assertEqual(Fixed.parse('0.5'), Decimal('0.50'))
+        self.assertLess(Fixed.parse('0.09'), Fixed.parse('0.1'))
+        self.assertGreaterEqual(Fixed.parse('1'), Decimal('0.999'))
+        self.assertGreater(1, Fixed.parse('0.5'))
+
+    def test_str_and_float_are_not_numbers(self):
+        self.assertNotEqual(Fixed.parse('0.5'), '0.5')
+        self.assertNotEqual(Fixed.parse('0.1'), 0.1)
+        self.assertNotEqual(Fixed.parse('1'), None)
+        for other in ('1', 1.0, None):
+            with self.assertRaises(TypeError):
+                Fixed.parse('0.5') < other
+            with self.assertRaises(TypeError):
+                other >= Fixed.parse('0.5')
+
+    def test_hash_matches_numeric_hash(self):
+        for text in ('0', '2.00', '-3', '0.5', '-0.125', '30000.01', '1e-30'):
+            fixed = Fixed.parse(text)
+            self.assertEqual(hash(fixed), hash(Decimal(text)), text)
+        self.assertEqual(hash(Fixed.parse('1.10')), hash(Fixed.parse('1.1')))
+        self.assertEqual(hash(Fixed.parse('2.0')), hash(2))
+        self.assertEqual(len({Fixed.parse('1.0'), Fixed.parse('1.00'), 1, Decimal('1')}), 1)
+        self.assertEqual(len({Fixed.parse('0.1'), 0.1, '0.1'}), 3)
+
+    def test_parse_errors(self):
+        for value in ('abc', '', '1.2.3', '1_000', 'NaN', 'inf', '-Infinity', float('nan'), float('inf'),
+                      Decimal('NaN')):
+            with self.assertRaises(ValueError, msg=repr(value)):
+                Fixed.parse(value)
+
+    def test_pickle(self):
+        price = Fixed.parse('30000.01')
+        self.assertEqual(pickle.loads(pickle.dumps(price)), price)
+
+
+class UnitsTest(unittest.TestCase):
+
+    def test_to_units(self):
+        self.assertEqual(to_units('30000.015', 2), (3000001, False))
+        self.assertEqual(to_units('30000.010', 2), (3000001, True))
+        self.assertEqual(to_units('-1.239', 2), (-123, False))
+        self.assertEqual(to_units(Fixed.parse('1.5'), 3), (1500, True))
+        self.assertEqual(to_units(5, 2), (500, True))
+        self.assertEqual(to_units(1e-7, 8), (10, True))
+
+    def test_from_units(self):
+        self.assertEqual(from_units(-5, 2), '-0.05')
+        self.assertEqual(from_units(12, 0), '12')
+
+    def test_encode(self):
+        self.assertEqual(encode({'price': Fixed.parse('1.50'), 'list': [Fixed(1, 1), 2]}),
+                         {'price': '1.50', 'list': ['0.1', 2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+# -*- coding:utf-8 -*-
+import unittest
+
+from pyspikex.order_entry import (ClientOrderIdGenerator, OrderStateUnknownError, PerpOrderEntry, SpotOrderEntry,
+                                  _OrderEntry)
+from pyspikex.spot import SpikexBusinessError, SpikexHttpError
+
+
+def _ok(result):
+    return 200, {'returnCode': 0, 'result': result}, None
+
+
+class FakePerp:
+    """Perp stand-in answering send_order from a script and paging its open orders and history"""
+
+    def __init__(self, sends, open_orders=(), history=(), history_page=2):
+        self.sends = list(sends)
+        self.open_orders = list(open_orders)
+        self.history = list(history)
+        self.history_page = history_page
+        self.sent = []
+        self.pages = []
+        self.fail_lookups = False
+
+    def send_order(self, symbol, amount, order_side, order_type, position_side, price=None, client_order_id=None,
+                   *args):
+        self.sent.append(client_order_id)
+        res = self.sends.pop(0)
+        return res(client_order_id) if callable(res) else res
+
+    def get_account_order(self, state, symbol=None, page=1, size=10):
+        self.pages.append(('open', page))
+        if self.fail_lookups:
+            return None, None, ConnectionError('lookup timed out')
+        rows = self.open_orders[(page - 1) * size:page * size]
+        return _ok({'page': page, 'ps': size, 'total': len(self.open_orders), 'items': rows})
+
+    def get_history_order(self, symbol=None, direction=None, oid=None, limit=100, start_time=None, end_time=None):
+        self.pages.append(('history', oid))
+        if self.fail_lookups:
+            return None, None, ConnectionError('lookup timed out')
+        start = 0 if oid is None else [o['orderId'] for o in self.history].index(oid) + 1
+        rows = self.history[start:start + self.history_page]
+        return _ok({'hasNext': start + self.history_page < len(self.history), 'items': rows})
+
+
+def _orders(count, prefix='other'):
+    return [{'orderId': f'{prefix}{i}', 'clientOrderId': f'{prefix}{i}', 'state': 'NEW'} for i in range(count)]
+
+
+class PerpOrderEntryTest(unittest.TestCase):
+    TIMEOUT = (None, None, ConnectionError('read timed out'))
+
+    def entry(self, client, **kwargs):
+        return PerpOrderEntry(client, ids=lambda: 'cid1', backoff=0, settle=0, **kwargs)
+
+    def test_accepted_order_is_returned(self):
+        client = FakePerp([_ok('123')])
+        self.assertEqual(self.entry(client).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG', price='1'), _ok('123'))
+        self.assertEqual(client.sent, ['cid1'])
+        self.assertEqual(client.pages, [])
+
+    def test_partially_filled_order_on_later_page_is_not_resent(self):
+        placed = {'orderId': '42', 'clientOrderId': 'cid1', 'state': 'PARTIALLY_FILLED', 'executedQty': '0.5'}
+        client = FakePerp([self.TIMEOUT], open_orders=_orders(150) + [placed])
+        code, success, error = self.entry(client).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG', price='1')
+        self.assertEqual((code, error), (200, None))
+        self.assertEqual(success['result'], placed)
+        self.assertEqual(client.sent, ['cid1'])
+        self.assertEqual(client.pages, [('open', 1), ('open', 2)])
+
+    def test_filled_order_found_in_paged_history(self):
+        filled = {'orderId': 'h5', 'clientOrderId': 'cid1', 'state': 'FILLED'}
+        client = FakePerp([(502, None, 'bad gateway')], open_orders=_orders(3), history=_orders(5, 'h') + [filled])
+        code, success, error = self.entry(client).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG', price='1')
+        self.assertEqual(success['result'], filled)
+        self.assertEqual(client.sent, ['cid1'])
+        self.assertEqual([oid for kind, oid in client.pages if kind == 'history'], [None, 'h1', 'h3'])
+
+    def test_missing_order_is_resent_with_same_id(self):
+        client = FakePerp([self.TIMEOUT, _ok('7')], open_orders=_orders(2))
+        self.assertEqual(self.entry(client).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG', price='1'), _ok('7'))
+        self.assertEqual(client.sent, ['cid1', 'cid1'])
+        self.assertEqual(client.pages.count(('open', 1)), 2)  # both scans missed it before re-sending
+
+    def test_retries_exhausted_returns_last_error(self):
+        client = FakePerp([self.TIMEOUT] * 3)
+        code, success, error = self.entry(client, retries=2).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG')
+        self.assertIsInstance(error, ConnectionError)
+        self.assertEqual(len(client.sent), 3)
+
+    def test_failed_lookup_raises_without_resending(self):
+        client = FakePerp([self.TIMEOUT, _ok('7')])
+        client.fail_lookups = True
+        with self.assertRaises(OrderStateUnknownError) as ctx:
+            self.entry(client, lookups=2).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG')
+        self.assertEqual(ctx.exception.client_order_id, 'cid1')
+        self.assertIsInstance(ctx.exception.error, ConnectionError)
+        self.assertEqual(client.sent, ['cid1'])
+        self.assertEqual(client.pages, [('open', 1), ('open', 1)])
+
+    def test_rejection_is_not_retried(self):
+        for res in ((400, None, 'bad request'), (None, None, SpikexBusinessError({'rc': 1, 'mc': 'ORDER_F0101'}))):
+            client = FakePerp([res])
+            self.assertEqual(self.entry(client).send_order('btc_usdt', 1, 'BUY', 'LIMIT', 'LONG'), res)
+            self.assertEqual(client.pages, [])
+
+
+class FakeSpot:
+
+    def __init__(self, orders, lookups):
+        self.orders = list(orders)
+        self.lookups = list(lookups)
+        self.sent = []
+
+    def order(self, symbol, side, type, biz_type, time_in_force, client_order_id, *args):
+        self.sent.append(client_order_id)
+        res = self.orders.pop(0)
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def get_order(self, order_id=None, client_order_id=None):
+        res = self.lookups.pop(0)
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+
+def _timeout():
+    return SpikexHttpError(TimeoutError('read timed out'), info='Request timeout',
+                           request={'url': '/v4/order', 'method': 'POST', 'params': None})
+
+
+class SpotOrderEntryTest(unittest.TestCase):
+
+    def entry(self, client):
+        return SpotOrderEntry(client, ids=lambda: 'cid1', backoff=0, lookups=2)
+
+    def test_found_order_is_returned(self):
+        order = {'orderId': '9', 'clientOrderId': 'cid1', 'state': 'PARTIALLY_FILLED'}
+        client = FakeSpot([_timeout()], [order])
+        self.assertEqual(self.entry(client).order('btc_usdt', 'BUY', 'LIMIT', price='1', quantity='1'), order)
+        self.assertEqual(client.sent, ['cid1'])
+
+    def test_unknown_order_is_resent(self):
+        client = FakeSpot([_timeout(), {'orderId': '9'}],
+                          [SpikexBusinessError({'rc': 1, 'mc': 'ORDER_005'})])
+        res = self.entry(client).order('btc_usdt', 'BUY', 'LIMIT', price='1', quantity='1')
+        self.assertEqual(res, {'orderId': '9', 'clientOrderId': 'cid1'})
+        self.assertEqual(client.sent, ['cid1', 'cid1'])
+
+    def test_failed_lookup_raises_original_error(self):
+        error = _timeout()
+        client = FakeSpot([error], [_timeout()] * 2)
+        with self.assertRaises(SpikexHttpError) as ctx:
+            self.entry(client).order('btc_usdt', 'BUY', 'LIMIT', price='1', quantity='1')
+        self.assertIs(ctx.exception, error)
+        self.assertEqual(client.sent, ['cid1'])
+
+
+class OrderEntryBaseTest(unittest.TestCase):
+
+    def test_subclass_without_lookup_fails_at_construction(self):
+        class Incomplete(_OrderEntry):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(FakeSpot([], []))
+
+
+class ClientOrderIdGeneratorTest(unittest.TestCase):
+
+    def test_ids_increase_and_fit(self):
+        ids = ClientOrderIdGenerator('strategy1')
+        values = [ids() for _ in range(1000)]
+        self.assertEqual(values, sorted(set(values)))
+        self.assertTrue(all(len(v) <= ClientOrderIdGenerator.MAX_LEN for v in values))
+
+    def test_invalid_prefix(self):
+        with self.assertRaises(ValueError):
+            ClientOrderIdGenerator('not-alnum')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding:utf-8 -*-
+import json
+import threading
+import unittest
+
+from pyspikex.websocket.decoders import TradeEvent
+from pyspikex.websocket.pipeline import DecodePipeline, SharedRing
+
+
+def _trade(symbol, trade_id):
+    return json.dumps({'topic': 'trade', 'event': f'trade@{symbol}',
+                       'data': {'s': symbol, 'i': trade_id, 't': 1000 + trade_id, 'p': '10', 'q': '1', 'b': True}})
+
+
+class SharedRingTest(unittest.TestCase):
+
+    def test_records_wrap_in_order(self):
+        ring = SharedRing(size=64)
+        try:
+            received = []
+            for i in range(50):
+                self.assertTrue(ring.put(bytes([i]) * (i % 20 + 1)))
+                received.append(ring.get())
+            self.assertEqual(received, [bytes([i]) * (i % 20 + 1) for i in range(50)])
+            self.assertIsNone(ring.get())
+        finally:
+            ring.close()
+
+    def test_full_ring_refuses(self):
+        ring = SharedRing(size=64)
+        try:
+            self.assertTrue(ring.put(b'x' * 28))
+            self.assertTrue(ring.put(b'y' * 28))
+            self.assertFalse(ring.put(b'z'))
+            self.assertEqual(ring.get(), b'x' * 28)
+            self.assertTrue(ring.put(b'z'))
+            with self.assertRaises(ValueError):
+                ring.put(b'w' * 64)
+        finally:
+            ring.close()
+
+
+class DecodePipelineTest(unittest.TestCase):
+
+    def test_worker_survives_bad_frame(self):
+        events = []
+        done = threading.Event()
+
+        def on_event(event):
+            events.append(event)
+            if len(events) == 4:
+                done.set()
+
+        pipeline = DecodePipeline(on_event, workers=1).start()
+        try:
+            pipeline.submit(_trade('btc_usdt', 1))
+            pipeline.submit(b'{"topic":"trade","event":"trade@btc_usdt","data":{"s":"btc_usdt","p":"abc"}}')
+            pipeline.submit(b'pong')
+            pipeline.submit(_trade('btc_usdt', 2))
+            pipeline.submit(_trade('eth_usdt', 3))
+            pipeline.submit(_trade('btc_usdt', 4))
+            self.assertTrue(done.wait(30), f'received {events}')
+        finally:
+            pipeline.stop()
+        self.assertTrue(all(isinstance(event, TradeEvent) for event in events))
+        self.assertEqual([event.time for event in events if event.symbol == 'btc_usdt'], [1001, 1002, 1004])
+        self.assertEqual(pipeline.submitted, 6)
+        self.assertEqual(pipeline.delivered, 4)
+
+    def test_submit_after_stop_raises(self):
+        pipeline = DecodePipeline(lambda event: None, workers=1).start()
+        pipeline.stop()
+        with self.assertRaises(RuntimeError):
+            pipeline.submit(_trade('btc_usdt', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
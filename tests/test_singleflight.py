@@ -0,0 +1,95 @@
+# -*- coding:utf-8 -*-
+import threading
+import time
+import unittest
+
+from pyspikex.singleflight import SingleFlight, request_key
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def run_concurrently(self, flight, key, fn, callers=8):
+        results, errors = [], []
+        start = threading.Barrier(callers)
+
+        def caller():
+            start.wait()
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_request(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'result': 42}
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results, errors = self.run_concurrently(flight, ('GET', '/depth'), fetch)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flight.shared, 7)
+
+    def test_error_is_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            raise ConnectionError('down')
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results, errors = self.run_concurrently(flight, 'key', fetch)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 8)
+        self.assertTrue(all(isinstance(e, ConnectionError) for e in errors))
+
+    def test_sequential_calls_without_ttl(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do('key', lambda: calls.append(1))
+        flight.do('key', lambda: calls.append(1))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.shared, 0)
+
+    def test_ttl_reuses_result(self):
+        flight = SingleFlight(ttl=0.1)
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+        self.assertEqual(flight.do('key', lambda: 2), 1)
+        time.sleep(0.15)
+        self.assertEqual(flight.do('key', lambda: 3), 3)
+        flight.forget('key')
+        self.assertEqual(flight.do('key', lambda: 4), 4)
+
+    def test_ttl_skips_uncacheable_and_failed_results(self):
+        flight = SingleFlight(ttl=10)
+        flight.do('key', lambda: {'rc': 1}, cacheable=lambda r: r['rc'] == 0)
+        self.assertEqual(flight.do('key', lambda: {'rc': 0}), {'rc': 0})
+        with self.assertRaises(ValueError):
+            flight.do('other', lambda: int('x'))
+        self.assertEqual(flight.do('other', lambda: 5), 5)
+
+    def test_request_key(self):
+        self.assertEqual(request_key('GET', '/a', {'b': 1, 'a': '2'}), request_key('GET', '/a', {'a': 2, 'b': '1'}))
+        self.assertEqual(request_key('GET', '/a'), ('GET', '/a'))
+        self.assertNotEqual(request_key('GET', '/a', {'a': 1}), request_key('GET', '/a', {'a': 2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
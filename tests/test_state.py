@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+import json
+import unittest
+
+from pyspikex.fixed import Fixed
+from pyspikex.state import OrderTracker, _StreamCache
+
+
+def _message(topic, data):
+    return json.dumps({'topic': topic, 'event': topic, 'data': data})
+
+
+class FakePerp:
+    """Perp stand-in paging its open orders and answering get_order_id"""
+
+    def __init__(self, open_orders, orders=None):
+        self.open_orders = open_orders
+        self.orders = orders or {}
+        self.pages = []
+        self.fetched = []
+
+    def get_account_order(self, state, symbol=None, page=1, size=10):
+        self.pages.append(page)
+        rows = self.open_orders[(page - 1) * size:page * size]
+        return 200, {'returnCode': 0, 'result': {'page': page, 'total': len(self.open_orders), 'items': rows}}, None
+
+    def get_order_id(self, order_id):
+        self.fetched.append(order_id)
+        return 200, {'returnCode': 0, 'result': self.orders[order_id]}, None
+
+
+class OrderTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.changes = []
+        self.tracker = OrderTracker(on_change=lambda order, old: self.changes.append((order.state, old)))
+
+    def test_spot_trade_dedup_by_id(self):
+        self.tracker.handle(_message('order', {'s': 'btc_usdt', 'i': 1, 'ci': 'c1', 'st': 'NEW', 'oq': '1',
+                                               'eq': '0', 't': 1000}))
+        trade = {'s': 'btc_usdt', 'i': 't1', 'oi': '1', 'p': '100', 'q': '0.25', 't': 1001}
+        for _ in range(3):
+            self.tracker.handle(_message('trade', trade))
+        order = self.tracker.by_client_id('c1')
+        self.assertEqual(order.executed_qty, Fixed.parse('0.25'))
+        self.assertEqual(order.state, 'PARTIALLY_FILLED')
+        self.assertEqual(self.changes, [('NEW', None), ('PARTIALLY_FILLED', 'NEW')])
+
+    def test_identical_keyless_fills_counted_separately(self):
+        fill = {'symbol': 'btc_usdt', 'orderId': 7, 'price': '100', 'quantity': '1', 'timestamp': 5000}
+        self.tracker.apply_trade(fill)
+        self.tracker.apply_trade(dict(fill))
+        order = self.tracker.get(7)
+        self.assertEqual(order.executed_qty, Fixed.parse('2'))
+        self.assertEqual(len(order.fills), 2)
+
+    def test_stale_and_replayed_updates_ignored(self):
+        self.tracker.apply_order({'orderId': '9', 'state': 'PARTIALLY_FILLED', 'executedQty': '2', 'updatedTime': 20})
+        self.tracker.apply_order({'orderId': '9', 'state': 'NEW', 'executedQty': '0', 'updatedTime': 10})
+        self.tracker.apply_order({'orderId': '9', 'state': 'PARTIALLY_FILLED', 'executedQty': '1',
+                                  'updatedTime': 15})
+        order = self.tracker.get('9')
+        self.assertEqual((order.state, order.executed_qty), ('PARTIALLY_FILLED', Fixed.parse('2')))
+        self.tracker.apply_order({'orderId': 9, 'state': 'FILLED', 'executedQty': '3', 'updatedTime': 30})
+        self.assertEqual(self.tracker.get(9).state, 'FILLED')
+        self.tracker.apply_order({'orderId': '9', 'state': 'PARTIALLY_FILLED', 'executedQty': '2',
+                                  'updatedTime': 20})
+        self.assertEqual(self.tracker.get(9).state, 'FILLED')
+        self.assertEqual(self.tracker.open_orders(), [])
+
+    def test_perp_reconcile_reads_every_page(self):
+        remote = [{'orderId': i, 'symbol': 'btc_usdt', 'state': 'NEW', 'updatedTime': 1} for i in range(150)]
+        perp = FakePerp(remote, {'999': {'orderId': 999, 'state': 'CANCELED', 'updatedTime': 2}})
+        tracker = OrderTracker(perp=perp)
+        tracker.apply_order({'orderId': 149, 'state': 'NEW', 'updatedTime': 1})
+        tracker.apply_order({'orderId': 999, 'state': 'NEW', 'updatedTime': 1})
+        self.assertEqual(tracker.reconcile(), 1)
+        self.assertEqual(perp.pages, [1, 2])
+        self.assertEqual(perp.fetched, ['999'])
+        self.assertEqual(len(tracker.open_orders('btc_usdt')), 150)
+        self.assertEqual(tracker.get(999).state, 'CANCELED')
+
+
+class StreamCacheTest(unittest.TestCase):
+
+    def test_subclass_without_parse_fails_at_construction(self):
+        class Incomplete(_StreamCache):
+            topic = 'balance'
+
+            def _fetch(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == '__main__':
+    unittest.main()
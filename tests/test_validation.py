@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+import unittest
+
+from pyspikex.spot import SpikexValidationError
+from pyspikex.validation import OrderValidator, SymbolRules
+
+
+class OrderValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = OrderValidator({'btc_usdt': SymbolRules(
+            'btc_usdt', 2, 4, price_min='100', price_max='100000', price_tick='0.05',
+            qty_min='0.001', qty_max='10', qty_tick='0.0005', notional_min='5')})
+
+    def order(self, **fields):
+        order = {'symbol': 'BTC_USDT', 'side': 'BUY', 'type': 'LIMIT', 'price': '30000.05', 'quantity': '0.01'}
+        order.update(fields)
+        return order
+
+    def assertRejected(self, code, order, round=False):
+        with self.assertRaises(SpikexValidationError) as ctx:
+            self.validator.check(order, round)
+        self.assertEqual(ctx.exception.message_code, code)
+
+    def test_valid_order_is_unchanged(self):
+        order = self.order()
+        self.assertEqual(self.validator.check(order), self.order())
+
+    def test_off_tick_price_rejected(self):
+        self.assertRejected('ORDER_F0103', self.order(price='30000.03'))
+        self.assertRejected('ORDER_F0103', self.order(price='30000.051'))
+
+    def test_off_lot_quantity_rejected(self):
+        self.assertRejected('ORDER_F0203', self.order(quantity='0.0102'))
+
+    def test_round_buy_down_sell_up(self):
+        buy = self.validator.check(self.order(price='30000.07', quantity='0.01049'), round=True)
+        self.assertEqual((buy['price'], buy['quantity']), ('30000.05', '0.0100'))
+        sell = self.validator.check(self.order(side='SELL', price='30000.07'), round=True)
+        self.assertEqual(sell['price'], '30000.10')
+
+    def test_round_perp_fields(self):
+        order = {'symbol': 'btc_usdt', 'orderSide': 'SELL', 'orderType': 'LIMIT', 'price': '30000.001',
+                 'origQty': '0.01234'}
+        self.validator.check(order, round=True)
+        self.assertEqual((order['price'], order['origQty']), ('30000.05', '0.0120'))
+
+    def test_bounds(self):
+        self.assertRejected('ORDER_F0101', self.order(price='99.95'))
+        self.assertRejected('ORDER_F0102', self.order(price='100000.05'))
+        self.assertRejected('ORDER_F0201', self.order(quantity='0.0005'))
+        self.assertRejected('ORDER_F0202', self.order(quantity='10.0005'))
+
+    def test_bounds_enforced_after_rounding(self):
+        self.assertRejected('ORDER_F0101', self.order(price='99.99', quantity='1'), round=True)
+        self.assertRejected('ORDER_F0201', self.order(quantity='0.0009'), round=True)
+
+    def test_notional(self):
+        self.assertRejected('ORDER_F0301', self.order(price='1000', quantity='0.004'))
+        self.validator.check(self.order(price='1000', quantity='0.005'))
+        self.assertRejected('ORDER_F0301', self.order(type='MARKET', price=None, quantity=None, quoteQty='4.99'))
+
+    def test_unknown_symbol_passes(self):
+        order = self.order(symbol='eth_usdt', price='1.234567')
+        self.assertIs(self.validator.check(order), order)
+
+    def test_check_batch(self):
+        errors = self.validator.check_batch([self.order(), self.order(price='1'), self.order(quantity='20')])
+        self.assertEqual([(i, e.message_code) for i, e in errors], [(1, 'ORDER_F0101'), (2, 'ORDER_F0202')])
+
+    def test_from_spot_config(self):
+        validator = OrderValidator.from_spot_config([{
+            'symbol': 'ETH_USDT', 'pricePrecision': 2, 'quantityPrecision': 3,
+            'filters': [{'filter': 'PRICE', 'min': '1', 'max': None, 'tickSize': '0.01'},
+                        {'filter': 'QUANTITY', 'min': '0.001', 'max': '1000', 'tickSize': '0.001'},
+                        {'filter': 'QUOTE_QTY', 'min': '1'}]}])
+        validator.check({'symbol': 'eth_usdt', 'side': 'BUY', 'price': '2000.01', 'quantity': '0.001'})
+        with self.assertRaises(SpikexValidationError):
+            validator.check({'symbol': 'eth_usdt', 'side': 'BUY', 'price': '2000.001', 'quantity': '0.001'})
+
+    def test_from_perp_config_multiplier(self):
+        validator = OrderValidator.from_perp_config([{
+            'symbol': 'btc_usdt', 'pricePrecision': 1, 'quantityPrecision': 0, 'minStepPrice': '0.1',
+            'minQty': '1', 'minNotional': '5', 'contractSize': '0.0001'}])
+        validator.check({'symbol': 'btc_usdt', 'orderSide': 'BUY', 'price': '50000.0', 'origQty': '1'})
+        with self.assertRaises(SpikexValidationError) as ctx:
+            validator.check({'symbol': 'btc_usdt', 'orderSide': 'BUY', 'price': '40000.0', 'origQty': '1'})
+        self.assertEqual(ctx.exception.message_code, 'ORDER_F0301')
+
+
+if __name__ == '__main__':
+    unittest.main()